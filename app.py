@@ -3,11 +3,10 @@ from flask_cors import CORS
 import os
 
 # 自訂模組
-from config import MAIN_DB_PATH
-from database import init_db
-from models import init_models
+from database import init_db, SQLITE_BUSY_TIMEOUT
+from models import init_models, db_path_for
 from routes import api_blueprint, web_blueprint
-from fetcher import fetch_data, last_custom_zone_list
+from fetcher import fetch_data, last_custom_zone_list, last_zone_vessel_list
 from scheduler import init_scheduler
 from routes.blacklist import blacklist_api
 from routes.alarm_api import alarm_api
@@ -27,8 +26,9 @@ CORS(app,
 
 
 # 設定主資料庫 URI（Flask 綁定）
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.abspath(MAIN_DB_PATH)}"
+app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.abspath(db_path_for('ais_data'))}"
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT}}
 
 # =========================================
 # 初始化資料庫
@@ -54,6 +54,14 @@ def api_custom_zone_alerts():
     return jsonify(last_custom_zone_list)
 
 
+# =========================================
+# 全船舶 12/24nm 判斷結果（需 GEOFENCE_ALL_VESSELS=true）
+# =========================================
+@app.route("/api/zone_vessels")
+def api_zone_vessels():
+    return jsonify(last_zone_vessel_list)
+
+
 # =========================================
 # 主程式入口
 # =========================================
@@ -0,0 +1,300 @@
+# archive.py
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import DateTime, Float, String
+
+from config import ARCHIVE_DIR, ARCHIVE_CACHE_SIZE
+from models import VESSEL_STATIC_COLUMNS
+from pagination import decode_cursor
+
+
+# =========================================
+# 歷史分區封存（欄位式 .npz）
+# =========================================
+# 已結束的歷史分區（見 partitions.py）寫成 <ARCHIVE_DIR>/<DB 檔名>/<分區表名稱>.npz 後 DROP：
+#   id / timestamp      int64（timestamp 為 epoch 微秒，UTC）
+#   其他整數欄位         int64，NULL 存成 -1（vessel_id 等參照 id，不會是負數）
+#   數值欄位             float64，NULL 存成 NaN
+#   字串欄位             <欄位>.codes（int32，NULL 為 -1）+ <欄位>.dict（不重複的字串）
+# 資料依 (timestamp, id) 由舊到新排序，時間區間以二分搜尋切片
+# 正規化到 vessels 的靜態欄位（船名等）寫檔時補回，封存檔不依賴 vessels 表
+#
+# .npz 內每個欄位是獨立壓縮的成員，讀取時只解壓縮用到的欄位：
+#   篩選只讀條件涉及的欄位，整列資料只在湊成一頁時才讀其餘欄位，
+#   密度網格只讀 ship_id / lat / lon / timestamp
+# 解壓後的欄位以 LRU 快取（ARCHIVE_CACHE_SIZE 個欄位），翻頁不必重複解壓
+_EPOCH = datetime(1970, 1, 1)
+_CHUNK = 50000
+
+_lock = threading.Lock()
+_columns = OrderedDict()   # (檔案路徑, 欄位) → ndarray
+
+
+def archive_path(engine, table):
+    """分區表的封存檔路徑（依 DB 檔名分目錄，split 模式下各檔的表格名稱可能相同）"""
+    db_name = os.path.splitext(os.path.basename(engine.url.database))[0]
+    return os.path.join(ARCHIVE_DIR, db_name, f"{table}.npz")
+
+
+def _micros(dt):
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+# =========================================
+# 寫入
+# =========================================
+def _encode(column, values, codes):
+    if isinstance(column.type, DateTime):
+        return np.array(values, dtype="datetime64[us]").astype(np.int64)
+    if isinstance(column.type, String):
+        return np.array(
+            [-1 if v is None else codes.setdefault(str(v), len(codes)) for v in values],
+            dtype=np.int32,
+        )
+    if isinstance(column.type, Float):
+        return np.array(values, dtype=np.float64)   # None → NaN
+    return np.array([-1 if v is None else v for v in values], dtype=np.int64)
+
+
+def write_archive(dbapi_conn, Model, table, path, vessel_table=None):
+    """
+    以 sqlite3 連線分批讀出 table 全部資料，寫成封存檔，回傳筆數
+    vessel_table：靜態欄位由此補回（歷史表中為 NULL 的部分）
+    先寫到暫存檔再改名，中斷時不會留下不完整的封存檔
+    """
+    columns = list(Model.__table__.columns)
+    names = [c.name for c in columns]
+    select_list = ", ".join(f"h.{name}" for name in names)
+    source = f"{table} h"
+    if vessel_table:
+        select_list = ", ".join(
+            f"COALESCE(h.{name}, v.{name})" if name in VESSEL_STATIC_COLUMNS else f"h.{name}"
+            for name in names
+        )
+        source += f" LEFT JOIN {vessel_table} v ON v.id = h.vessel_id"
+    chunks = {name: [] for name in names}
+    dicts = {c.name: {} for c in columns if isinstance(c.type, String)}
+
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT {select_list} FROM {source} "
+            f"WHERE h.timestamp IS NOT NULL ORDER BY h.timestamp, h.id"
+        )
+        while True:
+            rows = cursor.fetchmany(_CHUNK)
+            if not rows:
+                break
+            for i, column in enumerate(columns):
+                chunks[column.name].append(_encode(column, [r[i] for r in rows], dicts.get(column.name)))
+    finally:
+        cursor.close()
+
+    arrays = {}
+    for column in columns:
+        name = column.name
+        empty = _encode(column, [], {})
+        data = np.concatenate(chunks[name]) if chunks[name] else empty
+        if name in dicts:
+            arrays[f"{name}.codes"] = data
+            arrays[f"{name}.dict"] = np.array(list(dicts[name]), dtype=str) if dicts[name] else np.array([], dtype="U1")
+        else:
+            arrays[name] = data
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, path)
+    return len(arrays["id"])
+
+
+# =========================================
+# 讀取
+# =========================================
+class ArchivedRow:
+    """
+    封存檔中的一筆資料：屬性與 Model 物件相同，供 to_dict / 欄位式編碼 / 軌跡簡化使用
+    不建立 ORM 物件（逐欄 instrumentation 的成本比讀取封存檔本身還高）
+    """
+
+    def __init__(self, table, values):
+        self.__table__ = table
+        self.__dict__.update(values)
+
+    def to_dict(self):
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+
+class ArchivedPartition:
+    """已封存的歷史分區；history_models 回傳的表格列表中與分區 Model 並列"""
+
+    def __init__(self, Model, key, start, end, path):
+        self.Model = Model        # 原本的歷史表 Model（ShipAIS / ChinaBoatAIS）
+        self.key = key
+        self.start = start
+        self.end = end
+        self.path = path
+        self._members = None
+
+    def __repr__(self):
+        return f"<ArchivedPartition {self.path}>"
+
+    def column(self, name):
+        key = (self.path, name)
+        with _lock:
+            if key in _columns:
+                _columns.move_to_end(key)
+                return _columns[key]
+
+        with np.load(self.path) as npz:
+            data = npz[name]
+
+        with _lock:
+            _columns[key] = data
+            while len(_columns) > ARCHIVE_CACHE_SIZE:
+                _columns.popitem(last=False)
+        return data
+
+    def has_column(self, name):
+        """封存檔是否有此欄位（較早寫成的封存檔沒有之後才新增的欄位，如 vessel_id）"""
+        if self._members is None:
+            with np.load(self.path) as npz:
+                self._members = set(npz.files)
+        return name in self._members or f"{name}.codes" in self._members
+
+    def codes_where(self, name, predicate):
+        """字串欄位中符合 predicate 的字典代碼"""
+        return np.array(
+            [i for i, v in enumerate(self.column(f"{name}.dict")) if predicate(str(v))],
+            dtype=np.int32,
+        )
+
+    def time_slice(self, start=None, end=None):
+        """timestamp 介於 [start, end] 的列範圍 (lo, hi)"""
+        stamps = self.column("timestamp")
+        lo = 0 if start is None else int(np.searchsorted(stamps, _micros(start), "left"))
+        hi = len(stamps) if end is None else int(np.searchsorted(stamps, _micros(end), "right"))
+        return lo, hi
+
+    def max_id(self):
+        ids = self.column("id")
+        return int(ids.max()) if len(ids) else 0
+
+    def rows(self, indices):
+        """指定列 → ArchivedRow"""
+        values = {}
+        for column in self.Model.__table__.columns:
+            name = column.name
+            if not self.has_column(name):
+                values[name] = [None] * len(indices)
+            elif isinstance(column.type, String):
+                lookup = self.column(f"{name}.dict").tolist()
+                values[name] = [None if c < 0 else lookup[c] for c in self.column(f"{name}.codes")[indices].tolist()]
+            elif isinstance(column.type, DateTime):
+                values[name] = [_EPOCH + timedelta(microseconds=t) for t in self.column(name)[indices].tolist()]
+            elif isinstance(column.type, Float):
+                values[name] = [None if v != v else v for v in self.column(name)[indices].tolist()]
+            else:
+                values[name] = [None if v < 0 else v for v in self.column(name)[indices].tolist()]
+
+        names = list(values)
+        table = self.Model.__table__
+        return [ArchivedRow(table, dict(zip(names, row))) for row in zip(*values.values())]
+
+    def positions(self, start, end):
+        """密度網格用：時間窗內的 (ship_id, lat, lon, epoch 秒)"""
+        lo, hi = self.time_slice(start, end)
+        lookup = np.array(self.column("ship_id.dict").tolist() + [None], dtype=object)
+        return (
+            lookup[self.column("ship_id.codes")[lo:hi]],   # -1 → None
+            self.column("lat")[lo:hi],
+            self.column("lon")[lo:hi],
+            self.column("timestamp")[lo:hi] // 1_000_000,
+        )
+
+    def query(self, **filters):
+        return ArchiveQuery(self, **filters)
+
+
+class ArchiveQuery:
+    """
+    封存分區上的歷史查詢，條件與 API 的 SQL 查詢相同：
+    ship_id 相等、shipname 部分比對（不分大小寫）、時間區間、經緯度範圍、bucket 降採樣
+    fetch() 與 pagination._after_cursor 相同，依 (timestamp, id) 由新到舊
+    """
+
+    def __init__(self, part, ship_id=None, shipname=None, time_range=None,
+                 lat_range=None, lon_range=None, bucket=None):
+        self.part = part
+        self.ship_id = ship_id
+        self.shipname = shipname
+        self.time_range = time_range
+        self.lat_range = lat_range
+        self.lon_range = lon_range
+        self.bucket = bucket
+        self._matches = None
+
+    def _filter(self):
+        """符合條件的列（由舊到新）"""
+        part = self.part
+        lo, hi = part.time_slice(*(self.time_range or (None, None)))
+        mask = np.ones(hi - lo, dtype=bool)
+
+        if self.ship_id:
+            ship_id = self.ship_id
+            mask &= np.isin(part.column("ship_id.codes")[lo:hi], part.codes_where("ship_id", lambda v: v == ship_id))
+        if self.shipname:
+            needle = self.shipname.lower()
+            mask &= np.isin(part.column("shipname.codes")[lo:hi], part.codes_where("shipname", lambda v: needle in v.lower()))
+        for name, bounds in (("lat", self.lat_range), ("lon", self.lon_range)):
+            if bounds:
+                values = part.column(name)[lo:hi]
+                mask &= (values >= bounds[0]) & (values <= bounds[1])
+
+        matches = np.flatnonzero(mask) + lo
+        if self.bucket:
+            matches = self._latest_per_bucket(matches)
+        return matches
+
+    def _latest_per_bucket(self, matches):
+        """每個 (ship_id, bucket) 只留最新一筆（與 downsample.filter_buckets 相同）"""
+        if not len(matches):
+            return matches
+        ships = self.part.column("ship_id.codes")[matches].astype(np.int64)
+        buckets = self.part.column("timestamp")[matches] // 1_000_000 // self.bucket
+        # 由新到舊取每組第一次出現的位置，即該組最新的一筆
+        _, first = np.unique(np.column_stack([ships, buckets])[::-1], axis=0, return_index=True)
+        keep = np.zeros(len(matches), dtype=bool)
+        keep[len(matches) - 1 - first] = True
+        keep |= ships < 0    # ship_id 為 NULL 的資料不分組（SQL 中 NULL 不相等）
+        return matches[keep]
+
+    def probe(self, ship_ids, before):
+        """跨分區 bucket 去重用：ship_ids 這些船在 before 之前符合條件的 (ship_id, timestamp)"""
+        if self._matches is None:
+            self._matches = self._filter()
+        matches = self._matches
+        matches = matches[self.part.column("timestamp")[matches] < _micros(before)]
+        codes = self.part.codes_where("ship_id", lambda v: v in ship_ids)
+        matches = matches[np.isin(self.part.column("ship_id.codes")[matches], codes)]
+        return [(r.ship_id, r.timestamp) for r in self.part.rows(matches)]
+
+    def fetch(self, cursor, limit):
+        """cursor 之後（更舊）的 limit 筆"""
+        if self._matches is None:
+            self._matches = self._filter()
+        matches = self._matches
+
+        if cursor:
+            ts, row_id = decode_cursor(cursor)
+            t = _micros(ts)
+            stamps = self.part.column("timestamp")[matches]
+            ids = self.part.column("id")[matches]
+            matches = matches[(stamps < t) | ((stamps == t) & (ids < row_id))]
+
+        return self.part.rows(matches[::-1][:limit])
@@ -0,0 +1,149 @@
+# bulk_writer.py
+import time
+
+from sqlalchemy import insert, delete, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from config import BULK_CHUNK_SIZE
+from models import session_for
+
+
+# =========================================
+# 批次寫入歷史資料
+# =========================================
+class BulkWriter:
+    """
+    收集每個目標表格的 row dict，最後以 executemany 分批 INSERT
+    取代逐筆建立 ORM 物件（省下 unit-of-work 的成本）
+
+    最新狀態表（ship_id 唯一）則以 INSERT ... ON CONFLICT(ship_id) DO UPDATE
+    一次寫入整輪的最新位置；船名索引等「已存在就略過」的表格用 ON CONFLICT DO NOTHING；
+    每小時彙總表以 ON CONFLICT DO UPDATE 累加計數欄位（見 accumulate）
+
+    只負責寫入，不 commit；commit 仍由 fetch_data 統一處理
+    """
+
+    def __init__(self, chunk_size=BULK_CHUNK_SIZE):
+        self.chunk_size = max(1, chunk_size)
+        self.rows = {}
+        self.latest = {}
+        self.unique = {}
+        self.accumulated = {}
+        self.prune_before = {}
+
+    def add(self, Model, row):
+        """row：欄位 → 值（歷史表不含 id，由 DB 配發）"""
+        self.rows.setdefault(Model, []).append(row)
+
+    def upsert(self, Model, row):
+        """最新狀態表：同一艘船只保留最後一筆"""
+        self.latest.setdefault(Model, {})[row["ship_id"]] = row
+
+    def add_unique(self, Model, row):
+        """表格上有唯一索引，已存在的資料略過（同一輪重複的 row 也只寫一次）"""
+        self.unique.setdefault(Model, {})[tuple(row.values())] = row
+
+    def accumulate(self, Model, row, keys, counters):
+        """
+        彙總表：keys 欄位相同的資料合併為一筆，counters 欄位相加，
+        first_seen 取最早、last_seen 取最晚，其餘欄位以新值覆蓋（表格上需有 keys 的唯一索引）
+        """
+        spec, by_key = self.accumulated.setdefault(Model, ((tuple(keys), tuple(counters)), {}))
+        key = tuple(row[k] for k in spec[0])
+        prev = by_key.get(key)
+        if prev is not None:
+            row = {
+                **row,
+                **{c: prev[c] + row[c] for c in spec[1]},
+                "first_seen": min(prev["first_seen"], row["first_seen"]),
+                "last_seen": max(prev["last_seen"], row["last_seen"]),
+            }
+        by_key[key] = row
+
+    def prune(self, Model, before):
+        """upsert 之後刪除 timestamp 早於 before 的資料（本輪沒出現的船）"""
+        self.prune_before[Model] = before
+
+    def __len__(self):
+        return (sum(len(rows) for rows in self.rows.values())
+                + sum(len(rows) for rows in self.latest.values())
+                + sum(len(rows) for rows in self.unique.values())
+                + sum(len(rows) for _, rows in self.accumulated.values()))
+
+    def _upsert_stmt(self, Model):
+        stmt = sqlite_insert(Model.__table__)
+        update_cols = {
+            c.name: stmt.excluded[c.name]
+            for c in Model.__table__.columns
+            if c.name not in ("id", "ship_id")
+        }
+        return stmt.on_conflict_do_update(index_elements=["ship_id"], set_=update_cols)
+
+    def _accumulate_stmt(self, Model, keys, counters):
+        table = Model.__table__
+        stmt = sqlite_insert(table)
+        update_cols = {
+            c.name: stmt.excluded[c.name]
+            for c in table.columns
+            if c.name not in ("id", *keys, *counters)
+        }
+        update_cols.update({c: table.c[c] + stmt.excluded[c] for c in counters})
+        update_cols["first_seen"] = func.min(table.c.first_seen, stmt.excluded.first_seen)
+        update_cols["last_seen"] = func.max(table.c.last_seen, stmt.excluded.last_seen)
+        return stmt.on_conflict_do_update(index_elements=list(keys), set_=update_cols)
+
+    def flush(self):
+        """寫入所有暫存資料，回傳 {表格: 筆數}"""
+        start = time.perf_counter()
+        written = {}
+
+        for Model, rows in self.rows.items():
+            if not rows:
+                continue
+            session = session_for(Model)
+            stmt = insert(Model.__table__)
+            for i in range(0, len(rows), self.chunk_size):
+                session.execute(stmt, rows[i:i + self.chunk_size])
+            written[Model.__name__] = len(rows)
+
+        for Model, by_ship in self.latest.items():
+            session = session_for(Model)
+            stmt = self._upsert_stmt(Model)
+            rows = list(by_ship.values())
+            for i in range(0, len(rows), self.chunk_size):
+                session.execute(stmt, rows[i:i + self.chunk_size])
+            written[Model.__name__] = len(rows)
+
+        for Model, by_key in self.unique.items():
+            session = session_for(Model)
+            stmt = sqlite_insert(Model.__table__).on_conflict_do_nothing()
+            rows = list(by_key.values())
+            for i in range(0, len(rows), self.chunk_size):
+                session.execute(stmt, rows[i:i + self.chunk_size])
+            written[Model.__name__] = len(rows)
+
+        for Model, ((keys, counters), by_key) in self.accumulated.items():
+            session = session_for(Model)
+            stmt = self._accumulate_stmt(Model, keys, counters)
+            rows = list(by_key.values())
+            for i in range(0, len(rows), self.chunk_size):
+                session.execute(stmt, rows[i:i + self.chunk_size])
+            written[Model.__name__] = len(rows)
+
+        for Model, before in self.prune_before.items():
+            session_for(Model).execute(
+                delete(Model.__table__).where(Model.__table__.c.timestamp < before)
+            )
+
+        elapsed = time.perf_counter() - start
+        total = sum(written.values())
+        if total:
+            rate = total / elapsed if elapsed > 0 else float("inf")
+            print(f"💾 批次寫入 {total} 筆（{elapsed:.2f}s，{rate:,.0f} rows/s）{written}")
+
+        self.rows = {}
+        self.latest = {}
+        self.unique = {}
+        self.accumulated = {}
+        self.prune_before = {}
+        return written
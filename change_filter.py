@@ -0,0 +1,90 @@
+# change_filter.py
+from config import (
+    HISTORY_DEDUP_POS_TOL,
+    HISTORY_DEDUP_SPEED_TOL,
+    HISTORY_DEDUP_COURSE_TOL,
+    HISTORY_DEDUP_KEEPALIVE,
+    HISTORY_DEDUP_EVICT_AFTER,
+)
+
+
+# =========================================
+# 歷史資料去重：船沒動就不再寫一筆
+# =========================================
+class ChangeFilter:
+    """
+    記住每艘船最後一次寫入歷史的 (lat, lon, speed, course) 與靜態欄位（船名、目的地…）的 hash
+    位置 / 航速 / 航向的變化都在容許值內、靜態欄位也沒變就略過寫入；
+    連續略過 keepalive 輪後強制寫一筆，讓停泊船在歷史查詢中仍看得到（keepalive=0 表示不強制）
+    連續超過 evict_after 輪（至少 1 輪）沒出現的船從記憶體移除，再出現時直接寫入
+
+    判斷結果先暫存，DB commit 成功後呼叫 commit() 才生效，
+    commit 失敗則 rollback()，避免沒寫進去的資料被當成已寫入
+    """
+
+    def __init__(self,
+                 pos_tol=HISTORY_DEDUP_POS_TOL,
+                 speed_tol=HISTORY_DEDUP_SPEED_TOL,
+                 course_tol=HISTORY_DEDUP_COURSE_TOL,
+                 keepalive=HISTORY_DEDUP_KEEPALIVE,
+                 evict_after=HISTORY_DEDUP_EVICT_AFTER,
+                 static_columns=()):
+        self.pos_tol = pos_tol
+        self.speed_tol = speed_tol
+        self.course_tol = course_tol
+        self.keepalive = keepalive
+        self.evict_after = max(evict_after, 1)
+        self.static_columns = tuple(static_columns)
+        self.cycle = 0       # 已 commit 的輪數
+        self.last = {}       # ship_id -> (lat, lon, speed, course, 靜態欄位 hash, 已略過輪數, 最後出現的輪)
+        self.pending = {}
+        self.stats = {"written": 0, "skipped": 0}
+
+    def _static_hash(self, row):
+        return hash(tuple(
+            None if row.get(name) is None else str(row.get(name)) for name in self.static_columns
+        ))
+
+    def _changed(self, prev, row, static_hash):
+        lat, lon, speed, course, prev_hash = prev[:5]
+        course_diff = abs((row["course"] or 0) - (course or 0)) % 360
+        return (
+            static_hash != prev_hash
+            or abs(row["lat"] - lat) > self.pos_tol
+            or abs(row["lon"] - lon) > self.pos_tol
+            or abs((row["speed"] or 0) - (speed or 0)) > self.speed_tol
+            or min(course_diff, 360 - course_diff) > self.course_tol
+        )
+
+    def should_write(self, row):
+        """回傳這筆資料是否需要寫入歷史"""
+        ship_id = row["ship_id"]
+        prev = self.pending.get(ship_id) or self.last.get(ship_id)
+        static_hash = self._static_hash(row)
+
+        if prev is None or self._changed(prev, row, static_hash) or (
+                self.keepalive and prev[5] + 1 >= self.keepalive):
+            self.pending[ship_id] = (
+                row["lat"], row["lon"], row["speed"], row["course"], static_hash, 0, self.cycle,
+            )
+            self.stats["written"] += 1
+            return True
+
+        self.pending[ship_id] = prev[:5] + (prev[5] + 1, self.cycle)
+        self.stats["skipped"] += 1
+        return False
+
+    def commit(self):
+        self.last.update(self.pending)
+        self.pending = {}
+        self.cycle += 1
+        stale = [k for k, v in self.last.items() if v[6] < self.cycle - self.evict_after]
+        for ship_id in stale:
+            del self.last[ship_id]
+        stats, self.stats = self.stats, {"written": 0, "skipped": 0}
+        stats["evicted"] = len(stale)
+        return stats
+
+    def rollback(self):
+        self.pending = {}
+        self.stats = {"written": 0, "skipped": 0}
@@ -0,0 +1,93 @@
+# compact.py
+import calendar
+import gzip
+import json
+
+from flask import Response
+from sqlalchemy import DateTime, String
+
+from config import API_GZIP_LEVEL
+
+
+# =========================================
+# 歷史查詢欄位式（columnar）壓縮格式
+# =========================================
+# ?format=columnar（或 Accept: application/vnd.ais.columnar+json）
+#
+# {
+#   "format": "columnar", "count": N, "next_cursor": ...,
+#   "columns": {
+#     "lat":       [23.1, 23.2, ...],                          數值欄位：原值陣列
+#     "shipname":  {"dict": ["A", "B"], "index": [0, 1, 0]},   字串欄位：字典 + 索引
+#     "timestamp": {"delta": [1760000000, -600, 0, ...]}       epoch 秒（UTC），第一筆為絕對值，
+#   }                                                          其後為與前一筆的差
+# }
+# null 一律保留為 null；client 支援 gzip 時整個 body 以 gzip 壓縮
+COLUMNAR_MIMETYPE = "application/vnd.ais.columnar+json"
+
+# body 太小時壓縮省不了多少，直接送出
+GZIP_MIN_SIZE = 1024
+
+
+def columnar_format(request):
+    """是否要求欄位式格式"""
+    return (
+        request.args.get("format") == "columnar"
+        or request.accept_mimetypes.best == COLUMNAR_MIMETYPE
+    )
+
+
+def _dict_encode(values):
+    codes = {}
+    index = [None if v is None else codes.setdefault(v, len(codes)) for v in values]
+    return {"dict": list(codes), "index": index}
+
+
+def _delta_encode(values):
+    delta = []
+    prev = 0
+    for v in values:
+        if v is None:
+            delta.append(None)
+            continue
+        t = calendar.timegm(v.timetuple())
+        delta.append(t - prev)
+        prev = t
+    return {"delta": delta}
+
+
+def encode_columns(rows, Model, columns=None):
+    """
+    ORM 物件列表 → 欄位式 dict
+    columns：要輸出的欄位名稱，未指定為 Model 的所有欄位
+    """
+    table_columns = Model.__table__.columns
+    result = {}
+    for name in columns or table_columns.keys():
+        values = [getattr(r, name) for r in rows]
+        column_type = table_columns[name].type
+        if isinstance(column_type, DateTime):
+            result[name] = _delta_encode(values)
+        elif isinstance(column_type, String):
+            result[name] = _dict_encode(values)
+        else:
+            result[name] = values
+    return result
+
+
+def columnar_response(request, Model, rows, next_cursor, columns=None):
+    payload = {
+        "format": "columnar",
+        "count": len(rows),
+        "next_cursor": next_cursor,
+        "columns": encode_columns(rows, Model, columns),
+    }
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+
+    response = Response(mimetype=COLUMNAR_MIMETYPE)
+    response.vary.add("Accept-Encoding")
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in request.accept_encodings:
+        body = gzip.compress(body, compresslevel=API_GZIP_LEVEL)
+        response.headers["Content-Encoding"] = "gzip"
+    response.set_data(body)
+    return response
@@ -1,8 +1,11 @@
 import os
 import json
+import threading
 from dotenv import load_dotenv, find_dotenv
 from shapely.geometry import Polygon
 
+from geometry_cache import load_cached_geometry
+
 # =========================================
 # 載入 .env
 # =========================================
@@ -43,8 +46,101 @@ CCG_CHECK12_DB_PATH = os.path.join(DB_DIR, "ccg_check12.db")
 CCG_CHECK24_DB_PATH = os.path.join(DB_DIR, "ccg_check24.db")
 CHINA_BOAT_DB_PATH = os.path.join(DB_DIR, "chinaboat.db")
 
+# 各分類對應的 SQLite 檔（split 模式）
+CATEGORY_DB_PATHS = {
+    "ais_data": MAIN_DB_PATH,
+    "data_test": TEST_DB_PATH,
+    "boat_test": BOAT_DB_PATH,
+    "boat_check12": BOAT_CHECK12_DB_PATH,
+    "boat_check24": BOAT_CHECK24_DB_PATH,
+    "ccg": CCG_DB_PATH,
+    "ccg_check12": CCG_CHECK12_DB_PATH,
+    "ccg_check24": CCG_CHECK24_DB_PATH,
+    "chinaboat": CHINA_BOAT_DB_PATH,
+}
+
+# 儲存模式：
+#   split   = 每個分類一個 SQLite 檔（預設，舊版配置）
+#   unified = 所有分類放進同一個 WAL 模式的檔案，每輪只 commit 一次（單一 transaction）
+#             既有資料可用 `python migrations.py unify` 轉移
+DB_STORAGE_MODE = os.getenv("DB_STORAGE_MODE", "split").lower()
+UNIFIED_STORAGE = DB_STORAGE_MODE == "unified"
+UNIFIED_DB_PATH = os.path.join(DB_DIR, "ais_store.db")
+
+# 歷史表（ais_data、chinaboat）時間分區：
+#   none = 單一表格（預設）
+#   day / week = 每天 / 每週（ISO 週）一個表格，查詢只讀與時間區間重疊的分區
+#             既有資料可用 `python migrations.py partition` 搬進分區
+HISTORY_PARTITION = os.getenv("HISTORY_PARTITION", "none").lower()
+# 歷史分區保存天數，超過的分區整個 DROP（0 = 永久保存，僅分區模式有效）
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+# 結束超過幾天的分區封存成欄位式壓縮檔（.npz）並自 SQLite 刪除（0 = 不封存，僅分區模式有效）
+# 每天由排程執行一次，也可用 `python migrations.py archive` 手動執行
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(DB_DIR, "archive"))
+# 封存檔讀取時，解壓後的欄位最多快取幾個
+ARCHIVE_CACHE_SIZE = int(os.getenv("ARCHIVE_CACHE_SIZE", "32"))
+
+# 單船軌跡庫（/api/track/<ship_id>，memory-mapped 檔案）：
+#   ccg = 只收海警船（預設） / all = 所有船 / none = 停用
+#   既有歷史資料可用 `python migrations.py tracks` 重建
+TRACK_STORE = os.getenv("TRACK_STORE", "ccg").lower()
+TRACK_STORE_PATH = os.getenv("TRACK_STORE_PATH", os.path.join(DB_DIR, "tracks.dat"))
+
+# 船舶靜態資料（vessels）：API 填回靜態欄位時最多快取幾個版本（LRU）
+VESSEL_CACHE_SIZE = int(os.getenv("VESSEL_CACHE_SIZE", "20000"))
+
 FAILED_LOG_FILE = os.path.join(BASE_DIR, "failed_records.json")
 
+# 歷史資料批次寫入，每次 executemany 的筆數
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
+# 歷史資料去重（ais_data / chinaboat）：位置、航速、航向都沒超過容許值且船名等靜態欄位沒變就不寫
+HISTORY_DEDUP = os.getenv("HISTORY_DEDUP", "True").lower() == "true"
+HISTORY_DEDUP_POS_TOL = float(os.getenv("HISTORY_DEDUP_POS_TOL", "0.0001"))      # 度（約 11 m）
+HISTORY_DEDUP_SPEED_TOL = float(os.getenv("HISTORY_DEDUP_SPEED_TOL", "0.1"))     # 節
+HISTORY_DEDUP_COURSE_TOL = float(os.getenv("HISTORY_DEDUP_COURSE_TOL", "1"))     # 度
+# 連續略過幾輪後強制寫一筆（6 輪 = 每小時至少一筆），0 = 不強制
+HISTORY_DEDUP_KEEPALIVE = int(os.getenv("HISTORY_DEDUP_KEEPALIVE", "6"))
+# 連續幾輪沒出現的船才從記憶體移除（36 輪 = 6 小時；與 keepalive 無關，訊號斷續的船不會重複寫入）
+HISTORY_DEDUP_EVICT_AFTER = int(os.getenv("HISTORY_DEDUP_EVICT_AFTER", "36"))
+
+# ship_latest（/api/ais/latest、/api/chinaboat/latest）保留幾天內出現過的船，更早的每輪刪除
+LATEST_RETENTION_DAYS = float(os.getenv("LATEST_RETENTION_DAYS", "3"))
+
+# 歷史查詢 API（/api/ais/history、/api/chinaboat/all）每頁筆數，limit 參數不得超過上限
+API_PAGE_DEFAULT = int(os.getenv("API_PAGE_DEFAULT", "1000"))
+API_PAGE_MAX = int(os.getenv("API_PAGE_MAX", "5000"))
+# 串流模式（?stream=1 / ?format=ndjson）每次向 DB 讀取的筆數，串流模式不受 API_PAGE_MAX 限制
+API_STREAM_CHUNK = int(os.getenv("API_STREAM_CHUNK", "1000"))
+# 欄位式格式（?format=columnar）的 gzip 壓縮等級（1–9）
+API_GZIP_LEVEL = int(os.getenv("API_GZIP_LEVEL", "6"))
+
+# 密度網格（/api/chinaboat/density）：快取幾組 (時間窗, resolution) 結果
+DENSITY_CACHE_SIZE = int(os.getenv("DENSITY_CACHE_SIZE", "32"))
+# 停留時間計算時，同一艘船相鄰兩筆的間隔上限（秒）
+# 歷史去重下停泊船最多每 HISTORY_DEDUP_KEEPALIVE 輪（預設 6 輪 × 10 分鐘）才寫一筆，再加一輪的餘裕
+DENSITY_MAX_GAP = int(os.getenv("DENSITY_MAX_GAP", "4200"))
+
+# CCG 即時狀態快照（/api/ccg_data 等）超過幾秒未更新就改回直接查 DB
+FLEET_SNAPSHOT_MAX_AGE = int(os.getenv("FLEET_SNAPSHOT_MAX_AGE", "1200"))
+
+# SSE 推播（/api/stream）：每個連線最多暫存幾個事件、幾秒沒事件送一次 keepalive
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "10"))
+SSE_KEEPALIVE = int(os.getenv("SSE_KEEPALIVE", "25"))
+
+# =========================================
+# AIS 抓取設定
+# =========================================
+# 同時下載 tile 的執行緒數量（每個執行緒各自一個 keep-alive scraper）
+FETCH_MAX_WORKERS = int(os.getenv("FETCH_MAX_WORKERS", "8"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "20"))
+# 依 24nm + 自訂警戒區自動規劃 tile 的 zoom（MarineTraffic z 值），0 = 使用固定 URL 列表（預設）
+# 規劃只涵蓋 24nm + 自訂警戒區，範圍外的船（chinaboat / ais_data 歷史）不再收集，需要時才開啟
+TILE_PLAN_ZOOM = int(os.getenv("TILE_PLAN_ZOOM", "0"))
+# 12/24nm 判斷是否涵蓋所有船舶（預設只判斷 CHINACOASTGUARD）
+GEOFENCE_ALL_VESSELS = os.getenv("GEOFENCE_ALL_VESSELS", "False").lower() == "true"
+
 # =========================================
 # GeoJSON 載入
 # =========================================
@@ -87,7 +183,40 @@ def load_geojson_polygon(filename):
         print(f"[config] ⚠️ 載入 {filename} 失敗: {e}")
         return None
 
-TAIWAN_12NM_POLYGON = load_geojson_polygon("static/taiwan_12nm.geojson")
-TAIWAN_24NM_POLYGON = load_geojson_polygon("static/taiwan_24nm.geojson")
-
-TAIWAN_POLYGON = TAIWAN_12NM_POLYGON
+# =========================================
+# 12nm / 24nm 多邊形（延遲載入 + WKB 快取）
+# =========================================
+# 第一次取用 config.TAIWAN_*_POLYGON 時才載入；
+# 來源 GeoJSON 沒變就直接讀 geometry_cache 產生的 WKB，不再重新解析
+GEOMETRY_SIMPLIFY_TOLERANCES = tuple(
+    float(t) for t in os.getenv("GEOMETRY_SIMPLIFY_TOLERANCES", "0.001,0.005,0.01").split(",")
+    if t.strip()
+)
+
+_BOUNDARY_FILES = {
+    "TAIWAN_12NM_POLYGON": "static/taiwan_12nm.geojson",
+    "TAIWAN_24NM_POLYGON": "static/taiwan_24nm.geojson",
+    "TAIWAN_POLYGON": "static/taiwan_12nm.geojson",
+}
+_boundary_lock = threading.Lock()
+_boundary_polygons = {}
+
+
+def get_boundary_polygon(filename, tolerance=0):
+    """取得邊界多邊形；tolerance > 0 時回傳簡化版本（度）"""
+    key = (filename, tolerance)
+    with _boundary_lock:
+        if key not in _boundary_polygons:
+            _boundary_polygons[key] = load_cached_geometry(
+                os.path.join(BASE_DIR, filename),
+                lambda _path: load_geojson_polygon(filename),
+                tolerances=GEOMETRY_SIMPLIFY_TOLERANCES,
+                tolerance=tolerance,
+            )
+        return _boundary_polygons[key]
+
+
+def __getattr__(name):
+    if name in _BOUNDARY_FILES:
+        return get_boundary_polygon(_BOUNDARY_FILES[name])
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
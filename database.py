@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
 from flask_sqlalchemy import SQLAlchemy
@@ -10,13 +10,30 @@ from flask_sqlalchemy import SQLAlchemy
 db = SQLAlchemy()
 
 
+# 同一個檔案只建立一組 engine + session（unified 模式下所有分類共用）
+_engines = {}
+
+# 所有 SQLite 連線遇到鎖定時最多等幾秒（sqlite3 的 timeout，即 busy_timeout）；
+# split 模式不是 WAL，API 讀取持有 SHARED lock 時，分區 DDL / DROP 也要等待而不是直接失敗
+SQLITE_BUSY_TIMEOUT = 5
+
+
+def _enable_wal(dbapi_conn, _record):
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
 # =========================================
 # 建立 engine + session + Base 的工具函式
 # =========================================
-def make_engine_and_session(db_path: str):
+def make_engine_and_session(db_path: str, wal: bool = False):
     """
     建立一個獨立的 SQLAlchemy engine、session、Base
     用來管理多個 SQLite 資料庫（非 Flask 綁定的）
+
+    同一個路徑重複呼叫時共用 engine 與 session（Base 仍各自獨立），
+    因此指向同一檔案的表格會在同一個 transaction 內 commit
     """
 
     # 將路徑轉為絕對路徑，避免 Flask 與 Scheduler session 不一致
@@ -24,15 +41,22 @@ def make_engine_and_session(db_path: str):
     db_dir = os.path.dirname(abs_path)
     os.makedirs(db_dir, exist_ok=True)
 
+    if abs_path in _engines:
+        engine, Session = _engines[abs_path]
+        return engine, Session, declarative_base()
+
     # 建立 engine，允許多執行緒共用
     engine = create_engine(
         f"sqlite:///{abs_path}",
-        connect_args={"check_same_thread": False},
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT},
         echo=False,
     )
+    if wal:
+        event.listen(engine, "connect", _enable_wal)
 
     # 建立 scoped session（確保 thread 安全）
     Session = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
+    _engines[abs_path] = (engine, Session)
 
     # 建立 Base 給 declarative model 繼承
     Base = declarative_base()
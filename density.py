@@ -0,0 +1,162 @@
+# density.py
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from archive import ArchivedPartition
+from config import DENSITY_CACHE_SIZE, DENSITY_MAX_GAP
+
+
+# =========================================
+# 中國籍船舶活動密度（網格彙總）
+# =========================================
+# 把時間窗內的 chinaboat 歷史位置依 resolution（度）切成經緯度網格，每格統計：
+#   count              資料筆數
+#   vessels            不同船數
+#   avg_dwell_minutes  平均每艘船停留時間：每筆資料到同一艘船下一筆的間隔
+#                      （上限 DENSITY_MAX_GAP）算給目前這一格，加總後除以船數
+# 網格以經緯度 0 為原點對齊，resolution 成倍數時（0.4 / 0.2 / 0.1）粗細網格可互相套疊
+#
+# 結果依 (時間窗, resolution) 快取，經緯度範圍在回傳時才篩選：
+#   已結束的時間窗（end 早於計算時已 commit 的最後一輪 timestamp）不會再有新資料，一直有效
+#   （不能用現在時間判斷：進行中那一輪的資料 timestamp 是該輪開始時間，commit 時可能已過了 end）
+#   仍在進行中的時間窗，fetcher 寫入新一輪資料後失效
+_lock = threading.Lock()
+_version = 0
+_committed_until = None    # 最後一輪 commit 成功的資料 timestamp（之後寫入的資料都晚於它）
+_cache = OrderedDict()
+
+# 「最近 N 小時」的時間窗會隨時間移動，最多沿用一輪抓取的時間
+OPEN_WINDOW_TTL = 600
+
+
+def notify_data_changed(timestamp=None):
+    """fetcher 每輪 commit 成功後呼叫，timestamp 為該輪資料的 timestamp"""
+    global _version, _committed_until
+    with _lock:
+        _version += 1
+        if timestamp is not None and (_committed_until is None or timestamp > _committed_until):
+            _committed_until = timestamp
+
+
+def _load_positions(session, Models, start, end):
+    """
+    以 timestamp 索引讀取時間窗內的 (ship_id, lat, lon, epoch)
+    Models：與時間窗重疊的歷史表（見 partitions.history_models），已封存的分區只讀需要的四個欄位
+    資料量可能上百萬筆，直接用 sqlite3 cursor 讀取，略過 SQLAlchemy 逐筆建立 Row
+    """
+    parts = []
+    cursor = session.connection().connection.cursor()
+    try:
+        for Model in Models:
+            if isinstance(Model, ArchivedPartition):
+                parts.append(Model.positions(start, end))
+                continue
+            rows = cursor.execute(
+                f"SELECT ship_id, lat, lon, CAST(strftime('%s', timestamp) AS INTEGER) "
+                f"FROM {Model.__tablename__} WHERE timestamp BETWEEN ? AND ?",
+                # 與 SQLAlchemy 寫入 SQLite 的 DateTime 格式相同
+                (start.strftime("%Y-%m-%d %H:%M:%S.%f"), end.strftime("%Y-%m-%d %H:%M:%S.%f")),
+            ).fetchall()
+            if rows:
+                columns = np.array(rows, dtype=object)
+                parts.append(tuple(columns[:, i] for i in range(4)))
+    finally:
+        cursor.close()
+        session.rollback()
+
+    parts = [p for p in parts if len(p[0])]
+    if not parts:
+        return None
+    ship_ids, lats, lons, epochs = (np.concatenate([p[i] for p in parts]) for i in range(4))
+    _, ships = np.unique(ship_ids.astype(str), return_inverse=True)
+    return (
+        ships,
+        lats.astype(float),
+        lons.astype(float),
+        epochs.astype(np.int64),
+    )
+
+
+def aggregate_density(ships, lats, lons, epochs, resolution):
+    """
+    ships：船的整數代碼；lats / lons / epochs：等長陣列
+    回傳 cells 列表（依 count 由多到少）
+    """
+    rows = np.floor(lats / resolution).astype(np.int64)
+    cols = np.floor(lons / resolution).astype(np.int64)
+    width = int(cols.max() - cols.min()) + 1
+    keys = (rows - rows.min()) * width + (cols - cols.min())
+
+    cells, cell_idx, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+    # 每格不同船數：(格, 船) 組合去重後再依格計數
+    n_ships = int(ships.max()) + 1
+    pairs = np.unique(cell_idx * n_ships + ships)
+    vessels = np.bincount(pairs // n_ships, minlength=len(cells))
+
+    # 停留時間：依 (船, 時間) 排序後取相鄰兩筆的間隔
+    order = np.lexsort((epochs, ships))
+    same_ship = ships[order][1:] == ships[order][:-1]
+    gaps = np.where(same_ship, np.minimum(np.diff(epochs[order]), DENSITY_MAX_GAP), 0)
+    dwell = np.bincount(cell_idx[order][:-1], weights=gaps, minlength=len(cells))
+
+    cell_rows = cells // width + rows.min()
+    cell_cols = cells % width + cols.min()
+    avg_dwell = dwell / vessels / 60
+
+    result = [
+        {
+            "lat": round(float(r * resolution), 6),
+            "lon": round(float(c * resolution), 6),
+            "count": int(n),
+            "vessels": int(v),
+            "avg_dwell_minutes": round(float(d), 1),
+        }
+        for r, c, n, v, d in zip(cell_rows, cell_cols, counts, vessels, avg_dwell)
+    ]
+    result.sort(key=lambda cell: -cell["count"])
+    return result
+
+
+def density_grid(session, Models, start, end, resolution, open_window=False):
+    """
+    Models：與時間窗重疊的歷史表；start / end：naive UTC datetime
+    open_window：「最近 N 小時」這類隨現在時間移動的時間窗
+    回傳 (結果 dict, 是否來自快取)
+    結果：{"start", "end", "points", "vessels", "cells"}，cells 見 aggregate_density
+    """
+    key = (start, end, resolution) if not open_window else ("open", end - start, resolution)
+    now = time.time()
+
+    with _lock:
+        entry = _cache.get(key)
+        fresh = entry and entry["version"] == _version and now - entry["computed_at"] < OPEN_WINDOW_TTL
+        if entry and (entry["closed"] or fresh):
+            _cache.move_to_end(key)
+            return entry["result"], True
+        version = _version
+        committed_until = _committed_until
+
+    positions = _load_positions(session, Models, start, end)
+    result = {"start": start, "end": end, "points": 0, "vessels": 0, "cells": []}
+    if positions is not None:
+        result.update(
+            points=len(positions[0]),
+            vessels=int(positions[0].max()) + 1,
+            cells=aggregate_density(*positions, resolution),
+        )
+
+    with _lock:
+        _cache[key] = {
+            "result": result,
+            "version": version,
+            "computed_at": now,
+            "closed": not open_window and committed_until is not None and end < committed_until,
+        }
+        _cache.move_to_end(key)
+        while len(_cache) > DENSITY_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result, False
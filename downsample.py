@@ -0,0 +1,144 @@
+# downsample.py
+import calendar
+from datetime import datetime, timedelta
+
+import numpy as np
+import shapely
+from sqlalchemy import Integer, cast, exists, func, tuple_
+from sqlalchemy.sql.util import ClauseAdapter
+
+
+# =========================================
+# 歷史軌跡降採樣
+# =========================================
+# ?bucket=<秒>      每艘船每個時間區間只留最新一筆（epoch 秒對齊）
+#                   在 SQL 端過濾，分頁 / 串流結果一致，被略過的資料也不必轉成 ORM 物件
+# ?tolerance=<度>   每艘船的軌跡以 Douglas–Peucker 簡化（經緯度平面，與 geometry_cache 相同），
+#                   序列化前對每一頁 / 串流的每一批套用，軌跡頭尾一定保留
+# 兩者可同時使用（先 bucket 再 tolerance），輸出順序不變
+#
+# 啟用分區時 filter_buckets 只在各分區內比對；bucket 跨越分區邊界（例如 bucket=86400 配週分區的週界，
+# 或 bucket 比分區還長）時，較舊分區的資料再由 drop_bucket_duplicates 與較新的分區比對
+def downsample_params(args):
+    """解析 tolerance / bucket 參數，未指定為 None；格式錯誤丟 ValueError"""
+    try:
+        tolerance = float(args["tolerance"]) if args.get("tolerance") else None
+        bucket = int(args["bucket"]) if args.get("bucket") else None
+    except ValueError:
+        raise ValueError(f"無效的 tolerance / bucket: {args.get('tolerance')} / {args.get('bucket')}")
+
+    if tolerance is not None and not tolerance > 0:
+        raise ValueError(f"tolerance 必須大於 0: {tolerance}")
+    if bucket is not None and bucket <= 0:
+        raise ValueError(f"bucket 必須大於 0: {bucket}")
+    return tolerance, bucket
+
+
+def filter_buckets(query, Model, bucket):
+    """
+    query：已套用篩選條件的查詢
+    每個 (ship_id, bucket 秒區間) 只留最新一筆：同一艘船、同一區間內沒有更新的資料
+    （更新的那筆也要符合相同條件），以 (ship_id, timestamp) 索引逐筆檢查，
+    分頁時只需處理讀到的那幾頁，不必先把整個查詢範圍分組
+    """
+    later = Model.__table__.alias("later")
+    epoch = cast(func.strftime("%s", Model.timestamp), Integer)
+    bucket_end = func.datetime((epoch // bucket + 1) * bucket, "unixepoch")
+
+    conds = [
+        later.c.ship_id == Model.ship_id,
+        later.c.timestamp >= Model.timestamp,
+        later.c.timestamp < bucket_end,
+        tuple_(later.c.timestamp, later.c.id) > tuple_(Model.timestamp, Model.id),
+    ]
+    if query.whereclause is not None:
+        conds.append(ClauseAdapter(later).traverse(query.whereclause))
+    return query.filter(~exists().where(*conds))
+
+
+_EPOCH = datetime(1970, 1, 1)
+_PROBE_CHUNK = 500
+
+
+def bucket_end(timestamp, bucket):
+    """timestamp 所屬 bucket 區間的結束時間（epoch 秒對齊，與 filter_buckets 相同）"""
+    epoch = calendar.timegm(timestamp.utctimetuple())
+    return _EPOCH + timedelta(seconds=(epoch // bucket + 1) * bucket)
+
+
+def _part_start(Model):
+    """分區 / 封存分區的起始時間；未分區的表格為 None"""
+    return getattr(Model, "__partition_start__", None) or getattr(Model, "start", None)
+
+
+def _probe(query, Model, ship_ids, before):
+    """較新的分區中，ship_ids 這些船在 before 之前符合條件的 (ship_id, timestamp)"""
+    if hasattr(query, "probe"):
+        return query.probe(ship_ids, before)
+    ship_ids = sorted(ship_ids)
+    found = []
+    for i in range(0, len(ship_ids), _PROBE_CHUNK):
+        found += query.filter(
+            Model.ship_id.in_(ship_ids[i:i + _PROBE_CHUNK]), Model.timestamp < before,
+        ).with_entities(Model.ship_id, Model.timestamp).all()
+    return found
+
+
+def drop_bucket_duplicates(rows, newer_parts, bucket):
+    """
+    rows：某個分區依 (timestamp, id) 由新到舊的資料（分區內已做過 filter_buckets）
+    newer_parts：比它新的分區 [(query, Model), ...]（見 pagination.paginate_partitions）
+    同一個 (ship_id, bucket) 在較新的分區已有符合條件的資料時略過；
+    bucket 沒有跨進較新分區的資料不必查詢
+    """
+    ends = [None if r.ship_id is None else bucket_end(r.timestamp, bucket) for r in rows]
+    earliest = {}    # ship_id → 較新分區中最早的 timestamp
+    for query, Model in newer_parts:
+        start = _part_start(Model)
+        reach = [e for e in ends if e is not None and (start is None or e > start)]
+        if not reach:
+            continue
+        ship_ids = {r.ship_id for r, e in zip(rows, ends) if e is not None and (start is None or e > start)}
+        for ship_id, timestamp in _probe(query, Model, ship_ids, max(reach)):
+            if ship_id not in earliest or timestamp < earliest[ship_id]:
+                earliest[ship_id] = timestamp
+
+    return [
+        r for r, e in zip(rows, ends)
+        if e is None or r.ship_id not in earliest or earliest[r.ship_id] >= e
+    ]
+
+
+def simplify_tracks(rows, tolerance):
+    """
+    rows：ORM 物件列表，回傳簡化後保留的 rows（順序不變）
+
+    每艘船的點連成一條線（z 存原始位置），整批一次 shapely.simplify，
+    留下來的頂點 z 值就是要保留的資料
+    """
+    if len(rows) < 3:
+        return rows
+
+    ship_codes = {}
+    codes = np.array([ship_codes.setdefault(r.ship_id, len(ship_codes)) for r in rows])
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, codes[order][1:] != codes[order][:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+
+    # 每艘船的第一個點一定保留（只有一個點的船也在這裡）
+    keep = [order[starts]]
+    is_line = np.repeat(counts >= 2, counts)
+    if is_line.any():
+        points = order[is_line]
+        coords = np.column_stack([
+            [rows[i].lon for i in points],
+            [rows[i].lat for i in points],
+            points,
+        ]).astype(float)
+        group = np.repeat(np.arange((counts >= 2).sum()), counts[counts >= 2])
+
+        lines = shapely.linestrings(coords, indices=group)
+        simplified = shapely.simplify(lines, tolerance, preserve_topology=False)
+        keep.append(shapely.get_coordinates(simplified, include_z=True)[:, 2].astype(np.int64))
+
+    return [rows[i] for i in np.unique(np.concatenate(keep))]
@@ -0,0 +1,86 @@
+# events.py
+import json
+import queue
+import threading
+
+from config import SSE_QUEUE_SIZE
+
+
+# =========================================
+# Server-Sent Events 廣播
+# =========================================
+# fetch_data 每輪 commit 後 publish("cycle", ...)，
+# /api/stream 的每個連線各有一個佇列，事件只序列化一次再放進所有佇列
+CLOSED = None    # 佇列中收到此值表示連線已被移除，/api/stream 應結束回應
+READY = "event: ready\ndata: {}\n\n"
+
+
+class Broadcaster:
+    """
+    簡單的一對多廣播；佇列滿了（client 太慢或已斷線）就移除該 client：
+    清空佇列後放入 CLOSED，讓該連線結束，瀏覽器的 EventSource 會自動重連
+    """
+
+    def __init__(self, queue_size=SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._last_id = 0
+        self._last_event = None
+
+    def subscribe(self):
+        """
+        新增一個 client；連線後第一個事件固定是最近一次的 cycle（還沒有任何一輪時為 ready），
+        頁面以這個事件做初始載入，不必另外先呼叫一次 API（否則開頁會載入兩次）
+        """
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            q.put_nowait(self._last_event if self._last_event is not None else READY)
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, event, data):
+        """回傳收到事件的 client 數"""
+        with self._lock:
+            self._last_id += 1
+            message = (
+                f"id: {self._last_id}\n"
+                f"event: {event}\n"
+                f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+            )
+            self._last_event = message
+
+            alive = []
+            for q in self._subscribers:
+                try:
+                    q.put_nowait(message)
+                    alive.append(q)
+                except queue.Full:
+                    self._close(q)
+            dropped = len(self._subscribers) - len(alive)
+            self._subscribers = alive
+
+        if dropped:
+            print(f"📡 SSE：移除 {dropped} 個未讀取的連線")
+        return len(alive)
+
+    @staticmethod
+    def _close(q):
+        """丟棄還沒送出的事件（重連後會重播最近一次），只留下 CLOSED"""
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        q.put_nowait(CLOSED)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+broadcaster = Broadcaster()
@@ -1,49 +1,71 @@
+import calendar
 import json
-from datetime import datetime
-from shapely.geometry import Point
-from shapely.ops import nearest_points
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 import cloudscraper
 from sqlalchemy import func
 import os
-from config import TAIWAN_12NM_POLYGON, TAIWAN_24NM_POLYGON
-from utils import safe_float, haversine, log_failed_record
+import config
+from utils import safe_float, log_failed_record
 from models import (
     db, ShipAIS,
     TestShipAIS, BoatShipAIS,
     BoatCheck12AIS, BoatCheck24AIS,
     CCGShipAIS, CCGCheck12ShipAIS, CCGCheck24ShipAIS,
     TestSession, BoatSession, BoatCheck12Session, BoatCheck24Session,
-    CCGSession, CCGCheck12Session, CCGCheck24Session, ChinaBoatSession, ChinaBoatAIS
+    CCGSession, CCGCheck12Session, CCGCheck24Session, ChinaBoatSession, ChinaBoatAIS,
+    LatestShipAIS, ChinaBoatLatestAIS, ShipName, ChinaBoatShipName, Vessel, ChinaBoatVessel,
+    BoatVessel, BoatCheck12Vessel, BoatCheck24Vessel,
+    VESSEL_STATIC_COLUMNS, commit_all, rollback_all
 )
 
 # 這裡就是你的 line_push.py 檔案
 from line_push import send_line_alert, send_custom_zone_line_alert
 from config import ENABLE_LINE_PUSH, ENABLE_EMAIL_ALERT, ALERT_EMAIL_TO
+from config import FETCH_MAX_WORKERS, FETCH_TIMEOUT, TILE_PLAN_ZOOM, GEOFENCE_ALL_VESSELS
+from geofence import classify_positions, distance_to_12nm, distance_to_24nm
+from tile_planner import plan_tiles
+from bulk_writer import BulkWriter
+from change_filter import ChangeFilter
+from config import HISTORY_DEDUP, LATEST_RETENTION_DAYS
 from mail_alert import send_alert_email, build_html_email
 
+from snapshot import publish_fleet_snapshot
+from density import notify_data_changed
+from partitions import ingest_model
+from trackstore import track_store, tracks_ship
+from vessels import VesselRegistry, history_row
+from rollups import record_cycle
+from events import broadcaster
 
-
-# === 自訂警戒區 ===
-from shapely.geometry import shape
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+# === 自訂警戒區（記憶體快取 + STRtree，警戒區變動時才重建）===
+from zone_registry import get_zones, zones_containing, zones_version, nearest_zone
 
 # ⭐ 全域變數（提供 API 用）
 last_custom_zone_list = []
+last_fetch_stats = {}
+last_zone_vessel_list = []
 
-# 警戒區 DB 路徑
-ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
-ALARM_DB_PATH = os.path.join(ROOT_DIR, "db", "alarm_zones.db")
+# 歷史資料去重狀態（跨輪保留在記憶體）
+history_filter = ChangeFilter(static_columns=VESSEL_STATIC_COLUMNS)
+# 船舶靜態資料目前的版本（歷史表只存 vessel_id，見 vessels.py）
+ais_vessels = VesselRegistry(Vessel)
+chinaboat_vessels = VesselRegistry(ChinaBoatVessel)
+boat_vessels = VesselRegistry(BoatVessel)
+boat_check12_vessels = VesselRegistry(BoatCheck12Vessel)
+boat_check24_vessels = VesselRegistry(BoatCheck24Vessel)
+vessel_registries = (ais_vessels, chinaboat_vessels, boat_vessels, boat_check12_vessels, boat_check24_vessels)
 
-AlarmEngine = create_engine(
-    f"sqlite:///{ALARM_DB_PATH}",
-    connect_args={"check_same_thread": False}
-)
-AlarmSessionLocal = sessionmaker(bind=AlarmEngine)
+# 上一輪在 12nm / 12–24nm 內的海警船 ship_id（SSE 推播進入 / 離開用）
+last_ccg_zones = {"12nm": set(), "12-24nm": set()}
 
 
 # =========================================
-# MarineTraffic API URL 列表
+# MarineTraffic API URL 列表（舊的固定列表）
+# TILE_PLAN_ZOOM=0 時使用，也作為規劃結果的比較基準
 # =========================================
 urls = [
     "https://www.marinetraffic.com/getData/get_data_json_4/z:10/X:423/Y:219/station:0",
@@ -136,40 +158,135 @@ urls = [
 
 
 
-# 建立爬蟲 client
-scraper = cloudscraper.create_scraper()
+# 建立爬蟲 client：每個下載執行緒各自一個 scraper
+# （cloudscraper 的 cookie / challenge 狀態不是 thread-safe，不能跨執行緒共用）
+# 下載執行緒跨輪保留（見 _fetch_pool），scraper 的 keep-alive 連線也就跨輪沿用
+_local = threading.local()
+
+
+def _scraper():
+    scraper = getattr(_local, "scraper", None)
+    if scraper is None:
+        scraper = _local.scraper = cloudscraper.create_scraper()
+    return scraper
+
+
+_fetch_pool = {"workers": None, "executor": None}
+
+
+def _executor(max_workers):
+    """下載用的執行緒池（跨輪共用，worker 數變動時才重建）"""
+    max_workers = max(1, max_workers)
+    if _fetch_pool["workers"] != max_workers:
+        if _fetch_pool["executor"] is not None:
+            _fetch_pool["executor"].shutdown(wait=False)
+        _fetch_pool["executor"] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tile")
+        _fetch_pool["workers"] = max_workers
+    return _fetch_pool["executor"]
 
 
 # =========================================
-# 共用函式：有就更新，沒有就新增
+# 依警戒範圍規劃 tile（警戒區沒變就沿用上次結果）
 # =========================================
-def upsert_ship(session, Model, ship_id, values_dict):
-    record = session.query(Model).filter_by(ship_id=ship_id).first()
-    if record:
-        for key, val in values_dict.items():
-            setattr(record, key, val)
-    else:
-        session.add(Model(**values_dict))
-
-
-def load_custom_alarm_zones():
-    """載入自訂警戒區，轉成 Shapely Polygon"""
-    session = AlarmSessionLocal()
-    rows = session.execute(
-        text("SELECT id, name, geojson FROM alarm_zones")
-    ).fetchall()
-    session.close()
-
-    zones = []
-    for row in rows:
-        geom = json.loads(row[2])
-        zones.append({
-            "id": row[0],
-            "name": row[1],
-            "polygon": shape(geom)
-        })
+_tile_plan_cache = {"key": None, "urls": None}
+
 
-    return zones
+def plan_fetch_urls(custom_zones):
+    """回傳本輪要下載的 URL 列表"""
+    if not TILE_PLAN_ZOOM:
+        return urls
+
+    key = (TILE_PLAN_ZOOM, zones_version())
+    if _tile_plan_cache["key"] != key:
+        plan = plan_tiles(
+            TILE_PLAN_ZOOM,
+            [config.TAIWAN_24NM_POLYGON] + [z["polygon"] for z in custom_zones],
+            legacy_urls=urls,
+        )
+        report = plan["report"]
+        print(f"🗺️ Tile 規劃 z{TILE_PLAN_ZOOM}: {report['planned_requests']} 個請求"
+              f"（舊列表 {report['legacy_requests']} 個，重疊 {report['legacy_overlap_ratio']:.0%}，"
+              f"每輪省下 {report['saved_requests']} 個請求）")
+
+        if not plan["urls"]:
+            print("⚠️ Tile 規劃結果為空，改用固定 URL 列表")
+            plan["urls"] = urls
+
+        _tile_plan_cache["key"] = key
+        _tile_plan_cache["urls"] = plan["urls"]
+
+    return _tile_plan_cache["urls"]
+
+
+# =========================================
+# 並行下載 tile
+# =========================================
+def _fetch_tile(url):
+    """下載單一 tile，回傳 (data, error, 耗時秒數)"""
+    start = time.perf_counter()
+    try:
+        response = _scraper().get(url, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        return response.json(), None, time.perf_counter() - start
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start
+
+
+def fetch_tiles(tile_urls, max_workers=FETCH_MAX_WORKERS):
+    """
+    並行下載所有 tile
+    回傳 [(url, data), ...]，順序與 tile_urls 相同（失敗的 data 為 None），
+    確保後續分類結果不受完成順序影響
+    """
+    global last_fetch_stats
+
+    cycle_start = time.perf_counter()
+    results = [None] * len(tile_urls)
+    tile_times = [0.0] * len(tile_urls)
+
+    pool = _executor(max_workers)
+    futures = {pool.submit(_fetch_tile, url): i for i, url in enumerate(tile_urls)}
+    for future in as_completed(futures):
+        i = futures[future]
+        data, error, elapsed = future.result()
+        tile_times[i] = elapsed
+        if error:
+            log_failed_record({"url": tile_urls[i]}, f"Fetch error: {error}")
+        results[i] = (tile_urls[i], data)
+
+    cycle_time = time.perf_counter() - cycle_start
+    failed = sum(1 for _, data in results if data is None)
+
+    last_fetch_stats = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "workers": max_workers,
+        "tiles": len(tile_urls),
+        "failed": failed,
+        "cycle_seconds": round(cycle_time, 3),
+        "tile_seconds": {url: round(t, 3) for url, t in zip(tile_urls, tile_times)},
+    }
+
+    slowest = sorted(zip(tile_times, tile_urls), reverse=True)[:3]
+    print(f"⏱️ 下載 {len(tile_urls)} 個 tile（{max_workers} workers）"
+          f"耗時 {cycle_time:.2f}s，失敗 {failed} 個，"
+          f"單一 tile 總和 {sum(tile_times):.2f}s")
+    for t, url in slowest:
+        print(f"   🐢 {t:.2f}s {url}")
+
+    return results
+
+
+# =========================================
+# 海警船進出 12nm / 12–24nm（與上一輪比較）
+# =========================================
+def _zone_changes(current):
+    """回傳 {區域: {"entered": [...], "left": [...]}}，並記住本輪名單"""
+    changes = {}
+    for zone, ids in current.items():
+        prev = last_ccg_zones.get(zone, set())
+        changes[zone] = {"entered": sorted(ids - prev), "left": sorted(prev - ids)}
+        last_ccg_zones[zone] = ids
+    return changes
 
 
 # =========================================
@@ -182,8 +299,13 @@ def fetch_data(force_push=False):
     print(f"[{timestamp}] 🚢 Fetching AIS data...")
 
     seen_ships = set()
+    records = []   # 本輪所有有效船隻（依 tile 順序）
+    changed_positions = []   # 位置有變化（有寫入歷史）的船，SSE 推播用
+    track_rows = []          # 寫入單船軌跡庫的資料（commit 成功後才 append，見 trackstore.py）
+    epoch = calendar.timegm(timestamp.utctimetuple())
+    writer = BulkWriter()
     # 讀取自訂警戒區
-    custom_zones = load_custom_alarm_zones()
+    custom_zones = get_zones()
     CN_custom_zone_list = []   # ⭐ 存 CN 船在自訂警戒區裡的結果
 
 
@@ -193,24 +315,25 @@ def fetch_data(force_push=False):
     ships_outside_list = []
     # ************
 
-    # === 每次重抓前，清空 data_test.db ===
+    # === data_test.db 只保留本輪出現的船（upsert 後刪除舊資料，同一個 transaction）===
+    writer.prune(TestShipAIS, before=timestamp)
+    # === ship_latest 只保留 LATEST_RETENTION_DAYS 天內出現過的船，不隨看過的船無限成長 ===
+    latest_cutoff = timestamp - timedelta(days=LATEST_RETENTION_DAYS)
+    writer.prune(LatestShipAIS, before=latest_cutoff)
+    writer.prune(ChinaBoatLatestAIS, before=latest_cutoff)
+
+    # === 歷史資料寫入本輪所屬的時間分區（未啟用分區時即原表格，見 partitions.py）===
+    # 建立分區失敗（如 DB 被鎖住）時本輪不寫 ais_data / chinaboat 歷史，其他表格照常寫入，下一輪重試
     try:
-        TestSession.query(TestShipAIS).delete()
-        TestSession.commit()
-        print("🧹 Cleared data_test.db")
+        ais_history = ingest_model(ShipAIS, timestamp)
+        chinaboat_history = ingest_model(ChinaBoatAIS, timestamp)
     except Exception as e:
-        TestSession.rollback()
-        log_failed_record({}, f"Clear data_test failed: {e}")
+        print(f"⚠️ 無法取得本輪的歷史分區，略過歷史寫入: {e}")
+        log_failed_record({"url": "N/A - history partition"}, f"partition error: {e}")
+        ais_history = chinaboat_history = None
 
-    scraper = cloudscraper.create_scraper()
-
-    for url in urls:
-        try:
-            response = scraper.get(url, timeout=20)
-            response.raise_for_status()
-            data = response.json()
-        except Exception as e:
-            log_failed_record({"url": url}, f"Fetch error: {e}")
+    for url, data in fetch_tiles(plan_fetch_urls(custom_zones)):
+        if data is None:
             continue
 
         key = url.replace("https://www.marinetraffic.com/getData/",
@@ -257,81 +380,155 @@ def fetch_data(force_push=False):
                 "width": row.get("WIDTH"),
             }
 
-            # === 所有船隻歷史資料 ===
-            db.session.add(ShipAIS(**record_kwargs))
+            # === 所有船隻歷史資料（沒變化的船略過，見 change_filter.py）===
+            write_history = ais_history is not None and (
+                not HISTORY_DEDUP or history_filter.should_write(record_kwargs)
+            )
+            if write_history:
+                writer.add(ais_history, history_row(record_kwargs, ais_vessels.resolve(record_kwargs)))
+                changed_positions.append([
+                    ship_id, shipname, round(lat, 5), round(lon, 5),
+                    round(record_kwargs["speed"], 1), round(record_kwargs["course"], 1),
+                ])
+                if tracks_ship(shipname):
+                    track_rows.append((
+                        ship_id, epoch, lat, lon, record_kwargs["speed"], record_kwargs["course"],
+                    ))
             # === 最新資料（覆蓋寫入）===
-            upsert_ship(TestSession, TestShipAIS, ship_id, record_kwargs)
+            writer.upsert(TestShipAIS, record_kwargs)
+            writer.upsert(LatestShipAIS, record_kwargs)
+
+            # === 船名索引（新的 ship_id + 船名組合才會寫入）===
+            name_row = {"ship_id": ship_id, "shipname": shipname, "first_seen": timestamp}
+            if shipname:
+                writer.add_unique(ShipName, name_row)
 
             # === 若為中國籍船舶 (flag == "CN") ===
             if record_kwargs.get("flag") == "CN":
-                ChinaBoatSession.add(ChinaBoatAIS(**record_kwargs))
-                # === 自訂警戒區判斷 ===
-                p = Point(lon, lat)
-
-                for zone in custom_zones:
-                    if p.within(zone["polygon"]):
-                        CN_custom_zone_list.append({
-                            "zone_id": zone["id"],
-                            "zone_name": zone["name"],
-                            "shipname": shipname,
-                            "lat": lat,
-                            "lon": lon,
-                            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S")
-                        })
-
-            # === 若為海警船 ===
-            if shipname.startswith("CHINACOASTGUARD"):
-                BoatSession.add(BoatShipAIS(**record_kwargs))
-                upsert_ship(CCGSession, CCGShipAIS, ship_id, record_kwargs)
-
-                p = Point(lon, lat)
-                in_12nm = p.within(TAIWAN_12NM_POLYGON)
-                in_24nm = p.within(TAIWAN_24NM_POLYGON)
-
-                # *** 修改：將 timestamp 轉為字串 ***
-                # line_push 函式需要的是字串
-                time_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
-
-                # ✅ 12nm 內
-                if in_12nm:
-                    BoatCheck12Session.add(BoatCheck12AIS(**record_kwargs))
-                    upsert_ship(CCGCheck12Session, CCGCheck12ShipAIS,
-                                ship_id, record_kwargs)
-                    print(f"🚨 {shipname} 進入 12nm")
-
-                    # *** 新增 ***
-                    # 加入到 12 海浬推播列表
-                    ships_inside_list.append({
-                        'shipname': shipname,
-                        'lat': lat,
-                        'lon': lon,
-                        'course': record_kwargs['course'],
-                        'speed': record_kwargs['speed'],
-                        'timestamp': time_str
-                    })
-
-                # ✅ 12–24nm 間（在 24nm 內但不在 12nm 內）
-                elif in_24nm and not in_12nm:
-                    BoatCheck24Session.add(BoatCheck24AIS(**record_kwargs))
-                    upsert_ship(CCGCheck24Session, CCGCheck24ShipAIS,
-                                ship_id, record_kwargs)
-                    print(f"⚠️ {shipname} 在 12–24nm 之間")
-
-                    # *** 新增 ***
-                    # 計算到 12nm 邊界的距離 (line_push 函式需要這個)
-                    p_12nm, _ = nearest_points(TAIWAN_12NM_POLYGON, p)
-                    distance_km = haversine(p.y, p.x, p_12nm.y, p_12nm.x)
-
-                    # 加入到 12-24 海浬推播列表
-                    ships_outside_list.append({
-                        'shipname': shipname,
-                        'lat': lat,
-                        'lon': lon,
-                        'course': record_kwargs['course'],
-                        'speed': record_kwargs['speed'],
-                        'timestamp': time_str,
-                        'distance_km': distance_km  # 推播函式需要的額外欄位
-                    })
+                if write_history:
+                    writer.add(chinaboat_history, history_row(
+                        record_kwargs, chinaboat_vessels.resolve(record_kwargs)
+                    ))
+                writer.upsert(ChinaBoatLatestAIS, record_kwargs)
+                if shipname:
+                    writer.add_unique(ChinaBoatShipName, name_row)
+
+            records.append(record_kwargs)
+
+    # === 自訂警戒區判斷：所有 CN 船一次查詢 STRtree ===
+    cn_records = [r for r in records if r["flag"] == "CN"]
+    zone_hits = zones_containing(
+        [r["lon"] for r in cn_records],
+        [r["lat"] for r in cn_records],
+    )
+    for pi, zone in zone_hits:
+        r = cn_records[pi]
+        CN_custom_zone_list.append({
+            "zone_id": zone["id"],
+            "zone_name": zone["name"],
+            "shipname": r["shipname"],
+            "lat": r["lat"],
+            "lon": r["lon"],
+            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+    # === 12nm / 24nm 判斷：整輪座標一次向量化判斷 ===
+    lons = np.array([r["lon"] for r in records], dtype=float)
+    lats = np.array([r["lat"] for r in records], dtype=float)
+    is_ccg = np.array([r["shipname"].startswith("CHINACOASTGUARD") for r in records], dtype=bool)
+    in_12nm, in_24nm = classify_positions(
+        lons, lats, mask=None if GEOFENCE_ALL_VESSELS else is_ccg,
+    )
+
+    # === 12–24nm 船隻到 12nm 邊界的距離（邊界線段索引，一次算完）===
+    in_band = in_24nm & ~in_12nm
+    need_distance = in_band if GEOFENCE_ALL_VESSELS else (in_band & is_ccg)
+    distance_12nm_km = np.full(len(records), np.nan)
+    if need_distance.any():
+        distance_12nm_km[need_distance] = distance_to_12nm(
+            lons[need_distance], lats[need_distance]
+        )["distance_km"]
+
+    # *** 修改：將 timestamp 轉為字串 ***
+    # line_push 函式需要的是字串
+    time_str = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+
+    # === 若為海警船 ===
+    for i in np.flatnonzero(is_ccg):
+        record_kwargs = records[i]
+        shipname = record_kwargs["shipname"]
+        lat = record_kwargs["lat"]
+        lon = record_kwargs["lon"]
+
+        writer.add(BoatShipAIS, history_row(record_kwargs, boat_vessels.resolve(record_kwargs)))
+        writer.upsert(CCGShipAIS, record_kwargs)
+
+        # ✅ 12nm 內
+        if in_12nm[i]:
+            writer.add(BoatCheck12AIS, history_row(record_kwargs, boat_check12_vessels.resolve(record_kwargs)))
+            writer.upsert(CCGCheck12ShipAIS, record_kwargs)
+            print(f"🚨 {shipname} 進入 12nm")
+
+            # *** 新增 ***
+            # 加入到 12 海浬推播列表
+            ships_inside_list.append({
+                'shipname': shipname,
+                'lat': lat,
+                'lon': lon,
+                'course': record_kwargs['course'],
+                'speed': record_kwargs['speed'],
+                'timestamp': time_str
+            })
+
+        # ✅ 12–24nm 間（在 24nm 內但不在 12nm 內）
+        elif in_24nm[i]:
+            writer.add(BoatCheck24AIS, history_row(record_kwargs, boat_check24_vessels.resolve(record_kwargs)))
+            writer.upsert(CCGCheck24ShipAIS, record_kwargs)
+            print(f"⚠️ {shipname} 在 12–24nm 之間")
+
+            # *** 新增 ***
+            # 到 12nm 邊界的距離 (line_push 函式需要這個)
+            distance_km = float(distance_12nm_km[i])
+
+            # 加入到 12-24 海浬推播列表
+            ships_outside_list.append({
+                'shipname': shipname,
+                'lat': lat,
+                'lon': lon,
+                'course': record_kwargs['course'],
+                'speed': record_kwargs['speed'],
+                'timestamp': time_str,
+                'distance_km': distance_km  # 推播函式需要的額外欄位
+            })
+
+    # === 海警船每小時彙總（與上面的原始資料同一個 commit，見 rollups.py）===
+    ccg_idx = np.flatnonzero(is_ccg)
+    record_cycle(writer, timestamp, [records[i] for i in ccg_idx], in_12nm[ccg_idx], in_24nm[ccg_idx])
+
+    # === 全船舶 12/24nm 判斷結果（GEOFENCE_ALL_VESSELS=true 時）===
+    zone_vessels = []
+    if GEOFENCE_ALL_VESSELS:
+        zone_idx = np.flatnonzero(in_24nm | in_12nm)
+        distance_24nm_km = distance_to_24nm(lons[zone_idx], lats[zone_idx])["distance_km"]
+        nearest_zones = nearest_zone(lons[zone_idx], lats[zone_idx])
+        for i, d24, (zone, d_zone) in zip(zone_idx, distance_24nm_km, nearest_zones):
+            r = records[i]
+            zone_vessels.append({
+                "ship_id": r["ship_id"],
+                "shipname": r["shipname"],
+                "flag": r["flag"],
+                "lat": r["lat"],
+                "lon": r["lon"],
+                "zone": "12nm" if in_12nm[i] else "12-24nm",
+                "distance_12nm_km": None if in_12nm[i] else round(float(distance_12nm_km[i]), 3),
+                "distance_24nm_km": round(float(d24), 3),
+                "nearest_zone": zone["name"] if zone else None,
+                "distance_zone_km": round(d_zone, 3) if zone else None,
+                "timestamp": time_str,
+            })
+        print(f"🛰️ 全船舶判斷：12nm 內 {int(in_12nm.sum())} 艘，"
+              f"12–24nm {int((in_24nm & ~in_12nm).sum())} 艘")
+    last_zone_vessel_list[:] = zone_vessels
 
 
     # === *** 新增：觸發推播（全部 URL 抓完後才執行一次） *** ===
@@ -343,6 +540,7 @@ def fetch_data(force_push=False):
         unique_cn_zones[key] = s
 
     CN_custom_zone_list = list(unique_cn_zones.values())
+    last_custom_zone_list[:] = CN_custom_zone_list
 
 
 
@@ -465,28 +663,56 @@ def fetch_data(force_push=False):
 
     # === *** 推播區塊結束 *** ===
 
-    # === 提交各 DB ===
+    # === 提交各 DB（unified 模式為單一 transaction）===
     try:
-        db.session.commit()
-        TestSession.commit()
-        BoatSession.commit()
-        BoatCheck12Session.commit()
-        BoatCheck24Session.commit()
-        CCGSession.commit()
-        CCGCheck12Session.commit()
-        CCGCheck24Session.commit()
-        ChinaBoatSession.commit()
+        writer.flush()
+        commit_all()
+        dedup = history_filter.commit()
+        if HISTORY_DEDUP:
+            print(f"🧮 歷史去重：寫入 {dedup['written']} 艘，略過 {dedup['skipped']} 艘（無變化）")
+        new_versions = sum(registry.commit() for registry in vessel_registries)
+        if new_versions:
+            print(f"🪪 船舶靜態資料：新增 {new_versions} 個版本")
 
     except Exception as e:
-        db.session.rollback()
-        TestSession.rollback()
-        BoatSession.rollback()
-        BoatCheck12Session.rollback()
-        BoatCheck24Session.rollback()
-        CCGSession.rollback()
-        CCGCheck12Session.rollback()
-        CCGCheck24Session.rollback()
-        ChinaBoatSession.rollback()
+        rollback_all()
+        history_filter.rollback()
+        for registry in vessel_registries:
+            registry.rollback()
         log_failed_record({"url": "N/A - DB Commit"}, f"DB commit error: {e}")
 
+    else:
+        # 密度網格中仍在進行的時間窗快取失效；end 早於本輪 timestamp 的時間窗之後不會再有資料
+        notify_data_changed(timestamp)
+
+        # === 單船軌跡庫（與歷史表寫入相同的資料；失敗的部分下一輪由歷史表補上）===
+        try:
+            track_store.append(track_rows, timestamp)
+        except Exception as e:
+            print(f"⚠️ 軌跡庫寫入失敗，下一輪由歷史資料補上: {e}")
+
+        # === 發布 CCG 即時狀態快照（API 直接回傳，不必每次查 DB）===
+        try:
+            snapshot = publish_fleet_snapshot()
+        except Exception as e:
+            snapshot = None
+            print(f"⚠️ CCG 快照建立失敗，API 改查 DB: {e}")
+
+        # === SSE 推播（/api/stream）===
+        ccg_zones = {
+            "12nm": {records[i]["ship_id"] for i in np.flatnonzero(is_ccg & in_12nm)},
+            "12-24nm": {records[i]["ship_id"] for i in np.flatnonzero(is_ccg & in_band)},
+        }
+        clients = broadcaster.publish("cycle", {
+            "timestamp": time_str,
+            "snapshot_version": snapshot.version if snapshot else None,
+            # [ship_id, shipname, lat, lon, speed, course]
+            "positions": changed_positions,
+            "zones": _zone_changes(ccg_zones),
+            "alarms": CN_custom_zone_list,
+            "ccg_check12": snapshot.payloads["ccg_check12"] if snapshot else None,
+            "ccg_check24": snapshot.payloads["ccg_check24"] if snapshot else None,
+        })
+        print(f"📡 SSE 推播：{len(changed_positions)} 艘位置更新，{clients} 個連線")
+
 
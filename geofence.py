@@ -0,0 +1,142 @@
+# geofence.py
+import threading
+
+import numpy as np
+import shapely
+
+import config
+from utils import haversine_np
+
+
+# =========================================
+# 12nm / 24nm 多邊形（第一次使用時載入並 prepare）
+# =========================================
+def _polygons():
+    polygons = (config.TAIWAN_12NM_POLYGON, config.TAIWAN_24NM_POLYGON)
+    for geom in polygons:
+        if geom is not None and not shapely.is_prepared(geom):
+            shapely.prepare(geom)
+    return polygons
+
+
+def _contains(polygon, lons, lats):
+    if polygon is None or len(lons) == 0:
+        return np.zeros(len(lons), dtype=bool)
+    return shapely.contains_xy(polygon, lons, lats)
+
+
+# =========================================
+# 整輪一次判斷 12nm / 24nm
+# =========================================
+def classify_positions(lons, lats, mask=None):
+    """
+    以 Shapely 2 向量化 API 一次判斷整批座標
+
+    lons / lats：經緯度陣列
+    mask：只判斷 mask 為 True 的位置（例如只看海警船），其餘回傳 False
+
+    回傳 (in_12nm, in_24nm) 兩個 bool 陣列，長度與輸入相同
+    與 Point.within(polygon) 結果一致（邊界上的點不算在內）
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    in_12nm = np.zeros(len(lons), dtype=bool)
+    in_24nm = np.zeros(len(lons), dtype=bool)
+
+    idx = np.arange(len(lons)) if mask is None else np.flatnonzero(mask)
+    if len(idx) == 0:
+        return in_12nm, in_24nm
+
+    polygon_12nm, polygon_24nm = _polygons()
+    in_12nm[idx] = _contains(polygon_12nm, lons[idx], lats[idx])
+    in_24nm[idx] = _contains(polygon_24nm, lons[idx], lats[idx])
+    return in_12nm, in_24nm
+
+
+# =========================================
+# 邊界距離索引
+# =========================================
+class BoundaryIndex:
+    """
+    把多邊形邊界切成線段放進 STRtree
+    批次查出每個座標最近的邊界線段，再用向量化投影 + haversine 算出最近點與距離
+
+    與 nearest_points(polygon, point) 相同，最近點以經緯度平面計算
+    """
+
+    def __init__(self, geometries):
+        starts, ends, owners = [], [], []
+        for owner, geom in enumerate(geometries):
+            if geom is None or geom.is_empty:
+                continue
+            for ring in shapely.get_parts(shapely.boundary(geom)):
+                coords = shapely.get_coordinates(ring)
+                if len(coords) < 2:
+                    continue
+                starts.append(coords[:-1])
+                ends.append(coords[1:])
+                owners.append(np.full(len(coords) - 1, owner))
+
+        self.geometries = list(geometries)
+        self.starts = np.concatenate(starts) if starts else np.empty((0, 2))
+        self.ends = np.concatenate(ends) if ends else np.empty((0, 2))
+        self.owners = np.concatenate(owners) if owners else np.empty(0, dtype=int)
+        self.tree = shapely.STRtree(shapely.linestrings(
+            np.stack([self.starts, self.ends], axis=1)
+        )) if len(self.starts) else None
+
+    def nearest(self, lons, lats):
+        """
+        回傳 dict（皆為與輸入等長的陣列）：
+          distance_km：到最近邊界的距離
+          lon / lat：最近邊界點
+          owner：最近邊界屬於第幾個 geometry
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        n = len(lons)
+        result = {
+            "distance_km": np.full(n, np.nan),
+            "lon": np.full(n, np.nan),
+            "lat": np.full(n, np.nan),
+            "owner": np.full(n, -1),
+        }
+        if self.tree is None or n == 0:
+            return result
+
+        point_idx, seg_idx = self.tree.query_nearest(shapely.points(lons, lats), all_matches=False)
+
+        a = self.starts[seg_idx]
+        ab = self.ends[seg_idx] - a
+        p = np.column_stack([lons[point_idx], lats[point_idx]])
+        denom = (ab ** 2).sum(axis=1)
+        t = np.divide(((p - a) * ab).sum(axis=1), denom, out=np.zeros(len(denom)), where=denom > 0)
+        q = a + np.clip(t, 0.0, 1.0)[:, None] * ab
+
+        result["lon"][point_idx] = q[:, 0]
+        result["lat"][point_idx] = q[:, 1]
+        result["owner"][point_idx] = self.owners[seg_idx]
+        result["distance_km"][point_idx] = haversine_np(p[:, 1], p[:, 0], q[:, 1], q[:, 0])
+        return result
+
+
+# 12nm / 24nm 邊界索引（第一次使用時才建立）
+_boundary_lock = threading.Lock()
+_boundaries = {}
+
+
+def _boundary(name, geom):
+    with _boundary_lock:
+        if name not in _boundaries:
+            _boundaries[name] = BoundaryIndex([geom])
+        return _boundaries[name]
+
+
+def distance_to_12nm(lons, lats):
+    """到 12nm 邊界的距離與最近點（dict，見 BoundaryIndex.nearest）"""
+    return _boundary("12nm", config.TAIWAN_12NM_POLYGON).nearest(lons, lats)
+
+
+def distance_to_24nm(lons, lats):
+    """到 24nm 邊界的距離與最近點（dict，見 BoundaryIndex.nearest）"""
+    return _boundary("24nm", config.TAIWAN_24NM_POLYGON).nearest(lons, lats)
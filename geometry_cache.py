@@ -0,0 +1,119 @@
+# geometry_cache.py
+import hashlib
+import json
+import os
+import time
+
+import shapely
+
+
+# =========================================
+# GeoJSON → WKB 快取
+# =========================================
+# 快取檔放在來源檔旁邊：
+#   <來源>.cache.json          來源檔 sha256 / mtime / 大小、解析耗時
+#   <來源>.wkb                 修復後（buffer(0)）的多邊形
+#   <來源>.tol<容許值>.wkb     簡化版本（simplify，保留拓撲）
+# 來源檔 mtime 或內容改變時才重新解析 GeoJSON
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _variant_path(path, tolerance):
+    return f"{path}.wkb" if not tolerance else f"{path}.tol{tolerance:g}.wkb"
+
+
+def _write_atomic(path, data, mode="wb"):
+    tmp = f"{path}.tmp"
+    with open(tmp, mode) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_meta(path):
+    try:
+        with open(f"{path}.cache.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(path, meta, tolerances):
+    """mtime 與大小相同直接視為有效；不同時再比對 sha256（例如 git checkout 改了 mtime）"""
+    if not meta:
+        return False
+    if any(not os.path.exists(_variant_path(path, t)) for t in [0, *tolerances]):
+        return False
+
+    stat = os.stat(path)
+    if meta.get("mtime") == stat.st_mtime and meta.get("size") == stat.st_size:
+        return True
+
+    if meta.get("sha256") == _file_sha256(path):
+        meta.update(mtime=stat.st_mtime, size=stat.st_size)
+        _write_atomic(f"{path}.cache.json", json.dumps(meta, indent=2), mode="w")
+        return True
+    return False
+
+
+def _build(path, build_fn, tolerances):
+    start = time.perf_counter()
+    geom = build_fn(path)
+    parse_seconds = time.perf_counter() - start
+    if geom is None:
+        return None
+
+    _write_atomic(_variant_path(path, 0), shapely.to_wkb(geom))
+    for tol in tolerances:
+        simplified = shapely.simplify(geom, tol, preserve_topology=True)
+        _write_atomic(_variant_path(path, tol), shapely.to_wkb(simplified))
+
+    stat = os.stat(path)
+    meta = {
+        "sha256": _file_sha256(path),
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "parse_seconds": round(parse_seconds, 4),
+        "tolerances": list(tolerances),
+    }
+    _write_atomic(f"{path}.cache.json", json.dumps(meta, indent=2), mode="w")
+    print(f"[geometry_cache] 🔨 建立 {os.path.basename(path)} 快取（解析 {parse_seconds * 1000:.0f} ms）")
+    return geom
+
+
+def load_cached_geometry(path, build_fn, tolerances=(), tolerance=0):
+    """
+    讀取 path 對應的 geometry，快取有效時直接讀 WKB
+
+    build_fn(path)：快取失效時用來解析來源檔、回傳 geometry 的函式
+    tolerances：需要一併建立的簡化容許值（度）
+    tolerance：要回傳的版本，0 = 原始（修復後）版本
+    """
+    if not os.path.exists(path):
+        return build_fn(path)
+
+    meta = _read_meta(path)
+    if tolerance and tolerance not in tolerances:
+        tolerances = (*tolerances, tolerance)
+
+    if not _is_fresh(path, meta, tolerances):
+        geom = _build(path, build_fn, tolerances)
+        if geom is None or not tolerance:
+            return geom
+
+    start = time.perf_counter()
+    with open(_variant_path(path, tolerance), "rb") as f:
+        geom = shapely.from_wkb(f.read())
+    elapsed = time.perf_counter() - start
+
+    if meta and not tolerance:
+        saved = meta.get("parse_seconds", 0) - elapsed
+        print(f"[geometry_cache] ⚡ {os.path.basename(path)} 讀取快取 {elapsed * 1000:.1f} ms"
+              f"（重新解析約 {meta.get('parse_seconds', 0) * 1000:.0f} ms，省下 {saved * 1000:.0f} ms）")
+    return geom
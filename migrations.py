@@ -0,0 +1,664 @@
+# migrations.py
+import calendar
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+# =========================================
+# 最新狀態表：ship_id 唯一索引
+# =========================================
+def ensure_unique_ship_id(engine, table):
+    """
+    替既有的最新狀態表補上 ship_id 唯一索引
+    建索引前先移除重複的 ship_id（保留 id 最大、也就是最後寫入的那筆）
+    """
+    index_name = f"ux_{table}_ship_id"
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='index' AND name=:name"),
+            {"name": index_name},
+        ).first()
+        if exists:
+            return
+
+        removed = conn.execute(text(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MAX(id) FROM {table} GROUP BY ship_id)"
+        )).rowcount
+        conn.execute(text(f"CREATE UNIQUE INDEX {index_name} ON {table} (ship_id)"))
+
+    print(f"🔧 {engine.url.database}: 建立 {index_name}（移除重複 {removed} 筆）")
+
+
+# =========================================
+# 補欄位：舊資料庫缺少 Model 後來新增的欄位
+# =========================================
+def ensure_column(engine, table, column, ddl):
+    """table 沒有 column 時以 ALTER TABLE ADD COLUMN 補上（ddl：型別與約束）"""
+    with engine.begin() as conn:
+        cols = {r[1] for r in conn.execute(text(f"PRAGMA table_info({table})"))}
+        if not cols or column in cols:
+            return
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    print(f"🔧 {engine.url.database}: {table} 新增欄位 {column}")
+
+
+def vessel_columns(conn, history_table, vessel_table, columns, alias="h"):
+    """
+    讀取歷史表時的欄位運算式：靜態欄位正規化到 vessels 後，歷史表中為 NULL，
+    改由 vessel_id 對應的 vessels 補上；回傳 (SELECT 欄位列表, FROM 子句)
+    vessel_table 為 None 或歷史表沒有 vessel_id 欄位時直接讀歷史表
+    """
+    from models import VESSEL_STATIC_COLUMNS
+
+    history_cols = {r[1] for r in conn.execute(text(f"PRAGMA table_info({history_table})"))}
+    if not vessel_table or "vessel_id" not in history_cols:
+        return ", ".join(f"{alias}.{c}" for c in columns), f"{history_table} {alias}"
+    exprs = [
+        f"COALESCE({alias}.{c}, v.{c}) AS {c}" if c in VESSEL_STATIC_COLUMNS else f"{alias}.{c}"
+        for c in columns
+    ]
+    return ", ".join(exprs), f"{history_table} {alias} LEFT JOIN {vessel_table} v ON v.id = {alias}.vessel_id"
+
+
+def ensure_vessel_view(engine, history_table, vessel_table):
+    """
+    建立（重建）<歷史表>_full VIEW：欄位與歷史表相同，靜態欄位由 vessels 補回（COALESCE）
+    直接以 SQL 讀取歷史表的工具與匯出改讀這個 VIEW，內容與正規化前相同
+    每次重建，歷史表之後新增的欄位也會出現在 VIEW 中；回傳 VIEW 名稱
+    """
+    view = f"{history_table}_full"
+    with engine.begin() as conn:
+        cols = [r[1] for r in conn.execute(text(f"PRAGMA table_info({history_table})"))]
+        select_list, source = vessel_columns(conn, history_table, vessel_table, cols)
+        conn.execute(text(f"DROP VIEW IF EXISTS {view}"))
+        conn.execute(text(f"CREATE VIEW {view} AS SELECT {select_list} FROM {source}"))
+    return view
+
+
+# =========================================
+# 每艘船最新一筆：由歷史資料建立
+# =========================================
+def backfill_latest(engine, history_table, latest_table, vessel_table=None):
+    """latest 表是空的時候，用歷史表中每艘船 id 最大的一筆填入"""
+    with engine.begin() as conn:
+        if conn.execute(text(f"SELECT 1 FROM {latest_table} LIMIT 1")).first():
+            return
+
+        latest_cols = {r[1] for r in conn.execute(text(f"PRAGMA table_info({latest_table})"))}
+        cols = [
+            r[1] for r in conn.execute(text(f"PRAGMA table_info({history_table})"))
+            if r[1] != "id" and r[1] in latest_cols
+        ]
+        select_list, source = vessel_columns(conn, history_table, vessel_table, cols)
+        filled = conn.execute(text(
+            f"INSERT INTO {latest_table} ({', '.join(cols)}) "
+            f"SELECT {select_list} FROM {source} WHERE h.id IN "
+            f"(SELECT MAX(id) FROM {history_table} WHERE ship_id IS NOT NULL GROUP BY ship_id)"
+        )).rowcount
+
+    if filled:
+        print(f"🔧 {engine.url.database}: 由 {history_table} 建立 {latest_table}（{filled} 艘）")
+
+
+# =========================================
+# 索引：補上 Model 定義中、既有資料庫還沒有的索引
+# =========================================
+def ensure_indexes(engine, table):
+    """table：SQLAlchemy Table；新建的表格 create_all 已經建好，這裡處理舊檔案"""
+    with engine.connect() as conn:
+        existing = {
+            r[0] for r in conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=:t"),
+                {"t": table.name},
+            )
+        }
+
+    for index in table.indexes:
+        if index.name in existing:
+            continue
+        start = time.perf_counter()
+        index.create(engine)
+        print(f"🔧 {engine.url.database}: 建立 {index.name}（{time.perf_counter() - start:.2f}s）")
+
+
+# =========================================
+# R*Tree 空間索引：經緯度（+ 時間）範圍查詢用
+# =========================================
+# 每筆資料是一個 (lat, lon, t) 的點，t 為 timestamp 的 epoch 秒（UTC）
+# 地圖查詢通常同時帶經緯度與時間區間，三維一起查才不會被其中一邊拖慢
+_RTREE_EPOCH = "CAST(strftime('%s', {}) AS INTEGER)"
+
+
+def ensure_rtree(engine, table):
+    """
+    建立 <table>_rtree 虛擬表格與同步用 trigger，第一次建立時由既有資料填入
+    R*Tree 以 32-bit 浮點數儲存（範圍會往外取整），查詢時需用「重疊」條件，
+    再以原表 lat / lon / timestamp 精確過濾
+
+    回傳 R*Tree 是否可用（SQLite 未編譯 R*Tree 模組時回傳 False）
+    """
+    rtree = f"{table}_rtree"
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+            {"name": rtree},
+        ).first()
+
+        if not exists:
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {rtree} USING rtree("
+                    f"id, min_lat, max_lat, min_lon, max_lon, min_t, max_t)"
+                ))
+            except OperationalError as e:
+                print(f"⚠️ {engine.url.database}: 無法建立 {rtree}（{e.orig}），經緯度查詢改用一般掃描")
+                return False
+
+        def point(row):
+            t = _RTREE_EPOCH.format(f"{row}.timestamp")
+            return f"{row}.id, {row}.lat, {row}.lat, {row}.lon, {row}.lon, {t}, {t}"
+
+        def indexed(row):
+            return f"{row}.lat IS NOT NULL AND {row}.lon IS NOT NULL AND {row}.timestamp IS NOT NULL"
+
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {rtree}_insert AFTER INSERT ON {table} "
+            f"WHEN {indexed('NEW')} BEGIN "
+            f"INSERT INTO {rtree} VALUES ({point('NEW')}); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {rtree}_update AFTER UPDATE OF lat, lon, timestamp ON {table} BEGIN "
+            f"DELETE FROM {rtree} WHERE id = OLD.id; "
+            f"INSERT INTO {rtree} SELECT {point('NEW')} WHERE {indexed('NEW')}; END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {rtree}_delete AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM {rtree} WHERE id = OLD.id; END"
+        ))
+
+        if not exists:
+            start = time.perf_counter()
+            filled = conn.execute(text(
+                f"INSERT INTO {rtree} SELECT {point(table)} FROM {table} WHERE {indexed(table)}"
+            )).rowcount
+            print(f"🔧 {engine.url.database}: 建立 {rtree}（{filled} 筆，{time.perf_counter() - start:.2f}s）")
+
+    return True
+
+
+# =========================================
+# 船名全文索引：FTS5 trigram
+# =========================================
+def ensure_name_index(engine, table, history_table, vessel_table=None):
+    """
+    建立船名表 table 的 <table>_fts（external content，trigram 分詞）與同步用 trigger
+    第一次建立時：船名表是空的就先由歷史表彙整 (ship_id, shipname)，再重建全文索引
+    （正規化後的船名由 vessel_table 讀取）
+
+    trigram 分詞讓 LIKE '%abc%' 可以直接走索引（3 個字元以上），不分大小寫
+    回傳全文索引是否可用（SQLite 未支援 FTS5 / trigram 時回傳 False）
+    """
+    fts = f"{table}_fts"
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:name"),
+            {"name": fts},
+        ).first()
+
+        if not exists:
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5("
+                    f"shipname, content='{table}', content_rowid='id', tokenize='trigram')"
+                ))
+            except OperationalError as e:
+                print(f"⚠️ {engine.url.database}: 無法建立 {fts}（{e.orig}），船名搜尋改用一般掃描")
+                return False
+
+            start = time.perf_counter()
+            if not conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first():
+                select_list, source = vessel_columns(
+                    conn, history_table, vessel_table, ["ship_id", "shipname", "timestamp"]
+                )
+                conn.execute(text(
+                    f"INSERT OR IGNORE INTO {table} (ship_id, shipname, first_seen) "
+                    f"SELECT ship_id, shipname, MIN(timestamp) FROM (SELECT {select_list} FROM {source}) "
+                    f"WHERE ship_id IS NOT NULL AND shipname IS NOT NULL AND shipname != '' "
+                    f"GROUP BY ship_id, shipname"
+                ))
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            names = conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+            print(f"🔧 {engine.url.database}: 建立 {fts}（{names} 個船名，{time.perf_counter() - start:.2f}s）")
+
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, shipname) VALUES (NEW.id, NEW.shipname); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, shipname) VALUES ('delete', OLD.id, OLD.shipname); END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF shipname ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, shipname) VALUES ('delete', OLD.id, OLD.shipname); "
+            f"INSERT INTO {fts}(rowid, shipname) VALUES (NEW.id, NEW.shipname); END"
+        ))
+
+    return True
+
+
+# =========================================
+# 每日彙總：由每小時彙總上的 trigger 同步（見 rollups.py）
+# =========================================
+_DAY = "strftime('%Y-%m-%d 00:00:00.000000', {})"   # 與 SQLAlchemy 寫入的 DateTime 格式相同
+
+
+def ensure_daily_rollup(engine, hourly, daily):
+    """
+    hourly / daily：SQLAlchemy Table（daily 的欄位：day + hourly 的分組欄位，
+    hours 與 hours_<x>（有 samples_<x> 的小時數）、samples*、first_seen / last_seen，其餘欄位取最新值）
+    建立 INSERT / UPDATE trigger，每小時彙總被 upsert 時在同一個 transaction 更新每日彙總；
+    第一次建立時由既有的每小時彙總填入
+    """
+    unique = next(i for i in daily.indexes if i.unique)
+    keys = [c.name for c in unique.columns if c.name != "day"]
+    counters = [c.name for c in daily.columns if c.name.startswith("samples")]
+    flags = {c.name: f"samples_{c.name[len('hours_'):]}" for c in daily.columns if c.name.startswith("hours_")}
+    latest = [
+        c.name for c in daily.columns
+        if c.name not in ("id", "day", "hours", "first_seen", "last_seen", *keys, *counters, *flags)
+    ]
+    trigger = f"{daily.name}_sync"
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name=:name"),
+            {"name": f"{trigger}_insert"},
+        ).first()
+        if exists:
+            return
+
+        cols = ["day", *keys, *latest, "hours", *flags, *counters, "first_seen", "last_seen"]
+        new_values = [
+            _DAY.format("NEW.hour"), *(f"NEW.{c}" for c in keys + latest), "1",
+            *(f"NEW.{s} > 0" for s in flags.values()), *(f"NEW.{c}" for c in counters),
+            "NEW.first_seen", "NEW.last_seen",
+        ]
+        merged = ", ".join([
+            *(f"{c} = excluded.{c}" for c in latest),
+            *(f"{c} = {c} + excluded.{c}" for c in ["hours", *flags, *counters]),
+            "first_seen = MIN(first_seen, excluded.first_seen)",
+            "last_seen = MAX(last_seen, excluded.last_seen)",
+        ])
+        conn.execute(text(
+            f"CREATE TRIGGER {trigger}_insert AFTER INSERT ON {hourly.name} BEGIN "
+            f"INSERT INTO {daily.name} ({', '.join(cols)}) VALUES ({', '.join(new_values)}) "
+            f"ON CONFLICT({', '.join(['day', *keys])}) DO UPDATE SET {merged}; END"
+        ))
+        # upsert 的 DO UPDATE 也會觸發：小時數只在 0 → 有取樣時增加
+        changes = ", ".join([
+            *(f"{c} = NEW.{c}" for c in latest),
+            *(f"{h} = {h} + (NEW.{s} > 0) - (OLD.{s} > 0)" for h, s in flags.items()),
+            *(f"{c} = {c} + NEW.{c} - OLD.{c}" for c in counters),
+            "first_seen = MIN(first_seen, NEW.first_seen)",
+            "last_seen = MAX(last_seen, NEW.last_seen)",
+        ])
+        match = " AND ".join([f"day = {_DAY.format('NEW.hour')}", *(f"{c} = NEW.{c}" for c in keys)])
+        conn.execute(text(
+            f"CREATE TRIGGER {trigger}_update AFTER UPDATE ON {hourly.name} BEGIN "
+            f"UPDATE {daily.name} SET {changes} WHERE {match}; END"
+        ))
+
+        start = time.perf_counter()
+        conn.execute(text(f"DELETE FROM {daily.name}"))
+        filled = conn.execute(text(
+            f"INSERT INTO {daily.name} ({', '.join(cols)}) "
+            f"SELECT {_DAY.format('hour')} AS d, {', '.join(keys)}, "
+            + "".join(f"MAX({c}), " for c in latest)
+            + "COUNT(*), "
+            + "".join(f"SUM({s} > 0), " for s in flags.values())
+            + "".join(f"SUM({c}), " for c in counters)
+            + f"MIN(first_seen), MAX(last_seen) FROM {hourly.name} GROUP BY d, {', '.join(keys)}"
+        )).rowcount
+    print(f"🔧 {engine.url.database}: 建立 {daily.name} trigger（{filled} 筆，{time.perf_counter() - start:.2f}s）")
+
+
+# =========================================
+# 查詢效能量測（python migrations.py indexes）
+# =========================================
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _benchmark_queries(table, rtree):
+    """API 常見查詢：[(標籤, SQL), ...]；有 R*Tree 時經緯度查詢改走 R*Tree"""
+    bbox = "lat BETWEEN :lat0 AND :lat1 AND lon BETWEEN :lon0 AND :lon1"
+    page = "ORDER BY timestamp DESC, id DESC LIMIT 1000"
+
+    def spatial(t0, t1):
+        if not rtree:
+            return bbox
+        return (f"id IN (SELECT id FROM {rtree} WHERE max_lat >= :lat0 AND min_lat <= :lat1 "
+                f"AND max_lon >= :lon0 AND min_lon <= :lon1 AND max_t >= {t0} AND min_t <= {t1}) AND {bbox}")
+
+    return [
+        ("ship_id + 時間區間", f"SELECT * FROM {table} WHERE ship_id = :ship_id "
+                               f"AND timestamp BETWEEN :t0 AND :t1 ORDER BY timestamp DESC"),
+        ("最近 1 小時", f"SELECT * FROM {table} WHERE timestamp BETWEEN :t0 AND :t1 {page}"),
+        ("經緯度範圍 + 最近 1 小時", f"SELECT * FROM {table} WHERE {spatial(':e0', ':e1')} "
+                                    f"AND timestamp BETWEEN :t0 AND :t1 {page}"),
+        ("經緯度範圍（不限時間）", f"SELECT * FROM {table} WHERE {spatial('-1e12', '1e12')} {page}"),
+    ]
+
+
+def benchmark(engine, table, rtree=None, repeat=3):
+    """回傳 {標籤: 毫秒}（取 repeat 次中最快的一次）"""
+    with engine.connect() as conn:
+        sample = conn.execute(text(
+            f"SELECT ship_id, MAX(timestamp), MIN(lat), MAX(lat), MIN(lon), MAX(lon) FROM {table}"
+        )).first()
+        if not sample or sample[0] is None:
+            return {}
+
+        ship_id, t_max, lat0, lat1, lon0, lon1 = sample
+        # 與 SQLAlchemy DateTime 在 SQLite 的儲存格式相同，才能以字串比較
+        t_max = datetime.fromisoformat(str(t_max))
+        t_min = t_max - timedelta(hours=1)
+        params = {
+            "ship_id": ship_id,
+            "t0": t_min.strftime(_TS_FORMAT), "t1": t_max.strftime(_TS_FORMAT),
+            "e0": calendar.timegm(t_min.timetuple()), "e1": calendar.timegm(t_max.timetuple()) + 1,
+            # 整體範圍中央約 1/10 × 1/10 的區域
+            "lat0": lat0 + (lat1 - lat0) * 0.45, "lat1": lat0 + (lat1 - lat0) * 0.55,
+            "lon0": lon0 + (lon1 - lon0) * 0.45, "lon1": lon0 + (lon1 - lon0) * 0.55,
+        }
+
+        timings = {}
+        for label, sql in _benchmark_queries(table, rtree):
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                elapsed = (time.perf_counter() - start) * 1000
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = best
+    return timings
+
+
+def migrate_indexes(targets):
+    """
+    targets：[(engine, Table, 是否建立 R*Tree), ...]
+    建立索引前後各量一次查詢時間
+    """
+    for engine, table, with_rtree in targets:
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar()
+        print(f"\n📦 {engine.url.database} / {table.name}（{rows} 筆）")
+
+        before = benchmark(engine, table.name)
+        ensure_indexes(engine, table)
+        rtree = None
+        if with_rtree and ensure_rtree(engine, table.name):
+            rtree = f"{table.name}_rtree"
+        after = benchmark(engine, table.name, rtree)
+
+        for label, ms in after.items():
+            print(f"   {label}: {before[label]:.1f} ms → {ms:.1f} ms")
+
+
+# =========================================
+# split → unified：把各分類的 SQLite 檔合併成單一 WAL 檔
+# =========================================
+def _source_tables(conn):
+    """
+    列出來源檔（schema=src）中需要複製的一般表格
+    虛擬表格（FTS / R*Tree）與其影子表格略過，啟動時會依資料重建
+    """
+    rows = conn.execute(
+        "SELECT name, sql FROM src.sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+    ).fetchall()
+    virtual = [name for name, sql in rows if sql.upper().startswith("CREATE VIRTUAL")]
+    return [
+        (name, sql) for name, sql in rows
+        if name not in virtual and not any(name.startswith(f"{v}_") for v in virtual)
+    ]
+
+
+def migrate_to_unified(category_paths, unified_path):
+    """
+    將 split 模式的各分類檔案複製到 unified 檔
+    表格 <name> 會變成 <分類>_<name>，與 models.table_name() 一致
+    目標表格已有資料時略過（可重複執行）；原始檔案不會被修改
+    """
+    conn = sqlite3.connect(unified_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+
+    for category, path in category_paths.items():
+        if not os.path.exists(path):
+            print(f"⏭️ {category}: 找不到 {path}，略過")
+            continue
+
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        try:
+            conn.execute("BEGIN")
+            for name, sql in _source_tables(conn):
+                target = f"{category}_{name}"
+                exists = conn.execute(
+                    "SELECT 1 FROM main.sqlite_master WHERE type='table' AND name=?", (target,)
+                ).fetchone()
+
+                if exists:
+                    if conn.execute(f'SELECT 1 FROM main."{target}" LIMIT 1').fetchone():
+                        print(f"⏭️ {target} 已有資料，略過")
+                        continue
+                else:
+                    create_sql = re.sub(
+                        rf'^CREATE TABLE\s+(["`\[]?){re.escape(name)}(["`\]]?)',
+                        f'CREATE TABLE "{target}"', sql, count=1, flags=re.IGNORECASE,
+                    )
+                    conn.execute(create_sql)
+
+                src_cols = [r[1] for r in conn.execute(f'PRAGMA src.table_info("{name}")')]
+                dst_cols = {r[1] for r in conn.execute(f'PRAGMA main.table_info("{target}")')}
+                cols = ", ".join(f'"{c}"' for c in src_cols if c in dst_cols)
+
+                copied = conn.execute(
+                    f'INSERT INTO main."{target}" ({cols}) SELECT {cols} FROM src."{name}"'
+                ).rowcount
+                print(f"✅ {category}.{name} → {target}：{copied} 筆")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("DETACH DATABASE src")
+
+    conn.close()
+    print("✅ 合併完成，設定 DB_STORAGE_MODE=unified 後啟動即可（索引會在啟動時補上）")
+
+
+# =========================================
+# 船舶靜態資料正規化：既有歷史資料搬到 vessels（python migrations.py vessels）
+# =========================================
+def normalize_vessels(engine, history_table, vessel_table):
+    """
+    歷史表中 vessel_id 為 NULL 的資料：
+      1. 每個不同的 (ship_id, 靜態欄位) 組合在 vessels 新增一個版本（已有相同版本則沿用）
+      2. 設定 vessel_id，並把歷史表中的靜態欄位改為 NULL
+    同一個 transaction 完成，可重複執行；回傳 (新增版本數, 轉換筆數)
+    """
+    from models import VESSEL_STATIC_COLUMNS
+
+    cols = ", ".join(VESSEL_STATIC_COLUMNS)
+    same = " AND ".join(f"v.{c} IS {history_table}.{c}" for c in VESSEL_STATIC_COLUMNS)
+    with engine.begin() as conn:
+        added = conn.execute(text(
+            f"INSERT INTO {vessel_table} (ship_id, {cols}, first_seen) "
+            f"SELECT ship_id, {cols}, MIN(timestamp) FROM {history_table} "
+            f"WHERE vessel_id IS NULL AND ship_id IS NOT NULL AND NOT EXISTS "
+            f"(SELECT 1 FROM {vessel_table} v WHERE v.ship_id = {history_table}.ship_id AND {same}) "
+            f"GROUP BY ship_id, {cols} ORDER BY MIN(timestamp)"
+        )).rowcount
+        # SET 的運算式都以更新前的值計算，vessel_id 比對的是原本的靜態欄位
+        converted = conn.execute(text(
+            f"UPDATE {history_table} SET vessel_id = "
+            f"(SELECT MAX(v.id) FROM {vessel_table} v WHERE v.ship_id = {history_table}.ship_id AND {same}), "
+            + ", ".join(f"{c} = NULL" for c in VESSEL_STATIC_COLUMNS)
+            + " WHERE vessel_id IS NULL AND ship_id IS NOT NULL"
+        )).rowcount
+    return added, converted
+
+
+# =========================================
+# 命令列入口
+# =========================================
+if __name__ == "__main__":
+    import argparse
+    from config import CATEGORY_DB_PATHS, UNIFIED_DB_PATH
+
+    parser = argparse.ArgumentParser(description="AIS 資料庫 migration 工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("unify", help="將各分類 SQLite 檔合併成單一 WAL 檔（DB_STORAGE_MODE=unified）")
+    sub.add_parser("partition", help="將 ais_data / chinaboat 既有歷史資料搬進時間分區（HISTORY_PARTITION，未設定時以 day）")
+    sub.add_parser("archive", help="將結束超過 ARCHIVE_AFTER_DAYS 天（未設定時 7 天）的歷史分區封存成 .npz（請先停止 app）")
+    sub.add_parser("tracks", help="由 ais_data 歷史資料重建單船軌跡庫（TRACK_STORE，請先停止 app）")
+    sub.add_parser("vessels", help="將 ais_data / chinaboat / boat_test / boat_check12 / boat_check24 歷史資料的船舶靜態欄位搬到 vessels 表（請先停止 app）")
+    sub.add_parser("rollups", help="由 boat_test 海警船原始資料重建每小時彙總（/api/stats，請先停止 app）")
+    sub.add_parser("indexes", help="建立索引、R*Tree 空間索引與船名 FTS 索引，並量測建立前後的查詢時間")
+
+    args = parser.parse_args()
+    if args.command == "unify":
+        migrate_to_unified(CATEGORY_DB_PATHS, UNIFIED_DB_PATH)
+    elif args.command == "partition":
+        from models import make_category_engine, ShipAIS, ChinaBoatAIS
+        from partitions import partition_existing
+
+        for category, Model in (("ais_data", ShipAIS), ("chinaboat", ChinaBoatAIS)):
+            engine = make_category_engine(category)[0]
+            Model.__table__.create(engine, checkfirst=True)
+            partition_existing(engine, Model)
+    elif args.command == "archive":
+        from config import ARCHIVE_AFTER_DAYS
+        from models import make_category_engine, ShipAIS, ChinaBoatAIS
+        from partitions import archive_partitions
+
+        before = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS or 7)
+        for category, Model in (("ais_data", ShipAIS), ("chinaboat", ChinaBoatAIS)):
+            engine = make_category_engine(category)[0]
+            if not archive_partitions(engine, Model, before):
+                print(f"📦 {engine.url.database} / {Model.__tablename__}：沒有需要封存的分區")
+    elif args.command == "tracks":
+        from config import TRACK_STORE
+        from models import make_category_engine, ShipAIS
+        from partitions import history_models
+        from trackstore import track_store
+
+        if TRACK_STORE == "none":
+            print("ℹ️ TRACK_STORE=none，未啟用軌跡庫")
+        else:
+            engine = make_category_engine("ais_data")[0]
+            ensure_column(engine, ShipAIS.__tablename__, "vessel_id",
+                          f"INTEGER REFERENCES {ShipAIS.__vessel_table__}(id)")
+            track_store.rebuild(engine, history_models(ShipAIS, engine=engine))
+    elif args.command == "vessels":
+        from models import (
+            make_category_engine, ShipAIS, ChinaBoatAIS, BoatShipAIS, BoatCheck12AIS, BoatCheck24AIS, VESSEL_MODELS,
+        )
+        from partitions import history_models
+        from archive import ArchivedPartition
+
+        for category, Model in (("ais_data", ShipAIS), ("chinaboat", ChinaBoatAIS), ("boat_test", BoatShipAIS),
+                                ("boat_check12", BoatCheck12AIS), ("boat_check24", BoatCheck24AIS)):
+            engine = make_category_engine(category)[0]
+            VesselModel = VESSEL_MODELS[Model]
+            Model.__table__.create(engine, checkfirst=True)
+            VesselModel.__table__.create(engine, checkfirst=True)
+            ensure_column(engine, Model.__tablename__, "vessel_id",
+                          f"INTEGER REFERENCES {VesselModel.__tablename__}(id)")
+            ensure_vessel_view(engine, Model.__tablename__, VesselModel.__tablename__)
+
+            path = engine.url.database
+            size = os.path.getsize(path)
+            start = time.perf_counter()
+            for M in history_models(Model, engine=engine):
+                if isinstance(M, ArchivedPartition):
+                    continue   # 封存檔已含靜態欄位，不需轉換
+                added, converted = normalize_vessels(engine, M.__tablename__, VesselModel.__tablename__)
+                print(f"🪪 {path} / {M.__tablename__}：新增 {added} 個版本，轉換 {converted} 筆")
+            # 改為 NULL 的空間要 VACUUM 後才會釋放
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+            print(f"   {size / 1e6:.1f} MB → {os.path.getsize(path) / 1e6:.1f} MB"
+                  f"（{time.perf_counter() - start:.1f}s）")
+    elif args.command == "rollups":
+        from bulk_writer import BulkWriter
+        from models import BoatShipAIS, ShipHourRollup, ROLLUP_MODELS, VESSEL_MODELS, session_for
+        from rollups import rebuild
+
+        session = session_for(ShipHourRollup)
+        engine = session.get_bind()
+        for Hourly, Daily in ROLLUP_MODELS.items():
+            Hourly.__table__.create(engine, checkfirst=True)
+            Daily.__table__.create(engine, checkfirst=True)
+            ensure_daily_rollup(engine, Hourly.__table__, Daily.__table__)
+            session.execute(Hourly.__table__.delete())
+            session.execute(Daily.__table__.delete())
+
+        # 船名已正規化的資料由 vessels 補回
+        with engine.connect() as conn:
+            select_list, source = vessel_columns(
+                conn, BoatShipAIS.__tablename__, VESSEL_MODELS[BoatShipAIS].__tablename__,
+                ["timestamp", "ship_id", "shipname", "lat", "lon"],
+            )
+
+        start = time.perf_counter()
+        writer, total = BulkWriter(), 0
+        raw = engine.raw_connection()
+        try:
+            cursor = raw.cursor()
+            cursor.execute(
+                f"SELECT {select_list} FROM {source} "
+                f"WHERE h.timestamp IS NOT NULL AND h.ship_id IS NOT NULL AND h.lat IS NOT NULL AND h.lon IS NOT NULL"
+            )
+            while True:
+                rows = cursor.fetchmany(50000)
+                if not rows:
+                    break
+                total += rebuild(writer, [(datetime.fromisoformat(r[0]), *r[1:]) for r in rows])
+                writer.flush()
+            cursor.close()
+        finally:
+            raw.close()
+        session.commit()
+        hours = session.query(ShipHourRollup).count()
+        print(f"📈 每小時彙總重建完成：{total} 筆 → {hours} 個 (船, 小時)（{time.perf_counter() - start:.1f}s）")
+    elif args.command == "indexes":
+        from models import schema_targets, make_category_engine, RTREE_MODELS, NAME_MODELS, VESSEL_MODELS
+
+        ais_engine = make_category_engine("ais_data")[0]
+        targets = [
+            (engine, Model.__table__, Model in RTREE_MODELS)
+            for engine, Model in schema_targets(ais_engine)
+            if Model not in NAME_MODELS.values() and Model not in VESSEL_MODELS.values()
+        ]
+        # 表格尚未建立的檔案先建表（與 app 啟動時相同）
+        for engine, Model in schema_targets(ais_engine):
+            Model.__table__.create(engine, checkfirst=True)
+            if Model in VESSEL_MODELS:
+                ensure_column(engine, Model.__tablename__, "vessel_id",
+                              f"INTEGER REFERENCES {Model.__vessel_table__}(id)")
+                ensure_vessel_view(engine, Model.__tablename__, Model.__vessel_table__)
+        migrate_indexes(targets)
+
+        # 船名表 + FTS5 索引（由歷史資料回填）
+        for engine, Model in schema_targets(ais_engine):
+            if Model in NAME_MODELS:
+                ensure_name_index(engine, NAME_MODELS[Model].__tablename__, Model.__tablename__,
+                                  VESSEL_MODELS[Model].__tablename__)
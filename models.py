@@ -1,17 +1,34 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime
-from config import (
-    MAIN_DB_PATH,
-    TEST_DB_PATH,
-    BOAT_DB_PATH,
-    BOAT_CHECK12_DB_PATH,
-    BOAT_CHECK24_DB_PATH,
-    CCG_DB_PATH,
-    CCG_CHECK12_DB_PATH,
-    CCG_CHECK24_DB_PATH,
-    CHINA_BOAT_DB_PATH
-)
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index, table, column
+from sqlalchemy.orm import declared_attr
+from config import CATEGORY_DB_PATHS, UNIFIED_STORAGE, UNIFIED_DB_PATH
 from database import db, make_engine_and_session  # ✅ 用 database.py 的 db
+from migrations import (
+    ensure_unique_ship_id, backfill_latest, ensure_indexes, ensure_rtree, ensure_name_index,
+    ensure_column, ensure_daily_rollup, ensure_vessel_view,
+)
+
+
+# =========================================
+# 儲存模式（split / unified）
+# =========================================
+def db_path_for(category):
+    """分類實際所在的 SQLite 檔"""
+    return UNIFIED_DB_PATH if UNIFIED_STORAGE else CATEGORY_DB_PATHS[category]
+
+
+def table_name(category, name="ship_ais"):
+    """
+    分類內表格的實際名稱
+    split 模式每個分類各自一個檔案，沿用原本的名稱；
+    unified 模式同一個檔案內以分類名稱當前綴區分
+    """
+    return f"{category}_{name}" if UNIFIED_STORAGE else name
+
+
+def make_category_engine(category):
+    return make_engine_and_session(db_path_for(category), wal=UNIFIED_STORAGE)
+
 
 # =========================================
 # 共用欄位 Mixin
@@ -41,11 +58,127 @@ class ShipBaseMixin:
         return {c.name: getattr(self, c.name) for c in self.__table__.columns}
 
 
+# 歷史表：API 依船 + 時間區間、時間區間查詢
+def history_table_args(tablename):
+    return (
+        Index(f"ix_{tablename}_ship_id_timestamp", "ship_id", "timestamp"),
+        Index(f"ix_{tablename}_timestamp", "timestamp"),
+    )
+
+
+# 最新狀態表：每艘船只有一筆，ship_id 唯一（供 ON CONFLICT upsert 使用）
+# timestamp 索引給「最近 N 分鐘」的查詢與過期資料清除使用
+def latest_table_args(tablename, *extra):
+    return (
+        Index(f"ux_{tablename}_ship_id", "ship_id", unique=True),
+        Index(f"ix_{tablename}_timestamp", "timestamp"),
+        *extra,
+    )
+
+
+# =========================================
+# 船名索引：每個 (ship_id, shipname) 組合一筆
+# =========================================
+# 另建 FTS5 trigram 全文索引（<表格>_fts，由 trigger 同步），供船名搜尋 / 自動完成
+class ShipNameMixin:
+    id = Column(Integer, primary_key=True)
+    ship_id = Column(String(50), nullable=False)
+    shipname = Column(String(200), nullable=False)
+    first_seen = Column(DateTime, default=datetime.utcnow)
+
+
+def name_table_args(tablename):
+    return (Index(f"ux_{tablename}_ship_id_shipname", "ship_id", "shipname", unique=True),)
+
+
+# =========================================
+# 船舶靜態資料（vessels）：歷史表只存動態欄位 + vessel_id
+# =========================================
+# 每個 (ship_id, 靜態欄位) 組合一筆，靜態欄位有變化才新增（見 vessels.py）
+# 歷史表新資料的靜態欄位為 NULL，API 讀取時依 vessel_id 補上；
+# vessel_id 為 NULL 的舊資料維持原表內容（python migrations.py vessels 可轉換）
+VESSEL_STATIC_COLUMNS = (
+    "shipname", "destination", "dwt", "flag", "shiptype", "gt_shiptype", "length", "width",
+)
+
+
+class VesselMixin:
+    id = Column(Integer, primary_key=True)
+    ship_id = Column(String(50), nullable=False)
+    shipname = Column(String(200))
+    destination = Column(String(200))
+    dwt = Column(String(50))
+    flag = Column(String(50))
+    shiptype = Column(String(50))
+    gt_shiptype = Column(String(50))
+    length = Column(String(50))
+    width = Column(String(50))
+    first_seen = Column(DateTime, default=datetime.utcnow)
+
+
+def vessel_table_args(tablename):
+    return (Index(f"ix_{tablename}_ship_id", "ship_id"),)
+
+
+# =========================================
+# 每小時彙總：海警船在 12nm / 12–24nm / 自訂警戒區的取樣數（見 rollups.py）
+# =========================================
+# fetcher 每輪以 upsert 累加，與原始資料同一個 commit；/api/stats 只讀這些表
+# 每日彙總由每小時彙總上的 trigger 同步（見 migrations.ensure_daily_rollup），長時間區間讀每日彙總
+class HourlyRollupMixin:
+    id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, nullable=False)      # 整點（UTC）
+    ship_id = Column(String(50), nullable=False)
+    shipname = Column(String(200))               # 該小時最後一次看到的船名
+    samples = Column(Integer, nullable=False, default=0)
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+
+
+class DailyRollupMixin:
+    id = Column(Integer, primary_key=True)
+    day = Column(DateTime, nullable=False)       # 00:00（UTC）
+    ship_id = Column(String(50), nullable=False)
+    shipname = Column(String(200))
+    hours = Column(Integer, nullable=False, default=0)     # 有取樣的小時數
+    samples = Column(Integer, nullable=False, default=0)
+    first_seen = Column(DateTime)
+    last_seen = Column(DateTime)
+
+
+class VesselRefMixin:
+    """歷史表參照 vessels（__vessel_table__ 為同一個 DB 內的 vessels 表格名稱）"""
+    __vessel_table__ = None
+
+    @declared_attr
+    def vessel_id(cls):
+        return Column(Integer, ForeignKey(f"{cls.__vessel_table__}.id"))
+
+
 # =========================================
 # 主資料庫（Flask 綁定的 SQLAlchemy）
 # =========================================
-class ShipAIS(db.Model, ShipBaseMixin):   # ✅ 用 database.py 的 db
-    __tablename__ = "ship_ais"
+class ShipAIS(db.Model, ShipBaseMixin, VesselRefMixin):   # ✅ 用 database.py 的 db
+    __tablename__ = table_name("ais_data")
+    __table_args__ = history_table_args(__tablename__)
+    __vessel_table__ = table_name("ais_data", "vessels")
+
+# 每艘船最新一筆（與 ship_ais 同一個 transaction 寫入，供 /api/ais/latest 使用）
+class LatestShipAIS(db.Model, ShipBaseMixin):
+    __tablename__ = table_name("ais_data", "ship_latest")
+    __table_args__ = latest_table_args(
+        __tablename__, Index(f"ix_{__tablename__}_source_timestamp", "source", "timestamp")
+    )
+
+# ais_data 中出現過的船名
+class ShipName(db.Model, ShipNameMixin):
+    __tablename__ = table_name("ais_data", "ship_names")
+    __table_args__ = name_table_args(__tablename__)
+
+# ais_data 的船舶靜態資料
+class Vessel(db.Model, VesselMixin):
+    __tablename__ = table_name("ais_data", "vessels")
+    __table_args__ = vessel_table_args(__tablename__)
 
 # =========================================
 # 警戒區資料表（Polygon GeoJSON）
@@ -66,15 +199,15 @@ class AlarmZone(db.Model):
 # =========================================
 # 其他 SQLite 資料庫（非 Flask 綁定）
 # =========================================
-# 各 DB 的 engine + session + Base
-test_engine, TestSession, TestBase = make_engine_and_session(TEST_DB_PATH)
-boat_engine, BoatSession, BoatBase = make_engine_and_session(BOAT_DB_PATH)
-boat_check12_engine, BoatCheck12Session, BoatCheck12Base = make_engine_and_session(BOAT_CHECK12_DB_PATH)
-boat_check24_engine, BoatCheck24Session, BoatCheck24Base = make_engine_and_session(BOAT_CHECK24_DB_PATH)
-ccg_engine, CCGSession, CCGBase = make_engine_and_session(CCG_DB_PATH)
-ccg_check12_engine, CCGCheck12Session, CCGCheck12Base = make_engine_and_session(CCG_CHECK12_DB_PATH)
-ccg_check24_engine, CCGCheck24Session, CCGCheck24Base = make_engine_and_session(CCG_CHECK24_DB_PATH)
-china_boat_engine, ChinaBoatSession, ChinaBoatBase = make_engine_and_session(CHINA_BOAT_DB_PATH)
+# 各 DB 的 engine + session + Base（unified 模式下 engine / session 皆為同一個）
+test_engine, TestSession, TestBase = make_category_engine("data_test")
+boat_engine, BoatSession, BoatBase = make_category_engine("boat_test")
+boat_check12_engine, BoatCheck12Session, BoatCheck12Base = make_category_engine("boat_check12")
+boat_check24_engine, BoatCheck24Session, BoatCheck24Base = make_category_engine("boat_check24")
+ccg_engine, CCGSession, CCGBase = make_category_engine("ccg")
+ccg_check12_engine, CCGCheck12Session, CCGCheck12Base = make_category_engine("ccg_check12")
+ccg_check24_engine, CCGCheck24Session, CCGCheck24Base = make_category_engine("ccg_check24")
+china_boat_engine, ChinaBoatSession, ChinaBoatBase = make_category_engine("chinaboat")
 
 
 
@@ -84,36 +217,253 @@ china_boat_engine, ChinaBoatSession, ChinaBoatBase = make_engine_and_session(CHI
 
 # 最新資料（data_test.db）
 class TestShipAIS(TestBase, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+    __tablename__ = table_name("data_test")
+    __table_args__ = latest_table_args(__tablename__)
 
 # 所有海警船歷史資料（boat_test.db）
-class BoatShipAIS(BoatBase, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+class BoatShipAIS(BoatBase, ShipBaseMixin, VesselRefMixin):
+    __tablename__ = table_name("boat_test")
+    __table_args__ = history_table_args(__tablename__)
+    __vessel_table__ = table_name("boat_test", "vessels")
+
+# boat_test 的船舶靜態資料
+class BoatVessel(BoatBase, VesselMixin):
+    __tablename__ = table_name("boat_test", "vessels")
+    __table_args__ = vessel_table_args(__tablename__)
 
 # 進入 12 海里內的海警船歷史資料（boat_check12.db）
-class BoatCheck12AIS(BoatCheck12Base, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+class BoatCheck12AIS(BoatCheck12Base, ShipBaseMixin, VesselRefMixin):
+    __tablename__ = table_name("boat_check12")
+    __table_args__ = history_table_args(__tablename__)
+    __vessel_table__ = table_name("boat_check12", "vessels")
+
+# boat_check12 的船舶靜態資料
+class BoatCheck12Vessel(BoatCheck12Base, VesselMixin):
+    __tablename__ = table_name("boat_check12", "vessels")
+    __table_args__ = vessel_table_args(__tablename__)
 
 # 位於 12–24 海里範圍內的海警船歷史資料（boat_check24.db）
-class BoatCheck24AIS(BoatCheck24Base, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+class BoatCheck24AIS(BoatCheck24Base, ShipBaseMixin, VesselRefMixin):
+    __tablename__ = table_name("boat_check24")
+    __table_args__ = history_table_args(__tablename__)
+    __vessel_table__ = table_name("boat_check24", "vessels")
+
+# boat_check24 的船舶靜態資料
+class BoatCheck24Vessel(BoatCheck24Base, VesselMixin):
+    __tablename__ = table_name("boat_check24", "vessels")
+    __table_args__ = vessel_table_args(__tablename__)
+
+# 海警船每小時彙總（boat_test.db，與 BoatShipAIS 同一個 transaction）
+# samples：該小時的取樣數；samples_12nm / samples_24nm：其中位於 12nm 內 / 12–24nm 間的筆數
+class ShipHourRollup(BoatBase, HourlyRollupMixin):
+    __tablename__ = table_name("boat_test", "hourly_rollups")
+    __table_args__ = (Index(f"ux_{__tablename__}_hour_ship_id", "hour", "ship_id", unique=True),)
+    samples_12nm = Column(Integer, nullable=False, default=0)
+    samples_24nm = Column(Integer, nullable=False, default=0)
+
+# 海警船在各自訂警戒區內的每小時彙總（samples：位於該警戒區內的筆數）
+class ZoneHourRollup(BoatBase, HourlyRollupMixin):
+    __tablename__ = table_name("boat_test", "zone_hourly_rollups")
+    __table_args__ = (Index(f"ux_{__tablename__}_hour_zone_ship", "hour", "zone_id", "ship_id", unique=True),)
+    zone_id = Column(Integer, nullable=False)
+    zone_name = Column(String(200))
+
+# 每日彙總（由上面兩個表的 trigger 維護）
+# hours_12nm / hours_24nm：有 12nm 內 / 12–24nm 間取樣的小時數
+class ShipDayRollup(BoatBase, DailyRollupMixin):
+    __tablename__ = table_name("boat_test", "daily_rollups")
+    __table_args__ = (Index(f"ux_{__tablename__}_day_ship_id", "day", "ship_id", unique=True),)
+    hours_12nm = Column(Integer, nullable=False, default=0)
+    hours_24nm = Column(Integer, nullable=False, default=0)
+    samples_12nm = Column(Integer, nullable=False, default=0)
+    samples_24nm = Column(Integer, nullable=False, default=0)
+
+class ZoneDayRollup(BoatBase, DailyRollupMixin):
+    __tablename__ = table_name("boat_test", "zone_daily_rollups")
+    __table_args__ = (Index(f"ux_{__tablename__}_day_zone_ship", "day", "zone_id", "ship_id", unique=True),)
+    zone_id = Column(Integer, nullable=False)
+    zone_name = Column(String(200))
 
 # 每艘海警船的最新狀態（CCG.db）
 class CCGShipAIS(CCGBase, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+    __tablename__ = table_name("ccg")
+    __table_args__ = latest_table_args(__tablename__)
 
 # 目前在 12 海里內的海警船最新狀態（ccg_check12.db）
 class CCGCheck12ShipAIS(CCGCheck12Base, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+    __tablename__ = table_name("ccg_check12")
+    __table_args__ = latest_table_args(__tablename__)
 
 # 目前在 12–24 海里範圍內的海警船最新狀態（ccg_check24.db）
 class CCGCheck24ShipAIS(CCGCheck24Base, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+    __tablename__ = table_name("ccg_check24")
+    __table_args__ = latest_table_args(__tablename__)
 
 # 所有中國籍船舶歷史資料（chinaboat.db, flag == "CN"）
-class ChinaBoatAIS(ChinaBoatBase, ShipBaseMixin):
-    __tablename__ = "ship_ais"
+class ChinaBoatAIS(ChinaBoatBase, ShipBaseMixin, VesselRefMixin):
+    __tablename__ = table_name("chinaboat")
+    __table_args__ = history_table_args(__tablename__)
+    __vessel_table__ = table_name("chinaboat", "vessels")
+
+# 每艘中國籍船舶最新一筆（chinaboat.db，供 /api/chinaboat/latest 使用）
+class ChinaBoatLatestAIS(ChinaBoatBase, ShipBaseMixin):
+    __tablename__ = table_name("chinaboat", "ship_latest")
+    __table_args__ = latest_table_args(__tablename__)
+
+# chinaboat 中出現過的船名
+class ChinaBoatShipName(ChinaBoatBase, ShipNameMixin):
+    __tablename__ = table_name("chinaboat", "ship_names")
+    __table_args__ = name_table_args(__tablename__)
 
+# chinaboat 的船舶靜態資料
+class ChinaBoatVessel(ChinaBoatBase, VesselMixin):
+    __tablename__ = table_name("chinaboat", "vessels")
+    __table_args__ = vessel_table_args(__tablename__)
+
+
+
+# =========================================
+# 各表格寫入時使用的 session
+# =========================================
+# unified 模式下 ShipAIS 也改走共用的 session，才能與其他分類同一個 transaction
+MODEL_SESSIONS = {
+    ShipAIS: TestSession if UNIFIED_STORAGE else db.session,
+    LatestShipAIS: TestSession if UNIFIED_STORAGE else db.session,
+    TestShipAIS: TestSession,
+    BoatShipAIS: BoatSession,
+    BoatVessel: BoatSession,
+    ShipHourRollup: BoatSession,
+    ZoneHourRollup: BoatSession,
+    ShipDayRollup: BoatSession,
+    ZoneDayRollup: BoatSession,
+    BoatCheck12AIS: BoatCheck12Session,
+    BoatCheck12Vessel: BoatCheck12Session,
+    BoatCheck24AIS: BoatCheck24Session,
+    BoatCheck24Vessel: BoatCheck24Session,
+    CCGShipAIS: CCGSession,
+    CCGCheck12ShipAIS: CCGCheck12Session,
+    CCGCheck24ShipAIS: CCGCheck24Session,
+    ChinaBoatAIS: ChinaBoatSession,
+    ChinaBoatLatestAIS: ChinaBoatSession,
+    ShipName: TestSession if UNIFIED_STORAGE else db.session,
+    ChinaBoatShipName: ChinaBoatSession,
+    Vessel: TestSession if UNIFIED_STORAGE else db.session,
+    ChinaBoatVessel: ChinaBoatSession,
+}
+
+
+# 最新狀態表（每艘船一筆）
+LATEST_MODELS = [
+    (test_engine, TestShipAIS),
+    (ccg_engine, CCGShipAIS),
+    (ccg_check12_engine, CCGCheck12ShipAIS),
+    (ccg_check24_engine, CCGCheck24ShipAIS),
+]
+
+
+# 有經緯度範圍查詢的歷史表：另建 (lat, lon, 時間) R*Tree（<表格>_rtree，由 trigger 同步）
+RTREE_MODELS = [ShipAIS, ChinaBoatAIS]
+_rtree_ready = set()
+
+# 有船名篩選的歷史表 → 對應的船名索引表
+NAME_MODELS = {ShipAIS: ShipName, ChinaBoatAIS: ChinaBoatShipName}
+_fts_ready = set()
+
+# 靜態欄位正規化到 vessels 的歷史表 → 對應的 vessels 表
+VESSEL_MODELS = {
+    ShipAIS: Vessel,
+    ChinaBoatAIS: ChinaBoatVessel,
+    BoatShipAIS: BoatVessel,
+    BoatCheck12AIS: BoatCheck12Vessel,
+    BoatCheck24AIS: BoatCheck24Vessel,
+}
+
+# 每小時彙總 → 由 trigger 同步的每日彙總
+ROLLUP_MODELS = {ShipHourRollup: ShipDayRollup, ZoneHourRollup: ZoneDayRollup}
+
+
+def schema_targets(ais_engine):
+    """
+    所有 ShipBaseMixin 表格與其 engine
+    ais_engine：ais_data 的 engine（Flask 綁定，需由呼叫端提供）
+    """
+    return [
+        (ais_engine, ShipAIS),
+        (ais_engine, LatestShipAIS),
+        (test_engine, TestShipAIS),
+        (boat_engine, BoatShipAIS),
+        (boat_check12_engine, BoatCheck12AIS),
+        (boat_check24_engine, BoatCheck24AIS),
+        (ccg_engine, CCGShipAIS),
+        (ccg_check12_engine, CCGCheck12ShipAIS),
+        (ccg_check24_engine, CCGCheck24ShipAIS),
+        (china_boat_engine, ChinaBoatAIS),
+        (china_boat_engine, ChinaBoatLatestAIS),
+        (ais_engine, ShipName),
+        (china_boat_engine, ChinaBoatShipName),
+        (ais_engine, Vessel),
+        (china_boat_engine, ChinaBoatVessel),
+        (boat_engine, BoatVessel),
+        (boat_check12_engine, BoatCheck12Vessel),
+        (boat_check24_engine, BoatCheck24Vessel),
+    ]
+
+
+def base_model(Model):
+    """分區表（見 partitions.py）對應的原始 Model，一般表格回傳本身"""
+    return getattr(Model, "__partition_of__", Model)
+
+
+def spatial_index(Model):
+    """取得 Model 的 R*Tree 表格（SQLite 不支援 R*Tree 或尚未建立時回傳 None）"""
+    if Model not in _rtree_ready:
+        return None
+    return table(
+        f"{Model.__tablename__}_rtree",
+        column("id"), column("min_lat"), column("max_lat"), column("min_lon"), column("max_lon"),
+        column("min_t"), column("max_t"),
+    )
+
+
+def name_index(Model):
+    """
+    取得歷史表 Model 的船名全文索引 (船名表, FTS 表格)
+    SQLite 不支援 FTS5 trigram 或尚未建立時回傳 None
+    """
+    NameModel = NAME_MODELS.get(base_model(Model))
+    if NameModel not in _fts_ready:
+        return None
+    return NameModel, table(
+        f"{NameModel.__tablename__}_fts", column("rowid"), column("shipname"),
+    )
+
+
+def session_for(Model):
+    """取得寫入該表格要用的 session"""
+    return MODEL_SESSIONS[base_model(Model)]
+
+
+def _write_sessions():
+    """所有寫入用 session（去除重複，保持原本的 commit 順序）"""
+    sessions = []
+    for session in MODEL_SESSIONS.values():
+        if not any(session is s for s in sessions):
+            sessions.append(session)
+    return sessions
+
+
+def commit_all():
+    """
+    提交所有分類的寫入
+    split 模式依序 commit 各檔案；unified 模式只有一個 session，單次 commit 即完成
+    """
+    for session in _write_sessions():
+        session.commit()
+
+
+def rollback_all():
+    for session in _write_sessions():
+        session.rollback()
 
 
 # =========================================
@@ -135,5 +485,41 @@ def init_models(app):
     CCGCheck24Base.metadata.create_all(ccg_check24_engine)
     ChinaBoatBase.metadata.create_all(china_boat_engine)
 
+    # 舊資料庫的最新狀態表沒有 ship_id 唯一索引，補上
+    for engine, Model in LATEST_MODELS:
+        ensure_unique_ship_id(engine, Model.__tablename__)
+
+    # 舊資料庫的歷史表補上 vessel_id 欄位；<歷史表>_full VIEW 給直接讀 SQL 的工具（靜態欄位已補回）
+    with app.app_context():
+        for engine, Model in schema_targets(db.engine):
+            if Model in VESSEL_MODELS:
+                ensure_column(engine, Model.__tablename__, "vessel_id",
+                              f"INTEGER REFERENCES {Model.__vessel_table__}(id)")
+                ensure_vessel_view(engine, Model.__tablename__, Model.__vessel_table__)
+
+    # 每艘船最新一筆：第一次啟用時由歷史資料建立
+    with app.app_context():
+        backfill_latest(db.engine, ShipAIS.__tablename__, LatestShipAIS.__tablename__, Vessel.__tablename__)
+    backfill_latest(china_boat_engine, ChinaBoatAIS.__tablename__, ChinaBoatLatestAIS.__tablename__,
+                    ChinaBoatVessel.__tablename__)
+
+    # 舊資料庫補上索引與 R*Tree（已存在的會略過）
+    with app.app_context():
+        for engine, Model in schema_targets(db.engine):
+            ensure_indexes(engine, Model.__table__)
+            if Model in RTREE_MODELS and ensure_rtree(engine, Model.__tablename__):
+                _rtree_ready.add(Model)
+
+    # 每日彙總 trigger（第一次建立時由每小時彙總填入）
+    for Hourly, Daily in ROLLUP_MODELS.items():
+        ensure_daily_rollup(boat_engine, Hourly.__table__, Daily.__table__)
+
+    # 船名全文索引：第一次建立時由歷史資料填入
+    with app.app_context():
+        for engine, Model in schema_targets(db.engine):
+            NameModel = NAME_MODELS.get(Model)
+            if NameModel and ensure_name_index(engine, NameModel.__tablename__, Model.__tablename__,
+                                               VESSEL_MODELS[Model].__tablename__):
+                _fts_ready.add(NameModel)
 
     print("✅ 所有資料表初始化完成！")
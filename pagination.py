@@ -0,0 +1,109 @@
+# pagination.py
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import or_
+
+from config import API_PAGE_DEFAULT, API_PAGE_MAX
+from downsample import drop_bucket_duplicates
+from vessels import hydrate
+
+
+# =========================================
+# Keyset 分頁：依 (timestamp, id) 由新到舊
+# =========================================
+# cursor 是上一頁最後一筆的 (timestamp, id)，下一頁從它之後開始，
+# 不使用 OFFSET，頁數再多每頁的成本都一樣
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(timestamp, row_id):
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, row_id = json.loads(raw)
+        return datetime.fromisoformat(ts), int(row_id)
+    except Exception:
+        raise CursorError(f"無效的 cursor: {cursor}")
+
+
+def page_limit(value):
+    """解析 limit 參數，未指定用預設值，超過上限以上限計"""
+    if value in (None, ""):
+        return API_PAGE_DEFAULT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise CursorError(f"無效的 limit: {value}")
+    return max(1, min(limit, API_PAGE_MAX))
+
+
+def _after_cursor(query, Model, cursor):
+    """
+    套用 cursor 條件並依 (timestamp, id) 由新到舊排序
+
+    timestamp 為 NULL 的資料無法排序定位，不納入（fetcher 寫入時一定有 timestamp）
+    """
+    query = query.filter(Model.timestamp.isnot(None))
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        # 等同 (timestamp, id) < (ts, id)；先寫出 timestamp <= ts 讓 SQLite 能直接走 timestamp 索引，
+        # 否則 OR 條件會變成每頁都把之後的資料全部排序一次
+        query = query.filter(
+            Model.timestamp <= ts,
+            or_(Model.timestamp < ts, Model.id < row_id),
+        )
+    return query.order_by(Model.timestamp.desc(), Model.id.desc())
+
+
+def _page(rows, limit):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+
+def paginate(query, Model, cursor=None, limit=API_PAGE_DEFAULT):
+    """
+    query：已套用篩選條件的查詢（尚未排序）
+    回傳 (本頁資料, next_cursor)，沒有下一頁時 next_cursor 為 None
+    """
+    return _page(_after_cursor(query, Model, cursor).limit(limit + 1).all(), limit)
+
+
+def _fetch(query, Model, cursor, limit):
+    if hasattr(query, "fetch"):
+        return query.fetch(cursor, limit)
+    return _after_cursor(query, Model, cursor).limit(limit).all()
+
+
+def paginate_partitions(parts, cursor=None, limit=API_PAGE_DEFAULT, bucket=None):
+    """
+    parts：[(query, Model), ...]，依時間由新到舊、時間互不重疊的歷史分區（見 partitions.py）
+           已封存的分區為 (archive.ArchiveQuery, ArchivedPartition)
+    依序讀取各分區直到湊滿一頁，cursor 在各分區間通用
+    bucket：跨分區邊界的 bucket 只留最新一筆（見 downsample.drop_bucket_duplicates），
+            被略過的資料由同一個分區接著補足
+    正規化到 vessels 的靜態欄位在這裡填回（見 vessels.hydrate）
+    """
+    rows = []
+    for k, (query, Model) in enumerate(parts):
+        part_cursor = cursor
+        while True:
+            want = limit + 1 - len(rows)
+            batch = _fetch(query, Model, part_cursor, want)
+            kept = drop_bucket_duplicates(batch, parts[:k], bucket) if bucket and k and batch else batch
+            rows += kept
+            if len(kept) == len(batch) or len(batch) < want:
+                break
+            part_cursor = encode_cursor(batch[-1].timestamp, batch[-1].id)
+        if len(rows) > limit:
+            break
+    rows, next_cursor = _page(rows, limit)
+    return hydrate(rows), next_cursor
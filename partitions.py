@@ -0,0 +1,341 @@
+# partitions.py
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from archive import ArchivedPartition, archive_path, write_archive
+from config import HISTORY_PARTITION, HISTORY_RETENTION_DAYS, ARCHIVE_AFTER_DAYS
+from migrations import ensure_rtree, ensure_column, ensure_vessel_view
+from models import (
+    ShipBaseMixin, VesselRefMixin, history_table_args, session_for, RTREE_MODELS, VESSEL_MODELS, _rtree_ready,
+)
+
+
+# =========================================
+# 歷史表時間分區（HISTORY_PARTITION=day / week）
+# =========================================
+# ShipAIS / ChinaBoatAIS 依 timestamp 寫入 <表格>_p<分區>：
+#   day  → ship_ais_p20251018
+#   week → ship_ais_p2025w42（ISO 週，週一 00:00 UTC 起）
+# 原本的表格保留為「未分區」的舊資料（python migrations.py partition 可搬進分區），
+# 啟用分區後不再寫入，以其 timestamp 最小 / 最大值參與查詢裁剪
+#
+# - 寫入：fetcher 每輪開始時取得本輪的分區表（不存在就建立，含索引與 R*Tree）
+# - 查詢：只查與 start / end 重疊的分區，依時間由新到舊串接（見 pagination.paginate_partitions）
+# - 保存期限：HISTORY_RETENTION_DAYS > 0 時，超過期限的分區整個 DROP TABLE，不必逐筆 DELETE
+# - 封存：ARCHIVE_AFTER_DAYS > 0 時，結束超過該天數的分區寫成欄位式 .npz 後 DROP（見 archive.py），
+#         查詢時與分區表依時間串接；超過保存期限的封存檔一併刪除
+#
+# 分區表使用 AUTOINCREMENT，新分區的 id 接在前一個分區之後，所有分區間 id 不重複，
+# (timestamp, id) 分頁 cursor 可直接跨分區使用
+PARTITIONED_MODELS = RTREE_MODELS
+PARTITIONED = HISTORY_PARTITION in ("day", "week")
+
+_KEY_PATTERN = r"(\d{8}|\d{4}w\d{2})"
+_DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"   # SQLAlchemy 寫入 SQLite 的 DateTime 格式
+
+_lock = threading.Lock()
+_states = {}     # Model → {"parts": [分區，由新到舊], "archived": [封存分區，由新到舊], "base": (最早, 最晚) 或 None}
+_models = {}     # (Model, 分區) → 分區 Model（split 模式下各分類的表格名稱相同，不能只用名稱）
+
+
+def partition_key(timestamp, scheme=HISTORY_PARTITION):
+    if scheme == "week":
+        year, week, _ = timestamp.isocalendar()
+        return f"{year}w{week:02d}"
+    return timestamp.strftime("%Y%m%d")
+
+
+def partition_bounds(key):
+    """分區的時間範圍 [start, end)"""
+    if "w" in key:
+        start = datetime.strptime(f"{key[:4]}-W{key[5:]}-1", "%G-W%V-%u")
+        return start, start + timedelta(days=7)
+    start = datetime.strptime(key, "%Y%m%d")
+    return start, start + timedelta(days=1)
+
+
+def partition_model(Model, key):
+    """分區表的 ORM Model（與 Model 欄位、索引相同）"""
+    name = f"{Model.__tablename__}_p{key}"
+    if (Model, key) not in _models:
+        Base = Model.__bases__[0]
+        _models[Model, key] = type(f"{Model.__name__}_p{key}", (Base, ShipBaseMixin, VesselRefMixin), {
+            "__tablename__": name,
+            "__table_args__": (*history_table_args(name), {"sqlite_autoincrement": True}),
+            "__partition_of__": Model,
+            "__partition_start__": partition_bounds(key)[0],
+            "__vessel_table__": Model.__vessel_table__,
+        })
+    return _models[Model, key]
+
+
+def _part(Model, key):
+    start, end = partition_bounds(key)
+    return {"key": key, "start": start, "end": end, "model": partition_model(Model, key)}
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+def _ensure_vessel_ref(engine, Model, table):
+    """舊的歷史表 / 分區表補上 vessel_id 欄位，並建立靜態欄位補回的 <表格>_full VIEW"""
+    ensure_column(engine, table, "vessel_id", f"INTEGER REFERENCES {Model.__vessel_table__}(id)")
+    ensure_vessel_view(engine, table, Model.__vessel_table__)
+
+
+def _load_state(engine, Model):
+    """讀取現有的分區表、封存檔與未分區表格的時間範圍"""
+    base = Model.__tablename__
+    pattern = re.compile(rf"^{re.escape(base)}_p{_KEY_PATTERN}$")
+    VESSEL_MODELS[Model].__table__.create(engine, checkfirst=True)   # 命令列工具不經過 init_models
+    _ensure_vessel_ref(engine, Model, base)
+    with engine.connect() as conn:
+        names = conn.execute(
+            text("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE :prefix"),
+            {"prefix": f"{base}_p%"},
+        ).scalars().all()
+        lo, hi = conn.execute(text(f"SELECT MIN(timestamp), MAX(timestamp) FROM {base}")).one()
+
+    parts = []
+    for name in names:
+        match = pattern.match(name)
+        if match:
+            part = _part(Model, match.group(1))
+            _ensure_vessel_ref(engine, Model, name)
+            if ensure_rtree(engine, name):
+                _rtree_ready.add(part["model"])
+            parts.append(part)
+
+    parts.sort(key=lambda p: p["start"], reverse=True)
+
+    archived = []
+    directory = os.path.dirname(archive_path(engine, base))
+    archive_pattern = re.compile(rf"^{re.escape(base)}_p{_KEY_PATTERN}\.npz$")
+    for filename in (os.listdir(directory) if os.path.isdir(directory) else []):
+        match = archive_pattern.match(filename)
+        if match:
+            key = match.group(1)
+            archived.append(ArchivedPartition(
+                Model, key, *partition_bounds(key), os.path.join(directory, filename)
+            ))
+    archived.sort(key=lambda a: a.start, reverse=True)
+
+    return {
+        "parts": parts,
+        "archived": archived,
+        "base": (_parse_time(lo), _parse_time(hi)) if lo else None,
+    }
+
+
+def _state(engine, Model):
+    """呼叫端需持有 _lock"""
+    if Model not in _states:
+        _states[Model] = _load_state(engine, Model)
+    return _states[Model]
+
+
+def _create_partition(engine, Model, state, key):
+    part = _part(Model, key)
+    table = part["model"].__table__
+
+    with engine.begin() as conn:
+        table.create(conn, checkfirst=True)
+        # id 接在目前所有分區（含未分區表格、封存檔）的最大值之後
+        newest = [p["model"].__tablename__ for p in state["parts"][:1]]
+        max_id = max([
+            *(conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {t}")).scalar()
+              for t in [Model.__tablename__, *newest]),
+            *(a.max_id() for a in state["archived"][:1]),
+        ])
+        conn.execute(
+            text("INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq "
+                 "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"),
+            {"name": table.name, "seq": max_id},
+        )
+
+    if ensure_rtree(engine, table.name):
+        _rtree_ready.add(part["model"])
+    ensure_vessel_view(engine, table.name, Model.__vessel_table__)
+
+    state["parts"] = sorted([*state["parts"], part], key=lambda p: p["start"], reverse=True)
+    print(f"🗂️ {engine.url.database}: 建立歷史分區 {table.name}")
+    return part
+
+
+def _drop_expired(engine, state, now):
+    """整個分區都超過保存期限就 DROP（含 R*Tree），封存檔直接刪除"""
+    if HISTORY_RETENTION_DAYS <= 0:
+        return
+    cutoff = now - timedelta(days=HISTORY_RETENTION_DAYS)
+
+    for archived in [a for a in state["archived"] if a.end <= cutoff]:
+        os.remove(archived.path)
+        state["archived"].remove(archived)
+        print(f"🗑️ 刪除過期封存檔 {archived.path}")
+
+    expired = [p for p in state["parts"] if p["end"] <= cutoff]
+    if not expired:
+        return
+
+    # DROP 成功後才更新狀態，失敗（如 database is locked）時下一輪重試
+    with engine.begin() as conn:
+        for part in expired:
+            name = part["model"].__tablename__
+            conn.execute(text(f"DROP VIEW IF EXISTS {name}_full"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}_rtree"))
+            conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+    state["parts"] = [p for p in state["parts"] if p["end"] > cutoff]
+    for part in expired:
+        _rtree_ready.discard(part["model"])
+        print(f"🗑️ {engine.url.database}: 刪除過期歷史分區 {part['model'].__tablename__}")
+
+
+# =========================================
+# 寫入：本輪資料要寫入的表格
+# =========================================
+def ingest_model(Model, timestamp):
+    """
+    回傳 timestamp 所屬的分區 Model（不存在就建立），並刪除過期分區
+    未啟用分區時回傳 Model 本身；需在本輪寫入開始前呼叫（DDL 使用獨立連線）
+    建立分區失敗時拋出例外；刪除過期分區失敗只記錄，下一輪重試
+    """
+    if not PARTITIONED or Model not in PARTITIONED_MODELS:
+        return Model
+
+    engine = session_for(Model).get_bind()
+    key = partition_key(timestamp)
+    with _lock:
+        state = _state(engine, Model)
+        part = next((p for p in state["parts"] if p["key"] == key), None)
+        if part is None:
+            part = _create_partition(engine, Model, state, key)
+        try:
+            _drop_expired(engine, state, timestamp)
+        except Exception as e:
+            print(f"⚠️ {engine.url.database}: 刪除過期歷史分區失敗，下一輪重試: {e}")
+    return part["model"]
+
+
+# =========================================
+# 查詢：與時間區間重疊的表格
+# =========================================
+def history_models(Model, start=None, end=None, engine=None):
+    """
+    回傳與 [start, end] 重疊的歷史表 Model，依時間由新到舊（時間互不重疊）
+    已封存的分區以 archive.ArchivedPartition 表示；未啟用分區時為 [Model]
+    engine：不在 app context 中（命令列工具）時指定
+    """
+    if not PARTITIONED or Model not in PARTITIONED_MODELS:
+        return [Model]
+
+    engine = engine or session_for(Model).get_bind()
+    with _lock:
+        state = _state(engine, Model)
+        parts = [(p["start"], p["end"], p["model"]) for p in state["parts"]]
+        parts += [(a.start, a.end, a) for a in state["archived"]]
+        base = state["base"]
+
+    def overlaps(lo, hi):
+        return (start is None or hi >= start) and (end is None or lo <= end)
+
+    parts.sort(key=lambda p: p[0], reverse=True)
+    models = [model for lo, hi, model in parts if overlaps(lo, hi)]
+    # 未分區的舊資料一定早於所有分區（啟用分區後就不再寫入）
+    if base and overlaps(*base):
+        models.append(Model)
+    return models
+
+
+# =========================================
+# 既有資料搬進分區（python migrations.py partition）
+# =========================================
+def partition_existing(engine, Model, scheme=None):
+    """
+    把未分區表格的資料依 timestamp 搬進分區（保留原本的 id）
+    每個分區一個 transaction：複製後刪除原表格中的那一段，中斷後可重新執行
+    """
+    scheme = scheme or (HISTORY_PARTITION if PARTITIONED else "day")
+    base = Model.__tablename__
+    with _lock:
+        _states.pop(Model, None)
+        state = _state(engine, Model)
+        if state["base"] is None:
+            print(f"📦 {engine.url.database} / {base}：沒有未分區的資料")
+            return
+
+        lo, hi = state["base"]
+        keys = []
+        day = lo.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day <= hi:
+            key = partition_key(day, scheme)
+            if key not in keys:
+                keys.append(key)
+            day += timedelta(days=1)
+
+        columns = ", ".join(c.name for c in Model.__table__.columns)
+        for key in keys:
+            part = next((p for p in state["parts"] if p["key"] == key), None)
+            part = part or _create_partition(engine, Model, state, key)
+            name = part["model"].__tablename__
+            bounds = {
+                "start": part["start"].strftime(_DB_TIME_FORMAT),
+                "end": part["end"].strftime(_DB_TIME_FORMAT),
+            }
+            with engine.begin() as conn:
+                moved = conn.execute(text(
+                    f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {base} "
+                    f"WHERE timestamp >= :start AND timestamp < :end"
+                ), bounds).rowcount
+                conn.execute(text(f"DELETE FROM {base} WHERE timestamp >= :start AND timestamp < :end"), bounds)
+            print(f"   {name}: {moved} 筆")
+
+        _states.pop(Model, None)
+
+
+# =========================================
+# 封存已結束的分區（ARCHIVE_AFTER_DAYS，見 archive.py）
+# =========================================
+def archive_partitions(engine, Model, before):
+    """
+    結束時間不晚於 before 的分區寫成封存檔後 DROP，回傳封存的分區數
+    寫檔時不持有 _lock（分區已結束，不會再寫入），只有 DROP 與更新狀態時才持有
+    """
+    with _lock:
+        state = _state(engine, Model)
+        closed = [p for p in state["parts"] if p["end"] <= before]
+
+    for part in sorted(closed, key=lambda p: p["start"]):
+        name = part["model"].__tablename__
+        path = archive_path(engine, name)
+        raw = engine.raw_connection()
+        try:
+            count = write_archive(raw, Model, name, path, VESSEL_MODELS[Model].__tablename__)
+        finally:
+            raw.close()
+
+        with _lock:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP VIEW IF EXISTS {name}_full"))
+                conn.execute(text(f"DROP TABLE IF EXISTS {name}_rtree"))
+                conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            _rtree_ready.discard(part["model"])
+            state["parts"] = [p for p in state["parts"] if p is not part]
+            state["archived"] = sorted(
+                [*state["archived"], ArchivedPartition(Model, part["key"], part["start"], part["end"], path)],
+                key=lambda a: a.start, reverse=True,
+            )
+        print(f"🧊 {engine.url.database}: 封存 {name}（{count} 筆，{os.path.getsize(path) / 1e6:.1f} MB）")
+    return len(closed)
+
+
+def archive_closed(Model, now=None):
+    """排程每天呼叫：封存結束超過 ARCHIVE_AFTER_DAYS 天的分區"""
+    if not PARTITIONED or ARCHIVE_AFTER_DAYS <= 0 or Model not in PARTITIONED_MODELS:
+        return 0
+    before = (now or datetime.utcnow()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+    return archive_partitions(session_for(Model).get_bind(), Model, before)
@@ -0,0 +1,208 @@
+# rollups.py
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import case, distinct, func, select
+
+from models import ShipHourRollup, ZoneHourRollup, ShipDayRollup, ZoneDayRollup, session_for
+from zone_registry import zones_containing
+
+
+# =========================================
+# 海警船每小時彙總（/api/stats）
+# =========================================
+# 每艘海警船每小時一筆：取樣數、位於 12nm 內 / 12–24nm 間的筆數、第一次 / 最後一次看到的時間；
+# 每個自訂警戒區另記一筆（ZoneHourRollup）
+#
+# fetcher 每輪以 BulkWriter.accumulate 累加（ON CONFLICT DO UPDATE），
+# 與 boat_test / boat_check12 / boat_check24 的原始資料在同一個 commit 寫入，
+# 每日彙總（ShipDayRollup / ZoneDayRollup）由每小時彙總上的 trigger 同步（見 migrations.ensure_daily_rollup）
+# 統計查詢只讀彙總表，不必掃描原始資料；「ship-hours」= 有取樣的 (船, 小時) 數
+# 既有的 boat_test 原始資料可用 `python migrations.py rollups` 重建
+SHIP_KEYS = ("hour", "ship_id")
+SHIP_COUNTERS = ("samples", "samples_12nm", "samples_24nm")
+ZONE_KEYS = ("hour", "zone_id", "ship_id")
+ZONE_COUNTERS = ("samples",)
+
+
+def hour_of(timestamp):
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _accumulate(writer, timestamp, ship_id, shipname, in_12nm, in_24nm, zones):
+    hour = hour_of(timestamp)
+    seen = {"shipname": shipname, "first_seen": timestamp, "last_seen": timestamp}
+    writer.accumulate(ShipHourRollup, {
+        "hour": hour, "ship_id": ship_id, **seen,
+        "samples": 1,
+        "samples_12nm": int(in_12nm),
+        "samples_24nm": int(in_24nm and not in_12nm),
+    }, SHIP_KEYS, SHIP_COUNTERS)
+    for zone in zones:
+        writer.accumulate(ZoneHourRollup, {
+            "hour": hour, "zone_id": zone["id"], "zone_name": zone["name"], "ship_id": ship_id, **seen,
+            "samples": 1,
+        }, ZONE_KEYS, ZONE_COUNTERS)
+
+
+def record_cycle(writer, timestamp, ships, in_12nm, in_24nm):
+    """
+    fetcher 每輪呼叫：ships 為本輪的海警船 record，in_12nm / in_24nm 為對應的判斷結果
+    自訂警戒區以 STRtree 一次判斷
+    """
+    zones = defaultdict(list)
+    for i, zone in zones_containing([r["lon"] for r in ships], [r["lat"] for r in ships]):
+        zones[i].append(zone)
+    for i, r in enumerate(ships):
+        _accumulate(writer, timestamp, r["ship_id"], r["shipname"], in_12nm[i], in_24nm[i], zones[i])
+
+
+# =========================================
+# 重建（python migrations.py rollups）
+# =========================================
+def rebuild(writer, rows):
+    """
+    rows：boat_test 原始資料 [(timestamp, ship_id, shipname, lat, lon), ...]
+    重新判斷 12 / 24nm 與目前的自訂警戒區後累加，寫入與 commit 由呼叫端處理
+    """
+    from geofence import classify_positions
+
+    if not rows:
+        return 0
+    lons = np.array([r[4] for r in rows], dtype=float)
+    lats = np.array([r[3] for r in rows], dtype=float)
+    in_12nm, in_24nm = classify_positions(lons, lats)
+    zones = defaultdict(list)
+    for i, zone in zones_containing(lons, lats):
+        zones[i].append(zone)
+    for i, (timestamp, ship_id, shipname, _, _) in enumerate(rows):
+        _accumulate(writer, timestamp, ship_id, shipname, in_12nm[i], in_24nm[i], zones[i])
+    return len(rows)
+
+
+# =========================================
+# 查詢
+# =========================================
+# 完整的日子讀每日彙總，頭尾不足一天的部分讀每小時彙總，結果與全部讀每小時彙總相同
+SHIP_MEASURES = ("ship_hours", "ship_hours_12nm", "ship_hours_24nm", "samples", "samples_12nm", "samples_24nm")
+
+
+def _segments(start, end):
+    """[start, end)（整點）→ [(每小時 / 每日, lo, hi), ...]"""
+    first_day = start.replace(hour=0) + (timedelta(days=1) if start.hour else timedelta())
+    last_day = end.replace(hour=0)
+    if first_day >= last_day:
+        return [("hour", start, end)] if start < end else []
+    segments = [("hour", start, first_day), ("day", first_day, last_day), ("hour", last_day, end)]
+    return [seg for seg in segments if seg[1] < seg[2]]
+
+
+def _ship_measures(Model):
+    """每小時 / 每日彙總 → SHIP_MEASURES（順序相同）"""
+    if Model is ShipHourRollup:
+        hours = (func.count(), _hours(Model.samples_12nm > 0), _hours(Model.samples_24nm > 0))
+    else:
+        hours = (func.sum(Model.hours), func.sum(Model.hours_12nm), func.sum(Model.hours_24nm))
+    return (*hours, func.sum(Model.samples), func.sum(Model.samples_12nm), func.sum(Model.samples_24nm))
+
+
+def _time(Model):
+    return Model.hour if hasattr(Model, "hour") else Model.day
+
+
+def _bucket(column, interval):
+    """hour：整點；day：日期（UTC）"""
+    return func.strftime("%Y-%m-%d %H:00:00" if interval == "hour" else "%Y-%m-%d", column)
+
+
+def _hours(condition):
+    return func.sum(case((condition, 1), else_=0))
+
+
+def _merge_seen(target, name_key, name, first_seen, last_seen):
+    """合併各段的 first_seen / last_seen，名稱取最後一次看到的"""
+    if last_seen and (target["last_seen"] is None or last_seen >= target["last_seen"]):
+        target["last_seen"] = last_seen
+        target[name_key] = name or target[name_key]
+    if first_seen and (target["first_seen"] is None or first_seen < target["first_seen"]):
+        target["first_seen"] = first_seen
+
+
+def stats(start, end, interval="day", ship_id=None):
+    """
+    與 [start, end) 重疊的各小時內的海警船統計：
+      totals / series（依 interval）/ ships（每艘船）/ zones（每個自訂警戒區）
+    """
+    session = session_for(ShipHourRollup)
+    start, end = hour_of(start), hour_of(end + timedelta(hours=1) - timedelta(microseconds=1))
+    segments = [
+        (ShipHourRollup if kind == "hour" else ShipDayRollup,
+         ZoneHourRollup if kind == "hour" else ZoneDayRollup, lo, hi)
+        for kind, lo, hi in _segments(start, end)
+    ]
+
+    def scoped(query, Model, lo, hi):
+        query = query.where(_time(Model) >= lo, _time(Model) < hi)
+        return query.where(Model.ship_id == ship_id) if ship_id else query
+
+    # 每艘船（各段依 ship_id 彙總後合併）
+    ships = {}
+    for R, _, lo, hi in segments:
+        rows = session.execute(scoped(select(
+            R.ship_id, func.max(R.shipname), func.min(R.first_seen), func.max(R.last_seen), *_ship_measures(R),
+        ), R, lo, hi).group_by(R.ship_id))
+        for sid, shipname, first_seen, last_seen, *values in rows:
+            ship = ships.setdefault(sid, {
+                "ship_id": sid, "shipname": shipname, **dict.fromkeys(SHIP_MEASURES, 0),
+                "first_seen": None, "last_seen": None,
+            })
+            for name, value in zip(SHIP_MEASURES, values):
+                ship[name] += value or 0
+            _merge_seen(ship, "shipname", shipname, first_seen, last_seen)
+
+    ships = sorted(ships.values(), key=lambda s: (-s["ship_hours_12nm"], -s["ship_hours"], s["ship_id"]))
+    totals = {"ships": len(ships), **{name: sum(s[name] for s in ships) for name in SHIP_MEASURES}}
+
+    # 時間序列：每天只會落在其中一段，不同段不會重複計算同一艘船
+    series = {}
+    for R, _, lo, hi in segments:
+        if interval == "hour" and R is ShipDayRollup:
+            R = ShipHourRollup
+        bucket = _bucket(_time(R), interval)
+        rows = session.execute(scoped(select(
+            bucket, func.count(distinct(R.ship_id)), *_ship_measures(R),
+        ), R, lo, hi).group_by(bucket))
+        for t, count, *values in rows:
+            point = series.setdefault(t, {"t": t, "ships": 0, **dict.fromkeys(SHIP_MEASURES, 0)})
+            point["ships"] += count
+            for name, value in zip(SHIP_MEASURES, values):
+                point[name] += value or 0
+
+    # 自訂警戒區（依 (zone_id, ship_id) 彙總後合併，才能計算不重複的船數）
+    zones = {}
+    for _, Z, lo, hi in segments:
+        hours = func.count() if Z is ZoneHourRollup else func.sum(Z.hours)
+        rows = session.execute(scoped(select(
+            Z.zone_id, Z.ship_id, func.max(Z.zone_name), hours, func.sum(Z.samples),
+            func.min(Z.first_seen), func.max(Z.last_seen),
+        ), Z, lo, hi).group_by(Z.zone_id, Z.ship_id))
+        for zone_id, sid, zone_name, ship_hours, samples, first_seen, last_seen in rows:
+            zone = zones.setdefault(zone_id, {
+                "zone_id": zone_id, "zone_name": zone_name, "ship_ids": set(),
+                "ship_hours": 0, "samples": 0, "first_seen": None, "last_seen": None,
+            })
+            zone["ship_ids"].add(sid)
+            zone["ship_hours"] += ship_hours or 0
+            zone["samples"] += samples or 0
+            _merge_seen(zone, "zone_name", zone_name, first_seen, last_seen)
+
+    return {
+        "totals": totals,
+        "series": [series[t] for t in sorted(series)],
+        "ships": ships,
+        "zones": [
+            {"ships": len(z.pop("ship_ids")), **z}
+            for z in sorted(zones.values(), key=lambda z: z["zone_id"])
+        ],
+    }
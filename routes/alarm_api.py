@@ -4,6 +4,8 @@ from flask import Blueprint, request, jsonify
 from sqlalchemy import create_engine, Column, Integer, String, Text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
+from zone_registry import notify_zones_changed
+
 # Blueprint
 alarm_api = Blueprint("alarm_api", __name__)
 
@@ -86,6 +88,7 @@ def save_alarm_zones():
 
     session.commit()
     session.close()
+    notify_zones_changed()
 
     return jsonify({"status": "saved"}), 200
 
@@ -105,5 +108,6 @@ def delete_alarm_zone(zone_id):
     session.delete(row)
     session.commit()
     session.close()
+    notify_zones_changed()
 
     return jsonify({"status": "deleted", "id": zone_id})
@@ -1,30 +1,132 @@
-from flask import Blueprint, jsonify, request, abort
-from dateutil import parser
-from datetime import datetime, timedelta
+import calendar
 
+from flask import Blueprint, Response, jsonify, request, abort
+from sqlalchemy import select, func, or_, and_
+from dateutil import parser
+from datetime import datetime, timedelta, timezone
+import queue
+
+from pagination import paginate_partitions, page_limit, decode_cursor, CursorError
+from streaming import stream_format, stream_limit, stream_rows
+from compact import columnar_format, columnar_response
+from downsample import downsample_params, filter_buckets, simplify_tracks
+from density import density_grid
+from partitions import history_models
+from archive import ArchivedPartition
+from trackstore import track_store, TRACK_FIELDS
+from rollups import stats as rollup_stats
+from snapshot import build_fleet_payload, fleet_snapshot_entry
+from events import broadcaster, CLOSED
+from vessels import hydrate
+from config import SSE_KEEPALIVE, TRACK_STORE
 from models import (
     ShipAIS,
     BoatCheck12AIS, BoatCheck24AIS,
-    CCGShipAIS, CCGCheck12ShipAIS, CCGCheck24ShipAIS,
     BoatCheck12Session, BoatCheck24Session,
-    CCGSession, CCGCheck12Session, CCGCheck24Session,
-    ChinaBoatSession, ChinaBoatAIS
+    ChinaBoatSession, ChinaBoatAIS,
+    LatestShipAIS, ChinaBoatLatestAIS,
+    NAME_MODELS, VESSEL_MODELS, spatial_index, name_index, session_for, base_model
 )
 
 # 建立 Blueprint
 api_blueprint = Blueprint("api", __name__)
 
 # =========================================
-# API: 最新 AIS 資料
+# 經緯度範圍篩選
+# =========================================
+def _utc_naive(dt):
+    """帶時區的時間轉成 naive UTC（與 DB 內的 timestamp 一致）"""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def _epoch(dt):
+    """datetime → epoch 秒（naive 視為 UTC，與 R*Tree 的時間軸一致）"""
+    return calendar.timegm(dt.utctimetuple())
+
+
+def _filter_bbox(query, Model, lat_range=None, lon_range=None, time_range=None):
+    """
+    lat_range / lon_range：(最小, 最大)，None 表示該方向不限制
+    time_range：呼叫端已套用的時間區間，一併交給 R*Tree 縮小候選範圍
+
+    有 R*Tree 時先用空間索引找出候選 id，再以原表 lat / lon 精確過濾
+    （R*Tree 以 32-bit 浮點數儲存，條件用「重疊」避免邊界上的點被漏掉）
+    """
+    if lat_range is None and lon_range is None:
+        return query
+
+    rtree = spatial_index(Model)
+    if rtree is not None:
+        conds = []
+        if lat_range:
+            conds += [rtree.c.max_lat >= lat_range[0], rtree.c.min_lat <= lat_range[1]]
+        if lon_range:
+            conds += [rtree.c.max_lon >= lon_range[0], rtree.c.min_lon <= lon_range[1]]
+        if time_range:
+            conds += [rtree.c.max_t >= _epoch(time_range[0]), rtree.c.min_t <= _epoch(time_range[1]) + 1]
+        query = query.filter(Model.id.in_(select(rtree.c.id).where(*conds)))
+
+    if lat_range:
+        query = query.filter(Model.lat.between(*lat_range))
+    if lon_range:
+        query = query.filter(Model.lon.between(*lon_range))
+    return query
+
+
+# =========================================
+# 船名篩選（部分比對，不分大小寫）
+# =========================================
+def _name_condition(Model, pattern):
+    """
+    回傳 (船名表, 條件)：歷史表 Model 的船名表中符合 LIKE pattern 的資料
+    有全文索引時走 FTS5 trigram，否則掃描船名表（仍遠小於歷史表）
+    """
+    index = name_index(Model)
+    if index is None:
+        NameModel = NAME_MODELS[base_model(Model)]
+        return NameModel, NameModel.shipname.ilike(pattern)
+
+    NameModel, fts = index
+    return NameModel, NameModel.id.in_(select(fts.c.rowid).where(fts.c.shipname.like(pattern)))
+
+
+def _filter_shipname(query, Model, name):
+    """
+    先由船名表找出曾用過該名稱的 ship_id，歷史表只需查這些船（ship_id 索引）
+    再以原表 shipname 比對（同一艘船改過名時只回傳名稱相符的那幾筆）；
+    靜態欄位已正規化的資料改比對 vessel_id 對應版本的船名（見 vessels.py）
+    """
+    pattern = f"%{name}%"
+    NameModel, condition = _name_condition(Model, pattern)
+    ship_ids = select(NameModel.ship_id).where(condition)
+    VesselModel = VESSEL_MODELS[base_model(Model)]
+    return query.filter(Model.ship_id.in_(ship_ids), or_(
+        Model.shipname.ilike(pattern),
+        Model.vessel_id.in_(select(VesselModel.id).where(VesselModel.shipname.ilike(pattern))),
+    ))
+
+
+# =========================================
+# API: 最新 AIS 資料（每個來源 tile 最新一筆）
 # =========================================
 @api_blueprint.route("/ais/latest", methods=["GET"])
 def get_latest_data():
     try:
-        results = {}
-        latest = ShipAIS.query.order_by(ShipAIS.timestamp.desc()).all()
-        for row in latest:
-            if row.source not in results:
-                results[row.source] = row.to_dict()
+        # 只讀每艘船最新一筆的 ship_latest 表，每個來源的最新時間由 (source, timestamp) 索引取得
+        # 同一輪同一個 tile 的船 timestamp 相同，取 id 最大的一筆
+        newest = (
+            select(LatestShipAIS.source, func.max(LatestShipAIS.timestamp).label("timestamp"))
+            .group_by(LatestShipAIS.source)
+            .subquery()
+        )
+        picked = (
+            select(func.max(LatestShipAIS.id))
+            .join(newest, and_(LatestShipAIS.source == newest.c.source,
+                               LatestShipAIS.timestamp == newest.c.timestamp))
+            .group_by(LatestShipAIS.source)
+        )
+        latest = LatestShipAIS.query.filter(LatestShipAIS.id.in_(picked)).all()
+        results = {row.source: row.to_dict() for row in latest}
         return jsonify({"timestamp": datetime.utcnow().isoformat(), "results": results})
     except Exception as e:
         abort(500, description=str(e))
@@ -34,22 +136,27 @@ def get_latest_data():
 # =========================================
 @api_blueprint.route("/ais/history", methods=["GET"])
 def get_ship_history():
+    # 分頁參數：limit（上限 API_PAGE_MAX）、cursor（上一頁回傳的 next_cursor）
+    # 串流模式（stream=1 / format=ndjson）的 limit 未指定表示全部
+    # format=columnar：欄位式 + gzip 的精簡格式（見 compact.py），分頁方式相同
+    columnar = columnar_format(request)
+    fmt = None if columnar else stream_format(request)
     try:
-        query = ShipAIS.query
-
-        # 篩選船名
-        if request.args.get("shipname"):
-            query = query.filter(ShipAIS.shipname.ilike(f"%{request.args['shipname']}%"))
-
-        # 篩選船 ID
-        if request.args.get("ship_id"):
-            query = query.filter_by(ship_id=request.args["ship_id"])
+        limit = (stream_limit if fmt else page_limit)(request.args.get("limit"))
+        cursor = request.args.get("cursor")
+        if cursor:
+            decode_cursor(cursor)
+        tolerance, bucket = downsample_params(request.args)
+    except ValueError as e:   # 含 CursorError
+        abort(400, description=str(e))
 
+    try:
         # 篩選時間區間
+        time_range = None
         if request.args.get("start") and request.args.get("end"):
-            start = parser.parse(request.args.get("start"))
-            end = parser.parse(request.args.get("end"))
-            query = query.filter(ShipAIS.timestamp.between(start, end))
+            start = _utc_naive(parser.parse(request.args.get("start")))
+            end = _utc_naive(parser.parse(request.args.get("end")))
+            time_range = (start, end)
 
         # 🟡【加在這裡】加入經緯度篩選條件
         min_lat = request.args.get("min_lat")
@@ -57,49 +164,97 @@ def get_ship_history():
         min_lon = request.args.get("min_lon")
         max_lon = request.args.get("max_lon")
 
-        # 經緯度範圍檢查 + 篩選
+        # 經緯度範圍檢查
+        lat_range = lon_range = None
         if min_lat and max_lat and float(min_lat) < float(max_lat):
-            query = query.filter(
-                ShipAIS.lat >= float(min_lat),
-                ShipAIS.lat <= float(max_lat)
-            )
+            lat_range = (float(min_lat), float(max_lat))
         if min_lon and max_lon and float(min_lon) < float(max_lon):
-            query = query.filter(
-                ShipAIS.lon >= float(min_lon),
-                ShipAIS.lon <= float(max_lon)
-            )
+            lon_range = (float(min_lon), float(max_lon))
+
+        def build(Model):
+            query = Model.query
+
+            # 篩選船名
+            if request.args.get("shipname"):
+                query = _filter_shipname(query, Model, request.args["shipname"])
+
+            # 篩選船 ID
+            if request.args.get("ship_id"):
+                query = query.filter_by(ship_id=request.args["ship_id"])
+
+            if time_range:
+                query = query.filter(Model.timestamp.between(*time_range))
+
+            # 經緯度篩選（R*Tree 空間索引）
+            query = _filter_bbox(query, Model, lat_range, lon_range, time_range)
+
+            # 降採樣：bucket 在 SQL 端過濾
+            if bucket:
+                query = filter_buckets(query, Model, bucket)
+            return query
+
+        # 只查與時間區間重疊的歷史分區（未啟用分區時只有 ShipAIS 本身），已封存的分區改讀封存檔
+        filters = dict(
+            ship_id=request.args.get("ship_id"), shipname=request.args.get("shipname"),
+            time_range=time_range, lat_range=lat_range, lon_range=lon_range, bucket=bucket,
+        )
+        parts = [
+            (M.query(**filters) if isinstance(M, ArchivedPartition) else build(M), M)
+            for M in history_models(ShipAIS, *(time_range or ()))
+        ]
+
+        # tolerance 在序列化前簡化每一頁的軌跡
+        reduce = (lambda rows: simplify_tracks(rows, tolerance)) if tolerance else None
 
-        # ✅ 查詢結果
-        results = [r.to_dict() for r in query.order_by(ShipAIS.timestamp.desc())]
+        if fmt:
+            return stream_rows(ShipAIS.query.session, parts, ShipAIS.to_dict, fmt, cursor, limit, reduce, bucket)
+
+        # ✅ 查詢結果（依 timestamp, id 由新到舊，一次一頁）
+        rows, next_cursor = paginate_partitions(parts, cursor, limit, bucket)
+        if reduce:
+            rows = reduce(rows)
+        if columnar:
+            return columnar_response(request, ShipAIS, rows, next_cursor)
+        results = [r.to_dict() for r in rows]
 
         # ✅ 額外回傳筆數統計（可在前端 console 顯示）
         return jsonify({
             "count": len(results),
-            "data": results
+            "data": results,
+            "next_cursor": next_cursor
         })
 
     except Exception as e:
         abort(500, description=str(e))
 
 
+# =========================================
+# CCG 即時狀態：優先回傳 fetcher 發布的快照
+# =========================================
+def _fleet_response(name):
+    """
+    有快照時直接回傳已序列化的內容（strong ETag，If-None-Match 相同回 304）
+    伺服器剛啟動或快照過期時改查 DB
+    """
+    entry = fleet_snapshot_entry(name)
+    if entry is None:
+        payload, _ = build_fleet_payload(name, datetime.utcnow())
+        return jsonify(payload)
+
+    body, etag = entry
+    response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
+
 # =========================================
 # API: CCG 最新資料（所有海警船最新）
 # =========================================
 @api_blueprint.route("/ccg_data", methods=["GET"])
 def get_ccg_data():
     try:
-        results = CCGSession.query(CCGShipAIS).all()
-        data = [
-            {
-                "ship_id": r.ship_id,
-                "shipname": r.shipname,
-                "lat": r.lat,
-                "lon": r.lon,
-                "timestamp": r.timestamp.isoformat() if r.timestamp else None
-            }
-            for r in results
-        ]
-        return jsonify({"timestamp": datetime.utcnow().isoformat(), "boats": data})
+        return _fleet_response("ccg")
     except Exception as e:
         abort(500, description=str(e))
 
@@ -109,7 +264,7 @@ def get_ccg_data():
 @api_blueprint.route("/boat_check12", methods=["GET"])
 def get_boat_check12_data():
     try:
-        results = BoatCheck12Session.query(BoatCheck12AIS).all()
+        results = hydrate(BoatCheck12Session.query(BoatCheck12AIS).all())
         data = [
             {
                 "ship_id": r.ship_id,
@@ -130,7 +285,7 @@ def get_boat_check12_data():
 @api_blueprint.route("/boat_check24", methods=["GET"])
 def get_boat_check24_data():
     try:
-        results = BoatCheck24Session.query(BoatCheck24AIS).all()
+        results = hydrate(BoatCheck24Session.query(BoatCheck24AIS).all())
         data = [
             {
                 "ship_id": r.ship_id,
@@ -151,40 +306,8 @@ def get_boat_check24_data():
 @api_blueprint.route("/ccg_check12_data", methods=["GET"])
 def get_ccg_check12_data():
     try:
-        # 只抓最近 20 分鐘內的資料（UTC）
-        cutoff = datetime.utcnow() - timedelta(minutes=20)
-
-        # 先照時間由新到舊排
-        records = (
-            CCGCheck12Session.query(CCGCheck12ShipAIS)
-            .filter(CCGCheck12ShipAIS.timestamp >= cutoff)
-            .order_by(CCGCheck12ShipAIS.timestamp.desc())
-            .all()
-        )
-
-        # 同一艘船只留最新一筆
-        latest_by_ship = {}
-        for r in records:
-            if r.ship_id not in latest_by_ship:
-                latest_by_ship[r.ship_id] = r
-
-        data = [
-            {
-                "ship_id": r.ship_id,
-                "shipname": r.shipname,
-                "lat": r.lat,
-                "lon": r.lon,
-                # 維持 isoformat，前端 formatTimeDiff 會接這個字串 + "Z"
-                "timestamp": r.timestamp.isoformat() if r.timestamp else None
-            }
-            for r in latest_by_ship.values()
-        ]
-
-        return jsonify({
-            "timestamp": datetime.utcnow().isoformat(),
-            "count": len(data),
-            "boats": data
-        })
+        # 只回傳最近 20 分鐘內的資料（UTC），同一艘船只留最新一筆
+        return _fleet_response("ccg_check12")
     except Exception as e:
         abort(500, description=str(e))
 
@@ -195,38 +318,28 @@ def get_ccg_check12_data():
 @api_blueprint.route("/ccg_check24_data", methods=["GET"])
 def get_ccg_check24_data():
     try:
-        cutoff = datetime.utcnow() - timedelta(minutes=20)
+        return _fleet_response("ccg_check24")
+    except Exception as e:
+        abort(500, description=str(e))
 
-        records = (
-            CCGCheck24Session.query(CCGCheck24ShipAIS)
-            .filter(CCGCheck24ShipAIS.timestamp >= cutoff)
-            .order_by(CCGCheck24ShipAIS.timestamp.desc())
-            .all()
-        )
 
-        latest_by_ship = {}
-        for r in records:
-            if r.ship_id not in latest_by_ship:
-                latest_by_ship[r.ship_id] = r
+# =========================================
+# chinaboat 回傳格式（統一成 AIS 格式）
+# =========================================
+CHINABOAT_COLUMNS = ("ship_id", "shipname", "lat", "lon", "speed", "course", "shiptype", "timestamp")
 
-        data = [
-            {
-                "ship_id": r.ship_id,
-                "shipname": r.shipname,
-                "lat": r.lat,
-                "lon": r.lon,
-                "timestamp": r.timestamp.isoformat() if r.timestamp else None
-            }
-            for r in latest_by_ship.values()
-        ]
 
-        return jsonify({
-            "timestamp": datetime.utcnow().isoformat(),
-            "count": len(data),
-            "boats": data
-        })
-    except Exception as e:
-        abort(500, description=str(e))
+def _chinaboat_dict(r):
+    return {
+        "ship_id": r.ship_id,
+        "shipname": r.shipname,
+        "lat": r.lat,
+        "lon": r.lon,
+        "speed": r.speed,
+        "course": r.course,
+        "shiptype": r.shiptype,
+        "timestamp": r.timestamp.strftime("%Y-%m-%d %H:%M:%S") if r.timestamp else None
+    }
 
 
 # =========================================
@@ -234,49 +347,77 @@ def get_ccg_check24_data():
 # =========================================
 @api_blueprint.route("/chinaboat/all", methods=["GET"])
 def get_all_chinaboats():
+    columnar = columnar_format(request)
+    fmt = None if columnar else stream_format(request)
     try:
-        query = ChinaBoatSession.query(ChinaBoatAIS)
-
-        # 船名模糊搜尋
-        if request.args.get("shipname"):
-            query = query.filter(ChinaBoatAIS.shipname.ilike(f"%{request.args['shipname']}%"))
+        limit = (stream_limit if fmt else page_limit)(request.args.get("limit"))
+        cursor = request.args.get("cursor")
+        if cursor:
+            decode_cursor(cursor)
+        tolerance, bucket = downsample_params(request.args)
+    except ValueError as e:   # 含 CursorError
+        abort(400, description=str(e))
 
+    try:
         # 時間區間
+        time_range = None
         if request.args.get("start") and request.args.get("end"):
-            start = parser.parse(request.args.get("start"))
-            end = parser.parse(request.args.get("end"))
-            query = query.filter(ChinaBoatAIS.timestamp.between(start, end))
+            start = _utc_naive(parser.parse(request.args.get("start")))
+            end = _utc_naive(parser.parse(request.args.get("end")))
+            time_range = (start, end)
 
         # 經緯度範圍
         min_lat = request.args.get("min_lat")
         max_lat = request.args.get("max_lat")
         min_lon = request.args.get("min_lon")
         max_lon = request.args.get("max_lon")
+        lat_range = (float(min_lat), float(max_lat)) if min_lat and max_lat else None
+        lon_range = (float(min_lon), float(max_lon)) if min_lon and max_lon else None
 
-        if min_lat and max_lat:
-            query = query.filter(ChinaBoatAIS.lat.between(float(min_lat), float(max_lat)))
-        if min_lon and max_lon:
-            query = query.filter(ChinaBoatAIS.lon.between(float(min_lon), float(max_lon)))
+        def build(Model):
+            query = ChinaBoatSession.query(Model)
 
-        # 執行查詢
-        results = query.order_by(ChinaBoatAIS.timestamp.desc()).all()
+            # 船名模糊搜尋
+            if request.args.get("shipname"):
+                query = _filter_shipname(query, Model, request.args["shipname"])
 
-        # 格式統一成 AIS 格式
-        data = [
-            {
-                "ship_id": r.ship_id,
-                "shipname": r.shipname,
-                "lat": r.lat,
-                "lon": r.lon,
-                "speed": r.speed,
-                "course": r.course,
-                "shiptype": r.shiptype,
-                "timestamp": r.timestamp.strftime("%Y-%m-%d %H:%M:%S") if r.timestamp else None
-            }
-            for r in results
+            if time_range:
+                query = query.filter(Model.timestamp.between(*time_range))
+
+            query = _filter_bbox(query, Model, lat_range, lon_range, time_range)
+
+            # 降採樣：bucket 在 SQL 端過濾
+            if bucket:
+                query = filter_buckets(query, Model, bucket)
+            return query
+
+        # 只查與時間區間重疊的歷史分區，已封存的分區改讀封存檔
+        filters = dict(
+            shipname=request.args.get("shipname"),
+            time_range=time_range, lat_range=lat_range, lon_range=lon_range, bucket=bucket,
+        )
+        parts = [
+            (M.query(**filters) if isinstance(M, ArchivedPartition) else build(M), M)
+            for M in history_models(ChinaBoatAIS, *(time_range or ()))
         ]
 
-        return jsonify({"count": len(data), "data": data})
+        # tolerance 在序列化前簡化每一頁的軌跡
+        reduce = (lambda rows: simplify_tracks(rows, tolerance)) if tolerance else None
+
+        if fmt:
+            return stream_rows(ChinaBoatSession, parts, _chinaboat_dict, fmt, cursor, limit, reduce, bucket)
+
+        # 執行查詢（一次一頁）
+        results, next_cursor = paginate_partitions(parts, cursor, limit, bucket)
+        if reduce:
+            results = reduce(results)
+        if columnar:
+            return columnar_response(request, ChinaBoatAIS, results, next_cursor, CHINABOAT_COLUMNS)
+
+        # 格式統一成 AIS 格式
+        data = [_chinaboat_dict(r) for r in results]
+
+        return jsonify({"count": len(data), "data": data, "next_cursor": next_cursor})
 
     except Exception as e:
         abort(500, description=str(e))
@@ -285,53 +426,21 @@ def get_all_chinaboats():
 # =========================================
 # API: chinaboat/latest（每艘船3天內最新一筆）
 # =========================================
-
-from sqlalchemy import func, and_
-
 @api_blueprint.route("/chinaboat/latest", methods=["GET"])
 def get_latest_chinaboats():
     try:
         # ⭐ 只看最近 3 天內的資料
         cutoff = datetime.utcnow() - timedelta(days=3)
 
-        # 子查詢：每艘船在「最近三天內」的最新時間
-        subquery = (
-            ChinaBoatSession.query(
-                ChinaBoatAIS.ship_id,
-                func.max(ChinaBoatAIS.timestamp).label("latest_ts")
-            )
-            .filter(ChinaBoatAIS.timestamp >= cutoff)  # 只抓三天內
-            .group_by(ChinaBoatAIS.ship_id)
-            .subquery()
-        )
-
-        # 主查詢：拿到每艘船「最新那一筆完整紀錄」
+        # ship_latest 表每艘船只有一筆（由 fetcher 與歷史同一個 transaction 寫入）
         results = (
-            ChinaBoatSession.query(ChinaBoatAIS)
-            .join(
-                subquery,
-                and_(
-                    ChinaBoatAIS.ship_id == subquery.c.ship_id,
-                    ChinaBoatAIS.timestamp == subquery.c.latest_ts
-                )
-            )
-            .order_by(ChinaBoatAIS.timestamp.desc())
+            ChinaBoatSession.query(ChinaBoatLatestAIS)
+            .filter(ChinaBoatLatestAIS.timestamp >= cutoff)
+            .order_by(ChinaBoatLatestAIS.timestamp.desc())
             .all()
         )
 
-        data = [
-            {
-                "ship_id": r.ship_id,
-                "shipname": r.shipname,
-                "lat": r.lat,
-                "lon": r.lon,
-                "speed": r.speed,
-                "course": r.course,
-                "shiptype": r.shiptype,
-                "timestamp": r.timestamp.strftime("%Y-%m-%d %H:%M:%S") if r.timestamp else None
-            }
-            for r in results
-        ]
+        data = [_chinaboat_dict(r) for r in results]
 
         return jsonify({"count": len(data), "data": data})
 
@@ -339,5 +448,234 @@ def get_latest_chinaboats():
         abort(500, description=str(e))
 
 
+# =========================================
+# API: chinaboat/density（中國籍船舶活動密度網格，見 density.py）
+# =========================================
+@api_blueprint.route("/chinaboat/density", methods=["GET"])
+def get_chinaboat_density():
+    # 時間窗：start + end，或 hours（最近 N 小時，預設 24）
+    # resolution：網格大小（度，0.01–5，預設 0.1）
+    # min_lat / max_lat / min_lon / max_lon：只回傳範圍內的格子（統計仍以整個時間窗計算並快取）
+    try:
+        resolution = float(request.args.get("resolution", 0.1))
+        if not 0.01 <= resolution <= 5:
+            raise ValueError(f"resolution 需介於 0.01–5 度: {resolution}")
+
+        if request.args.get("start") and request.args.get("end"):
+            start = _utc_naive(parser.parse(request.args["start"]))
+            end = _utc_naive(parser.parse(request.args["end"]))
+            open_window = False
+        else:
+            hours = float(request.args.get("hours", 24))
+            if not 0 < hours <= 24 * 90:
+                raise ValueError(f"hours 需介於 0–2160: {hours}")
+            end = datetime.utcnow()
+            start = end - timedelta(hours=hours)
+            open_window = True
+
+        bbox = [request.args.get(k) for k in ("min_lat", "max_lat", "min_lon", "max_lon")]
+        bbox = [float(v) if v else None for v in bbox]
+    except (ValueError, OverflowError) as e:
+        abort(400, description=str(e))
+
+    try:
+        result, cached = density_grid(
+            ChinaBoatSession, history_models(ChinaBoatAIS, start, end), start, end, resolution, open_window
+        )
+
+        min_lat, max_lat, min_lon, max_lon = bbox
+        cells = [
+            c for c in result["cells"]
+            if (min_lat is None or c["lat"] + resolution >= min_lat)
+            and (max_lat is None or c["lat"] <= max_lat)
+            and (min_lon is None or c["lon"] + resolution >= min_lon)
+            and (max_lon is None or c["lon"] <= max_lon)
+        ]
+
+        # total_points / total_vessels 為整個時間窗（不受經緯度範圍影響）
+        return jsonify({
+            "start": result["start"].strftime("%Y-%m-%d %H:%M:%S"),
+            "end": result["end"].strftime("%Y-%m-%d %H:%M:%S"),
+            "resolution": resolution,
+            "total_points": result["points"],
+            "total_vessels": result["vessels"],
+            "count": len(cells),
+            "cells": cells,
+            "cached": cached,
+        })
+    except Exception as e:
+        abort(500, description=str(e))
+
+
+# =========================================
+# API: track/<ship_id>（單船軌跡，見 trackstore.py）
+# =========================================
+def _track_history(ship_id, start=None, end=None, before=None):
+    """軌跡庫沒有的部分改查歷史表：[(timestamp, lat, lon, speed, course)]，由舊到新"""
+    if before is not None:
+        end = min(end, before - timedelta(microseconds=1)) if end else before - timedelta(microseconds=1)
+
+    rows = []
+    for Model in reversed(history_models(ShipAIS, start, end)):
+        if isinstance(Model, ArchivedPartition):
+            found = Model.query(ship_id=ship_id, time_range=(start, end)).fetch(None, None)[::-1]
+            rows += [(r.timestamp, r.lat, r.lon, r.speed, r.course) for r in found]
+            continue
+        query = Model.query.with_entities(
+            Model.timestamp, Model.lat, Model.lon, Model.speed, Model.course
+        ).filter(Model.ship_id == ship_id, Model.timestamp.isnot(None))
+        if start:
+            query = query.filter(Model.timestamp >= start)
+        if end:
+            query = query.filter(Model.timestamp <= end)
+        rows += [tuple(r) for r in query.order_by(Model.timestamp, Model.id).all()]
+    return rows
+
+
+@api_blueprint.route("/track/<ship_id>", methods=["GET"])
+def get_ship_track(ship_id):
+    # start / end：時間區間（未指定為全部）
+    # 回傳欄位式：columns.t 為 epoch 秒，其餘為 lat / lon / speed / course，依時間由舊到新
+    # 軌跡庫只涵蓋啟用後的資料（重建過則為全部），更早的部分與不在軌跡庫的船改查歷史表
+    try:
+        start = _utc_naive(parser.parse(request.args["start"])) if request.args.get("start") else None
+        end = _utc_naive(parser.parse(request.args["end"])) if request.args.get("end") else None
+    except (ValueError, OverflowError) as e:
+        abort(400, description=str(e))
+
+    try:
+        since, block = None, None
+        if TRACK_STORE != "none":
+            since, block = track_store.track(
+                ship_id, _epoch(start) if start else None, _epoch(end) if end else None
+            )
 
+        columns = {name: [] for name in TRACK_FIELDS}
+        sources = []
+        if block is None or (since and (start is None or _epoch(start) < since)):
+            before = datetime.utcfromtimestamp(since) if block is not None else None
+            for ts, *values in _track_history(ship_id, start, end, before):
+                columns["t"].append(_epoch(ts))
+                for name, value in zip(TRACK_FIELDS[1:], values):
+                    columns[name].append(value)
+            sources.append("history")
+
+        if block is not None:
+            for name in TRACK_FIELDS:
+                values = block[name].tolist()
+                columns[name] += values if name == "t" else [None if v != v else v for v in values]
+            sources.append("store")
 
+        return jsonify({
+            "ship_id": ship_id,
+            "count": len(columns["t"]),
+            "source": "+".join(sources),
+            "columns": columns,
+        })
+    except Exception as e:
+        abort(500, description=str(e))
+
+
+# =========================================
+# API: stats（海警船 12nm / 12–24nm / 自訂警戒區每小時彙總，見 rollups.py）
+# =========================================
+@api_blueprint.route("/stats", methods=["GET"])
+def get_stats():
+    # 時間區間：start + end，或 days（最近 N 天，預設 7）
+    # interval：series 的時間單位 hour / day（預設 day）；ship_id：只看單艘船
+    try:
+        if request.args.get("start") and request.args.get("end"):
+            start = _utc_naive(parser.parse(request.args["start"]))
+            end = _utc_naive(parser.parse(request.args["end"]))
+        else:
+            days = float(request.args.get("days", 7))
+            if not 0 < days <= 3660:
+                raise ValueError(f"days 需介於 0–3660: {days}")
+            end = datetime.utcnow()
+            start = end - timedelta(days=days)
+        interval = request.args.get("interval", "day")
+        if interval not in ("hour", "day"):
+            raise ValueError(f"interval 需為 hour / day: {interval}")
+    except (ValueError, OverflowError) as e:
+        abort(400, description=str(e))
+
+    try:
+        result = rollup_stats(start, end, interval, request.args.get("ship_id"))
+        return jsonify({
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "interval": interval,
+            **result,
+        })
+    except Exception as e:
+        abort(500, description=str(e))
+
+
+# =========================================
+# API: ships/suggest（船名自動完成）
+# =========================================
+@api_blueprint.route("/ships/suggest", methods=["GET"])
+def suggest_shipnames():
+    # q：輸入中的船名片段；scope=chinaboat 只找中國籍船；limit 最多 50
+    q = (request.args.get("q") or "").strip()
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        abort(400, description=f"無效的 limit: {request.args.get('limit')}")
+
+    if not q:
+        return jsonify({"query": q, "suggestions": []})
+
+    try:
+        Model = ChinaBoatAIS if request.args.get("scope") == "chinaboat" else ShipAIS
+        NameModel, condition = _name_condition(Model, f"%{q}%")
+
+        # 開頭相符的排前面，其次是較短的名稱
+        rows = (
+            session_for(NameModel).query(NameModel.ship_id, NameModel.shipname)
+            .filter(condition)
+            .order_by(
+                NameModel.shipname.ilike(f"{q}%").desc(),
+                func.length(NameModel.shipname),
+                NameModel.shipname,
+            )
+            .limit(limit)
+            .all()
+        )
+        return jsonify({
+            "query": q,
+            "suggestions": [{"ship_id": r.ship_id, "shipname": r.shipname} for r in rows]
+        })
+    except Exception as e:
+        abort(500, description=str(e))
+
+
+# =========================================
+# API: stream（Server-Sent Events，每輪抓取完成後推播）
+# =========================================
+@api_blueprint.route("/stream", methods=["GET"])
+def stream_events():
+    q = broadcaster.subscribe()
+
+    def generate():
+        try:
+            # 建議瀏覽器斷線 5 秒後重連
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = q.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    # 沒有事件時定期送註解行，避免 proxy 斷線
+                    yield ": keepalive\n\n"
+                    continue
+                if message is CLOSED:
+                    # 佇列曾滿而被移除：結束回應，瀏覽器依 retry 重連並重新訂閱
+                    return
+                yield message
+        finally:
+            broadcaster.unsubscribe(q)
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
@@ -2,6 +2,10 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from fetcher import fetch_data
 from flask import Flask
 
+from config import ARCHIVE_AFTER_DAYS
+from models import ShipAIS, ChinaBoatAIS
+from partitions import PARTITIONED, archive_closed
+
 # =========================================
 # 建立 Scheduler
 # =========================================
@@ -17,5 +21,18 @@ def init_scheduler(app: Flask):
 
     # 每 10 分鐘抓一次
     scheduler.add_job(func=scheduled_fetch, trigger="interval", minutes=10)
+
+    # 每天封存一次已結束的歷史分區（與 API 同一個程序，分區狀態不必重新載入）
+    if PARTITIONED and ARCHIVE_AFTER_DAYS > 0:
+        def scheduled_archive():
+            with app.app_context():
+                for Model in (ShipAIS, ChinaBoatAIS):
+                    try:
+                        archive_closed(Model)
+                    except Exception as e:
+                        print(f"⚠️ 歷史分區封存失敗（{Model.__tablename__}）: {e}")
+
+        scheduler.add_job(func=scheduled_archive, trigger="cron", hour=0, minute=30)
+
     scheduler.start()
     print("[Scheduler] 啟動成功，每 10 分鐘抓一次資料。")
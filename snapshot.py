@@ -0,0 +1,130 @@
+# snapshot.py
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+
+from config import FLEET_SNAPSHOT_MAX_AGE
+from models import (
+    CCGShipAIS, CCGCheck12ShipAIS, CCGCheck24ShipAIS,
+    CCGSession, CCGCheck12Session, CCGCheck24Session,
+)
+
+
+# =========================================
+# CCG 即時狀態快照
+# =========================================
+# fetch_data 每輪 commit 後呼叫 publish_fleet_snapshot()，
+# 把 /api/ccg_data、/api/ccg_check12_data、/api/ccg_check24_data 的回應先序列化好，
+# API 直接回傳同一份 bytes（附 strong ETag，If-None-Match 相同時回 304）
+#
+# 快照不可變，每輪換一個新物件；超過有效期限（或伺服器剛啟動還沒有快照）時 API 改回查 DB
+# ETag 只由序列化後的內容計算；船隊內容與上一輪相同時沿用上一輪的 payload（含 timestamp），
+# bytes 與 ETag 都不變，client 才拿得到 304
+
+# check12 / check24 只回傳最近 20 分鐘內的船
+CCG_CHECK_WINDOW = timedelta(minutes=20)
+
+FLEET_SOURCES = {
+    "ccg": (CCGSession, CCGShipAIS, None),
+    "ccg_check12": (CCGCheck12Session, CCGCheck12ShipAIS, CCG_CHECK_WINDOW),
+    "ccg_check24": (CCGCheck24Session, CCGCheck24ShipAIS, CCG_CHECK_WINDOW),
+}
+
+
+def _boat_dict(r):
+    return {
+        "ship_id": r.ship_id,
+        "shipname": r.shipname,
+        "lat": r.lat,
+        "lon": r.lon,
+        "timestamp": r.timestamp.isoformat() if r.timestamp else None
+    }
+
+
+def build_fleet_payload(name, now):
+    """
+    從 DB 讀取並組出 API 回應內容
+    回傳 (payload, 有效期限)；有時間窗的表格在最舊那艘船超出時間窗時失效
+    """
+    session, Model, window = FLEET_SOURCES[name]
+    expires_at = now + timedelta(seconds=FLEET_SNAPSHOT_MAX_AGE)
+
+    if window is None:
+        rows = session.query(Model).all()
+        return {"timestamp": now.isoformat(), "boats": [_boat_dict(r) for r in rows]}, expires_at
+
+    # 先照時間由新到舊排，同一艘船只留最新一筆
+    rows = (
+        session.query(Model)
+        .filter(Model.timestamp >= now - window)
+        .order_by(Model.timestamp.desc())
+        .all()
+    )
+    latest_by_ship = {}
+    for r in rows:
+        latest_by_ship.setdefault(r.ship_id, r)
+
+    if latest_by_ship:
+        oldest = min(r.timestamp for r in latest_by_ship.values())
+        expires_at = min(expires_at, oldest + window)
+
+    boats = [_boat_dict(r) for r in latest_by_ship.values()]
+    return {"timestamp": now.isoformat(), "count": len(boats), "boats": boats}, expires_at
+
+
+def _content(payload):
+    """比對用：payload 去掉每輪都會變的 timestamp"""
+    return {k: v for k, v in payload.items() if k != "timestamp"}
+
+
+class FleetSnapshot:
+    """一輪抓取後的 CCG 狀態（已序列化），建立後不再修改"""
+
+    def __init__(self, version, created_at, payloads, previous=None):
+        self.version = version
+        self.created_at = created_at
+        self.payloads = {}
+        self._entries = {}
+        for name, (payload, expires_at) in payloads.items():
+            prev = previous.payloads.get(name) if previous else None
+            if prev is not None and _content(prev) == _content(payload):
+                payload = prev
+            self.payloads[name] = payload
+            body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self._entries[name] = (body, hashlib.sha1(body).hexdigest()[:16], expires_at)
+
+    def get(self, name, now):
+        """回傳 (body, etag)；已過期回傳 None"""
+        body, etag, expires_at = self._entries[name]
+        if now >= expires_at:
+            return None
+        return body, etag
+
+
+_lock = threading.Lock()
+_current = None
+
+
+def publish_fleet_snapshot(now=None):
+    """DB commit 成功後呼叫，建立並換上新的快照"""
+    global _current
+    now = now or datetime.utcnow()
+
+    payloads = {name: build_fleet_payload(name, now) for name in FLEET_SOURCES}
+    # 只讀取，結束 read transaction
+    for session, _, _ in FLEET_SOURCES.values():
+        session.rollback()
+
+    with _lock:
+        version = (_current.version + 1) if _current else 1
+        _current = FleetSnapshot(version, now, payloads, previous=_current)
+    return _current
+
+
+def fleet_snapshot_entry(name, now=None):
+    """API 用：取得目前快照中的 (body, etag)；沒有可用快照回傳 None"""
+    snapshot = _current
+    if snapshot is None:
+        return None
+    return snapshot.get(name, now or datetime.utcnow())
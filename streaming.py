@@ -0,0 +1,98 @@
+# streaming.py
+from flask import Response, current_app, stream_with_context
+
+from config import API_STREAM_CHUNK
+from pagination import paginate_partitions, CursorError
+
+
+# =========================================
+# 歷史查詢串流輸出
+# =========================================
+# ?stream=1          → JSON：{"data": [...], "count": N, "next_cursor": ...}，邊讀邊送
+# ?format=ndjson     → 每行一筆 JSON（或 Accept: application/x-ndjson）
+#                      指定 limit 且還有下一頁時，最後一行為 {"next_cursor": "..."}
+#
+# 以 keyset 分頁每次讀 API_STREAM_CHUNK 筆，讀完一批就結束該次 read transaction，
+# 記憶體只保留一批資料，慢速的 client 也不會長時間佔住 SQLite 的讀取鎖
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def stream_format(request):
+    """回傳 "json" / "ndjson"，非串流請求回傳 None"""
+    if request.args.get("format") == "ndjson":
+        return "ndjson"
+    if request.args.get("stream") in ("1", "true"):
+        return "json"
+    if request.accept_mimetypes.best == NDJSON_MIMETYPE:
+        return "ndjson"
+    return None
+
+
+def stream_limit(value):
+    """串流模式的 limit：未指定表示全部"""
+    if value in (None, ""):
+        return None
+    try:
+        return max(1, int(value))
+    except ValueError:
+        raise CursorError(f"無效的 limit: {value}")
+
+
+def _iter_rows(session, parts, serialize, cursor, limit, reduce=None, bucket=None):
+    """逐批讀取，yield (本批資料 dict, next_cursor)"""
+    remaining = limit
+    while True:
+        size = API_STREAM_CHUNK if remaining is None else min(API_STREAM_CHUNK, remaining)
+        rows, cursor = paginate_partitions(parts, cursor, size, bucket)
+        fetched = len(rows)
+        if reduce:
+            rows = reduce(rows)
+        rows = [serialize(r) for r in rows]
+        # 轉成 dict 後就結束 transaction，釋放讀取鎖（rollback 會讓 ORM 物件失效，需在之後）
+        session.rollback()
+        yield rows, cursor
+
+        if remaining is not None:
+            remaining -= fetched
+        if cursor is None or remaining == 0:
+            return
+
+
+def stream_rows(session, parts, serialize, fmt, cursor=None, limit=None, reduce=None, bucket=None):
+    """
+    parts：[(已套用篩選條件的查詢, Model), ...]（見 pagination.paginate_partitions），
+           依 (timestamp, id) 由新到舊輸出
+    serialize：ORM 物件 → dict
+    reduce：每批資料序列化前的軌跡簡化（見 downsample.py），limit 以簡化前的筆數計
+    bucket：跨分區的 bucket 降採樣（見 paginate_partitions）
+    """
+    dumps = current_app.json.dumps
+
+    def generate_ndjson():
+        next_cursor = None
+        for rows, next_cursor in _iter_rows(session, parts, serialize, cursor, limit, reduce, bucket):
+            yield "".join(dumps(r) + "\n" for r in rows)
+        if next_cursor:
+            yield dumps({"next_cursor": next_cursor}) + "\n"
+
+    def generate_json():
+        count = 0
+        next_cursor = None
+        yield '{"data": ['
+        for rows, next_cursor in _iter_rows(session, parts, serialize, cursor, limit, reduce, bucket):
+            if rows:
+                yield ("," if count else "") + ",".join(dumps(r) for r in rows)
+            count += len(rows)
+        yield f'], "count": {count}, "next_cursor": {dumps(next_cursor)}}}'
+
+    def guarded(gen):
+        # 開始輸出後無法再改 HTTP 狀態碼，發生錯誤只能記錄並中斷
+        try:
+            yield from gen()
+        except Exception as e:
+            print(f"⚠️ 串流輸出中斷: {e}")
+            session.rollback()
+
+    if fmt == "ndjson":
+        return Response(stream_with_context(guarded(generate_ndjson)), mimetype=NDJSON_MIMETYPE)
+    return Response(stream_with_context(guarded(generate_json)), mimetype="application/json")
@@ -0,0 +1,10 @@
+# tests/conftest.py
+import os
+import sys
+
+# 專案模組都在根目錄（非套件），讓測試可以直接 import
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# routes 匯入時會註冊 LINE webhook handler，測試環境沒有設定時給假的值
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("LINE_ACCESS_TOKEN", "test")
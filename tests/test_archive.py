@@ -0,0 +1,114 @@
+# tests/test_archive.py
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert, inspect
+from sqlalchemy.orm import sessionmaker
+
+import archive
+import partitions
+import vessels
+from archive import ArchivedPartition
+from models import ChinaBoatAIS, VESSEL_MODELS
+from pagination import paginate_partitions
+
+T0 = datetime(2025, 1, 1, 10)
+BASE = ChinaBoatAIS.__tablename__
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """暫存 SQLite 上的 chinaboat 歷史表（每日分區），封存檔寫到 tmp_path"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'chinaboat.db'}")
+    ChinaBoatAIS.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(partitions, "session_for", lambda Model: session)
+    monkeypatch.setattr(vessels, "session_for", lambda Model: session)
+    monkeypatch.setattr(vessels, "_versions", OrderedDict())
+    monkeypatch.setattr(partitions, "PARTITIONED", True)
+    monkeypatch.setattr(partitions, "HISTORY_RETENTION_DAYS", 0)
+    monkeypatch.setattr(partitions, "_states", {})
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(archive, "_columns", OrderedDict())
+    yield engine
+    session.close()
+    engine.dispose()
+
+
+def _write_day(engine, day):
+    """每天 3 個時間點 × 2 艘船；同一時間點的兩筆只能靠 id 排序"""
+    Model = partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(days=day))
+    vessel_table = VESSEL_MODELS[ChinaBoatAIS].__table__
+    with engine.begin() as conn:
+        vessel_ids = [
+            conn.execute(insert(vessel_table).values(ship_id=str(i), shipname=f"HAI XUN {i:02d}")).inserted_primary_key[0]
+            for i in range(2)
+        ]
+        conn.execute(insert(Model.__table__), [
+            {"timestamp": T0 + timedelta(days=day, minutes=10 * k), "ship_id": str(i),
+             "vessel_id": vessel_ids[i], "lat": 24.0 + k / 10, "lon": 121.0, "speed": None}
+            for k in range(3) for i in range(2)
+        ])
+    return Model
+
+
+def _all_pages(parts, limit):
+    rows, cursor, pages = [], None, 0
+    while True:
+        page, cursor = paginate_partitions(parts, cursor, limit)
+        rows += page
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+def test_archive_round_trip_with_cursor(engine):
+    first = _write_day(engine, 0)
+    second = _write_day(engine, 1)
+    with engine.connect() as conn:
+        expected = conn.exec_driver_sql(f"SELECT id, timestamp FROM {first.__tablename__} ORDER BY id").all()
+
+    # 1/1 的分區結束於 1/2 00:00：寫成封存檔後 DROP
+    assert partitions.archive_partitions(engine, ChinaBoatAIS, T0 + timedelta(days=1)) == 1
+    assert f"{BASE}_p20250101" not in inspect(engine).get_table_names()
+    live, archived = partitions.history_models(ChinaBoatAIS)
+    assert live is second and isinstance(archived, ArchivedPartition)
+    assert archived.max_id() == 6
+
+    # 分區表與封存檔串接分頁：每頁 4 筆，cursor 跨越兩者（第 2 頁由分區表接到封存檔）
+    session = partitions.session_for(second)
+    parts = [(session.query(second), second), (archived.query(), archived)]
+    rows, pages = _all_pages(parts, 4)
+    assert pages == 3
+    assert [r.id for r in rows] == list(range(12, 0, -1))
+    assert [(r.id, r.timestamp.strftime(partitions._DB_TIME_FORMAT)) for r in rows[6:]] == expected[::-1]
+
+    # 靜態欄位：分區表由 hydrate 填回，封存檔寫檔時已補回；NULL 數值讀回 None
+    assert {r.shipname for r in rows} == {"HAI XUN 00", "HAI XUN 01"}
+    assert all(r.shipname == f"HAI XUN {int(r.ship_id):02d}" for r in rows)
+    assert all(r.speed is None for r in rows[6:])
+    assert rows[6].to_dict()["lat"] == pytest.approx(24.2)
+
+
+def test_archive_query_filters(engine):
+    _write_day(engine, 0)
+    partitions.archive_partitions(engine, ChinaBoatAIS, T0 + timedelta(days=1))
+    (archived,) = partitions.history_models(ChinaBoatAIS)
+
+    # 同一時間點兩艘船：cursor 落在兩者之間時只回傳 id 較小的一筆
+    page, cursor = paginate_partitions([(archived.query(), archived)], None, 1)
+    assert (page[0].id, page[0].ship_id) == (6, "1")
+    page, _ = paginate_partitions([(archived.query(), archived)], cursor, 1)
+    assert (page[0].id, page[0].ship_id, page[0].timestamp) == (5, "0", T0 + timedelta(minutes=20))
+
+    by_name = archived.query(shipname="xun 01").fetch(None, 10)
+    assert [r.id for r in by_name] == [6, 4, 2]
+    in_window = archived.query(ship_id="0", time_range=(T0 + timedelta(minutes=5), T0 + timedelta(minutes=20)))
+    assert [r.id for r in in_window.fetch(None, 10)] == [5, 3]
+    assert [r.id for r in archived.query(lat_range=(24.15, 25)).fetch(None, 10)] == [6, 5]
+
+    # 字串欄位以字典編碼儲存
+    with np.load(archived.path) as npz:
+        assert list(npz["ship_id.dict"]) == ["0", "1"]
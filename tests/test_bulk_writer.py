@@ -0,0 +1,84 @@
+# tests/test_bulk_writer.py
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import bulk_writer
+from bulk_writer import BulkWriter
+from models import ShipHourRollup
+from rollups import SHIP_KEYS, SHIP_COUNTERS
+
+HOUR = datetime(2025, 1, 1, 8)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """暫存 SQLite 上的每小時彙總表，bulk_writer.session_for 一律回傳這個 session"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    ShipHourRollup.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(bulk_writer, "session_for", lambda Model: session)
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _row(ship_id, minute, shipname="HAI XUN 06", in_12nm=False, hour=HOUR):
+    seen = hour + timedelta(minutes=minute)
+    return {
+        "hour": hour, "ship_id": ship_id, "shipname": shipname, "first_seen": seen, "last_seen": seen,
+        "samples": 1, "samples_12nm": int(in_12nm), "samples_24nm": 0,
+    }
+
+
+def _accumulate(writer, *rows):
+    for row in rows:
+        writer.accumulate(ShipHourRollup, row, SHIP_KEYS, SHIP_COUNTERS)
+
+
+def _stored(session):
+    return session.execute(text(
+        "SELECT ship_id, hour, shipname, samples, samples_12nm, first_seen, last_seen "
+        f"FROM {ShipHourRollup.__tablename__} ORDER BY ship_id, hour"
+    )).all()
+
+
+def test_accumulate_merges_rows_with_same_keys():
+    writer = BulkWriter()
+    _accumulate(writer,
+                _row("1", 30),
+                _row("1", 10, shipname="HAI XUN 6", in_12nm=True),
+                _row("2", 20),
+                _row("1", 0, hour=HOUR + timedelta(hours=1)))
+    assert len(writer) == 3
+
+    _, by_key = writer.accumulated[ShipHourRollup]
+    merged = by_key[HOUR, "1"]
+    # 計數相加、first_seen 取最早、last_seen 取最晚，其餘欄位以後加入的為準
+    assert (merged["samples"], merged["samples_12nm"], merged["samples_24nm"]) == (2, 1, 0)
+    assert merged["first_seen"] == HOUR + timedelta(minutes=10)
+    assert merged["last_seen"] == HOUR + timedelta(minutes=30)
+    assert merged["shipname"] == "HAI XUN 6"
+    assert by_key[HOUR, "2"]["samples"] == 1
+
+
+def test_flush_adds_to_existing_rows(session):
+    writer = BulkWriter()
+    _accumulate(writer, _row("1", 10), _row("1", 20, in_12nm=True))
+    assert writer.flush() == {"ShipHourRollup": 1}
+
+    # 下一輪：同一個 (hour, ship_id) 在 DB 中累加
+    _accumulate(writer, _row("1", 5, shipname="HAI XUN 6"), _row("2", 40))
+    writer.flush()
+    session.commit()
+
+    fmt = "%Y-%m-%d %H:%M:%S.%f"
+    assert _stored(session) == [
+        ("1", HOUR.strftime(fmt), "HAI XUN 6", 3, 1,
+         (HOUR + timedelta(minutes=5)).strftime(fmt), (HOUR + timedelta(minutes=20)).strftime(fmt)),
+        ("2", HOUR.strftime(fmt), "HAI XUN 06", 1, 0,
+         (HOUR + timedelta(minutes=40)).strftime(fmt), (HOUR + timedelta(minutes=40)).strftime(fmt)),
+    ]
+    assert len(writer) == 0
@@ -0,0 +1,85 @@
+# tests/test_change_filter.py
+from change_filter import ChangeFilter
+
+
+def _row(ship_id="301", lat=24.0, lon=121.0, speed=0.0, course=0.0, shipname="OLD NAME", **extra):
+    return {"ship_id": ship_id, "lat": lat, "lon": lon, "speed": speed, "course": course,
+            "shipname": shipname, **extra}
+
+
+def _filter(**kwargs):
+    kwargs.setdefault("keepalive", 3)
+    return ChangeFilter(pos_tol=0.0001, speed_tol=0.1, course_tol=1,
+                        static_columns=("shipname", "destination"), **kwargs)
+
+
+def _cycle(f, *rows):
+    result = [f.should_write(r) for r in rows]
+    f.commit()
+    return result
+
+
+def test_unchanged_ship_is_skipped():
+    f = _filter()
+    assert _cycle(f, _row()) == [True]
+    assert _cycle(f, _row(lat=24.00005, course=359.5)) == [False]
+
+
+def test_movement_is_written():
+    f = _filter()
+    _cycle(f, _row())
+    assert _cycle(f, _row(lat=24.001)) == [True]
+    assert _cycle(f, _row(lat=24.001, speed=1.0)) == [True]
+    assert _cycle(f, _row(lat=24.001, speed=1.0, course=10)) == [True]
+
+
+def test_static_change_is_written():
+    """停著不動的船改名，歷史仍要寫一筆新名字"""
+    f = _filter()
+    _cycle(f, _row())
+    assert _cycle(f, _row(shipname="RENAMED")) == [True]
+    assert _cycle(f, _row(shipname="RENAMED")) == [False]
+    assert _cycle(f, _row(shipname="RENAMED", destination="KEELUNG")) == [True]
+
+
+def test_keepalive_forces_write():
+    f = _filter(keepalive=3)
+    results = [_cycle(f, _row())[0] for _ in range(7)]
+    assert results == [True, False, False, True, False, False, True]
+
+
+def test_rollback_discards_pending():
+    f = _filter()
+    assert f.should_write(_row()) is True
+    f.rollback()
+    # 沒 commit 的寫入不算數，下一輪仍要寫
+    assert _cycle(f, _row()) == [True]
+    assert _cycle(f, _row()) == [False]
+
+
+def test_commit_returns_stats():
+    f = _filter()
+    _cycle(f, _row("1"), _row("2"))
+    f.should_write(_row("1"))
+    f.should_write(_row("2", lat=25.0))
+    assert f.commit() == {"written": 1, "skipped": 1, "evicted": 0}
+
+
+def test_unseen_ships_are_evicted():
+    f = _filter(evict_after=2)
+    _cycle(f, _row("1"), _row("2"))
+    _cycle(f, _row("1"))
+    assert set(f.last) == {"1", "2"}
+    _cycle(f, _row("1"))
+    assert set(f.last) == {"1"}
+    # 被移除的船再出現時直接寫入
+    assert _cycle(f, _row("2")) == [True]
+
+
+def test_ship_missing_one_cycle_is_not_rewritten():
+    """訊號斷續：keepalive=0 時缺席一輪的船不會被移除，再出現且沒變化仍略過"""
+    f = _filter(keepalive=0, evict_after=3)
+    assert _cycle(f, _row("1"), _row("2")) == [True, True]
+    _cycle(f, _row("1"))
+    assert _cycle(f, _row("1"), _row("2")) == [False, False]
+    assert set(f.last) == {"1", "2"}
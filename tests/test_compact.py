@@ -0,0 +1,49 @@
+# tests/test_compact.py
+import gzip
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import Flask
+
+from compact import COLUMNAR_MIMETYPE, columnar_format, columnar_response, encode_columns
+from models import ChinaBoatAIS
+
+T0 = datetime(2025, 1, 1, 10)
+
+
+def _row(minute, shipname, lat):
+    return SimpleNamespace(
+        timestamp=None if minute is None else T0.replace(minute=minute), shipname=shipname, lat=lat,
+    )
+
+
+def test_encode_columns():
+    rows = [_row(30, "HAI XUN 06", 24.1), _row(20, None, None), _row(None, "HAI XUN 06", 24.2), _row(10, "A", 24.3)]
+    columns = encode_columns(rows, ChinaBoatAIS, ["timestamp", "shipname", "lat"])
+    t = int((T0.replace(minute=30) - datetime(1970, 1, 1)).total_seconds())
+    # 第一筆為絕對值，其後為與前一個非 null 值的差；null 保留
+    assert columns["timestamp"] == {"delta": [t, -600, None, -600]}
+    assert columns["shipname"] == {"dict": ["HAI XUN 06", "A"], "index": [0, None, 0, 1]}
+    assert columns["lat"] == [24.1, None, 24.2, 24.3]
+
+
+def test_columnar_response_gzip():
+    app = Flask(__name__)
+    rows = [_row(i % 60, f"SHIP {i % 3}", 24.0 + i / 1000) for i in range(200)]
+
+    with app.test_request_context("/?format=columnar", headers={"Accept-Encoding": "gzip"}) as ctx:
+        assert columnar_format(ctx.request)
+        response = columnar_response(ctx.request, ChinaBoatAIS, rows, "next", ["timestamp", "shipname", "lat"])
+    assert response.mimetype == COLUMNAR_MIMETYPE
+    assert response.headers["Content-Encoding"] == "gzip"
+    payload = json.loads(gzip.decompress(response.get_data()))
+    assert (payload["format"], payload["count"], payload["next_cursor"]) == ("columnar", 200, "next")
+    assert payload["columns"]["shipname"]["dict"] == ["SHIP 0", "SHIP 1", "SHIP 2"]
+
+    # 太小或 client 不支援 gzip：不壓縮
+    with app.test_request_context("/", headers={"Accept": COLUMNAR_MIMETYPE}) as ctx:
+        assert columnar_format(ctx.request)
+        response = columnar_response(ctx.request, ChinaBoatAIS, rows[:2], None, ["lat"])
+    assert "Content-Encoding" not in response.headers
+    assert json.loads(response.get_data())["columns"] == {"lat": [24.0, 24.001]}
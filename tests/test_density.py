@@ -0,0 +1,66 @@
+# tests/test_density.py
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import density
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """以假的 _load_positions 記錄讀取次數，並清空快取狀態"""
+    calls = []
+
+    def fake_load(session, Models, start, end):
+        calls.append((start, end))
+        return np.array([0, 0, 1]), np.array([24.05, 24.15, 24.05]), np.array([121.05, 121.05, 121.05]), \
+            np.array([0, 600, 0])
+
+    monkeypatch.setattr(density, "_load_positions", fake_load)
+    monkeypatch.setattr(density, "_cache", density.OrderedDict())
+    monkeypatch.setattr(density, "_version", 0)
+    monkeypatch.setattr(density, "_committed_until", None)
+    return calls
+
+
+def test_aggregate_density():
+    ships = np.array([0, 0, 1])
+    cells = density.aggregate_density(
+        ships, np.array([24.05, 24.15, 24.05]), np.array([121.05, 121.05, 121.05]), np.array([0, 600, 0]), 0.1,
+    )
+    assert cells[0] == {"lat": 24.0, "lon": 121.0, "count": 2, "vessels": 2, "avg_dwell_minutes": 5.0}
+    assert cells[1]["count"] == 1 and cells[1]["lat"] == 24.1
+
+
+def test_window_past_wall_clock_is_not_closed_before_commit(loads):
+    """end 已過現在時間、但還沒有 commit 晚於 end 的一輪：本輪資料可能還沒寫入，不能一直快取"""
+    end = datetime.utcnow() - timedelta(minutes=1)
+    start = end - timedelta(hours=1)
+    density.notify_data_changed(end - timedelta(minutes=5))
+
+    density.density_grid(None, [], start, end, 0.1)
+    density.notify_data_changed(end - timedelta(seconds=1))   # 進行中的一輪 commit
+    _, cached = density.density_grid(None, [], start, end, 0.1)
+    assert not cached
+    assert len(loads) == 2
+
+
+def test_window_before_committed_cycle_stays_cached(loads):
+    end = datetime(2025, 1, 1, 12)
+    start = end - timedelta(hours=1)
+    density.notify_data_changed(end + timedelta(minutes=10))
+
+    density.density_grid(None, [], start, end, 0.1)
+    density.notify_data_changed(end + timedelta(minutes=20))
+    _, cached = density.density_grid(None, [], start, end, 0.1)
+    assert cached
+    assert len(loads) == 1
+
+
+def test_nothing_closed_before_first_commit(loads):
+    end = datetime(2025, 1, 1, 12)
+    density.density_grid(None, [], end - timedelta(hours=1), end, 0.1)
+    density.notify_data_changed()
+    _, cached = density.density_grid(None, [], end - timedelta(hours=1), end, 0.1)
+    assert not cached
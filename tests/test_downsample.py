@@ -0,0 +1,121 @@
+# tests/test_downsample.py
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, DateTime, Float, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from downsample import bucket_end, downsample_params, drop_bucket_duplicates, filter_buckets, simplify_tracks
+
+Base = declarative_base()
+T0 = datetime(2025, 1, 1)
+
+
+class Track(Base):
+    __tablename__ = "tracks"
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime)
+    ship_id = Column(String)
+    lat = Column(Float)
+    lon = Column(Float)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _latest_per_bucket(rows, bucket):
+    """參考實作：每個 (ship_id, bucket) 取 (timestamp, id) 最大的一筆"""
+    best = {}
+    for r in rows:
+        key = (r.ship_id, int((r.timestamp - T0).total_seconds()) // bucket)
+        if key not in best or (r.timestamp, r.id) > (best[key].timestamp, best[key].id):
+            best[key] = r
+    return sorted(r.id for r in best.values())
+
+
+def test_downsample_params():
+    assert downsample_params({}) == (None, None)
+    assert downsample_params({"tolerance": "0.01", "bucket": "600"}) == (0.01, 600)
+    for args in ({"bucket": "0"}, {"bucket": "x"}, {"tolerance": "-1"}, {"tolerance": "nan"}):
+        with pytest.raises(ValueError):
+            downsample_params(args)
+
+
+def test_bucket_end():
+    assert bucket_end(datetime(2025, 1, 1, 0, 59, 59), 3600) == datetime(2025, 1, 1, 1)
+    assert bucket_end(datetime(2025, 1, 1, 1), 3600) == datetime(2025, 1, 1, 2)
+    assert bucket_end(datetime(2025, 1, 1, 13), 86400) == datetime(2025, 1, 2)
+
+
+def test_filter_buckets_keeps_latest_per_ship(session):
+    rows = []
+    for i in range(40):
+        ts = T0 + timedelta(minutes=7 * i)
+        rows += [Track(id=2 * i + 1, timestamp=ts, ship_id="1", lat=24, lon=121),
+                 Track(id=2 * i + 2, timestamp=ts, ship_id="2", lat=25, lon=121)]
+    # 同一時間兩筆（id 較大的較新）
+    rows.append(Track(id=100, timestamp=T0, ship_id="1", lat=24, lon=121))
+    session.add_all(rows)
+    session.commit()
+
+    got = sorted(r.id for r in filter_buckets(session.query(Track), Track, 3600).all())
+    assert got == _latest_per_bucket(rows, 3600)
+
+
+def test_filter_buckets_respects_filters(session):
+    """被篩選條件排除的資料不能讓同一 bucket 裡符合條件的資料被略過"""
+    session.add_all([
+        Track(id=1, timestamp=T0, ship_id="1", lat=24, lon=121),
+        Track(id=2, timestamp=T0 + timedelta(minutes=10), ship_id="1", lat=30, lon=121),
+    ])
+    session.commit()
+    query = session.query(Track).filter(Track.lat < 25)
+    assert [r.id for r in filter_buckets(query, Track, 3600).all()] == [1]
+
+
+class _Part:
+    """paginate_partitions 的較新分區：只提供 probe"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def probe(self, ship_ids, before):
+        return [(r.ship_id, r.timestamp) for r in self.rows if r.ship_id in ship_ids and r.timestamp < before]
+
+
+def _row(ship_id, hours):
+    return SimpleNamespace(ship_id=ship_id, timestamp=T0 + timedelta(hours=hours))
+
+
+def test_drop_bucket_duplicates_across_partitions():
+    # 較新的分區從第 24 小時開始；bucket = 4 天，epoch 對齊後為 [2024-12-31, 2025-01-04)
+    newer = _Part([_row("1", 30), _row("3", 80)])
+    newer_model = SimpleNamespace(start=T0 + timedelta(hours=24))
+    older = [_row("1", 20), _row("2", 20), _row("3", 20), _row(None, 20)]
+
+    kept = drop_bucket_duplicates(older, [(newer, newer_model)], 4 * 86400)
+    # 1：同一 bucket 在較新分區已有資料 → 略過；3：較新分區的資料在下一個 bucket → 保留
+    assert [r.ship_id for r in kept] == ["2", "3", None]
+
+
+def test_drop_bucket_duplicates_skips_probe_inside_partition():
+    class NoProbe:
+        def probe(self, ship_ids, before):
+            raise AssertionError("bucket 沒有跨進較新分區，不應查詢")
+
+    newer_model = SimpleNamespace(start=T0 + timedelta(hours=24))
+    older = [_row("1", 5), _row("2", 10)]
+    assert drop_bucket_duplicates(older, [(NoProbe(), newer_model)], 3600) == older
+
+
+def test_simplify_tracks_keeps_endpoints():
+    rows = [SimpleNamespace(ship_id="1", lat=24.0, lon=121.0 + i * 0.01) for i in range(10)]
+    rows.append(SimpleNamespace(ship_id="2", lat=25.0, lon=121.0))
+    kept = simplify_tracks(rows, 0.001)
+    assert kept == [rows[0], rows[9], rows[10]]
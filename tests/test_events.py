@@ -0,0 +1,63 @@
+# tests/test_events.py
+import pytest
+from flask import Flask
+
+import events
+
+
+def _drain(q):
+    items = []
+    while not q.empty():
+        items.append(q.get_nowait())
+    return items
+
+
+def test_publish_reaches_subscribers_and_replays_last_event():
+    b = events.Broadcaster(queue_size=4)
+    q = b.subscribe()
+    # 還沒有任何一輪：第一個事件是 ready
+    assert _drain(q) == [events.READY]
+    assert b.publish("cycle", {"n": 1}) == 1
+    (message,) = _drain(q)
+    assert message.startswith("id: 1\nevent: cycle\n") and '"n":1' in message
+
+    # 新連線第一個事件是最近一次的 cycle（頁面以此做初始載入）
+    late = b.subscribe()
+    assert _drain(late) == [message]
+
+
+def test_slow_subscriber_is_closed_on_overflow():
+    b = events.Broadcaster(queue_size=2)
+    b.publish("cycle", {"n": 0})
+    slow = b.subscribe()
+    fast = b.subscribe()
+    b.publish("cycle", {"n": 1})
+    _drain(fast)
+
+    # 再一個事件放不進 slow 的佇列：slow 被移除，佇列只剩 CLOSED
+    assert b.publish("cycle", {"n": 2}) == 1
+    assert len(b) == 1
+    assert _drain(slow) == [events.CLOSED]
+    assert len(_drain(fast)) == 1
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from routes import api
+
+    b = events.Broadcaster(queue_size=1)
+    monkeypatch.setattr(api, "broadcaster", b)
+    app = Flask(__name__)
+    app.register_blueprint(api.api_blueprint, url_prefix="/api")
+    return app.test_client(), b
+
+
+def test_stream_ends_after_overflow(client):
+    """被移除的連線要結束回應，瀏覽器才會依 retry 重連（不能一直送 keepalive）"""
+    client, b = client
+    response = client.get("/api/stream", buffered=False)   # 佇列中已有 ready
+    b.publish("cycle", {"n": 1})     # 佇列滿 → 移除
+
+    chunks = [c.decode() if isinstance(c, bytes) else c for c in response.response]
+    assert chunks == ["retry: 5000\n\n"]
+    assert len(b) == 0
@@ -0,0 +1,59 @@
+# tests/test_geofence.py
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Point, Polygon, box
+from shapely.ops import nearest_points
+
+import config
+from geofence import BoundaryIndex, distance_to_12nm
+from utils import haversine_np
+
+
+def _reference(geom, lon, lat):
+    """逐點以 nearest_points 計算（BoundaryIndex 取代的原本做法）"""
+    point = Point(lon, lat)
+    q = nearest_points(geom.boundary, point)[0]
+    return q.x, q.y, float(haversine_np(lat, lon, q.y, q.x))
+
+
+def test_nearest_matches_nearest_points():
+    # 含內環（hole）的多邊形：環內的點最近的是內環邊界
+    ring = Polygon(box(120, 22, 122, 25).exterior.coords, [box(120.8, 23, 121.2, 24).exterior.coords])
+    index = BoundaryIndex([ring])
+
+    rng = np.random.default_rng(0)
+    lons = rng.uniform(119, 123, 200)
+    lats = rng.uniform(21, 26, 200)
+    lons[:2], lats[:2] = [120.9, 120.0], [23.5, 22.0]    # 內環中、外環頂點上
+
+    result = index.nearest(lons, lats)
+    for i in range(len(lons)):
+        lon, lat, km = _reference(ring, lons[i], lats[i])
+        assert result["lon"][i] == pytest.approx(lon)
+        assert result["lat"][i] == pytest.approx(lat)
+        assert result["distance_km"][i] == pytest.approx(km, abs=1e-9)
+    assert set(result["owner"]) == {0}
+    assert result["distance_km"][1] == 0
+
+
+def test_owner_and_empty_inputs():
+    index = BoundaryIndex([box(120, 22, 121, 23), None, box(122, 22, 123, 23)])
+    result = index.nearest([119.5, 122.9], [22.5, 22.5])
+    assert list(result["owner"]) == [0, 2]
+
+    assert len(index.nearest([], [])["distance_km"]) == 0
+    empty = BoundaryIndex([]).nearest([121.0], [23.0])
+    assert np.isnan(empty["distance_km"][0]) and empty["owner"][0] == -1
+
+
+def test_distance_to_12nm_boundary():
+    polygon = config.TAIWAN_12NM_POLYGON
+    if polygon is None:
+        pytest.skip("沒有 12nm 多邊形")
+    lons, lats = np.array([120.0, 122.3, 121.0]), np.array([23.0, 25.5, 21.5])
+    result = distance_to_12nm(lons, lats)
+    for i in range(len(lons)):
+        assert result["distance_km"][i] == pytest.approx(_reference(polygon, lons[i], lats[i])[2], abs=1e-9)
+    # 回傳的最近點在邊界上
+    assert shapely.distance(polygon.boundary, shapely.points(result["lon"], result["lat"])).max() < 1e-9
@@ -0,0 +1,67 @@
+# tests/test_geometry_cache.py
+import json
+import os
+
+import pytest
+import shapely
+from shapely.geometry import Point, mapping, shape
+
+from geometry_cache import load_cached_geometry
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "zone.geojson"
+    path.write_text(json.dumps(mapping(Point(121, 24).buffer(1, 64))))
+    return str(path)
+
+
+class Builder:
+    """記錄來源檔被解析了幾次"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        with open(path, encoding="utf-8") as f:
+            return shape(json.load(f)).buffer(0)
+
+
+def test_cache_is_reused_until_source_changes(source):
+    build = Builder()
+    first = load_cached_geometry(source, build, tolerances=(0.05,))
+    assert build.calls == 1
+    assert os.path.exists(f"{source}.wkb") and os.path.exists(f"{source}.tol0.05.wkb")
+
+    cached = load_cached_geometry(source, build, tolerances=(0.05,))
+    assert build.calls == 1
+    assert shapely.equals_exact(cached, first)
+
+    # 只有 mtime 改變（如 git checkout）：比對 sha256 後沿用快取
+    os.utime(source, (0, 0))
+    load_cached_geometry(source, build, tolerances=(0.05,))
+    assert build.calls == 1
+
+    # 內容改變：重新解析
+    with open(source, "w", encoding="utf-8") as f:
+        json.dump(mapping(Point(121, 24).buffer(2, 64)), f)
+    changed = load_cached_geometry(source, build, tolerances=(0.05,))
+    assert build.calls == 2
+    assert changed.area > first.area
+
+
+def test_simplified_variant(source):
+    build = Builder()
+    full = load_cached_geometry(source, build)
+    # 要求的容許值還沒有快取：重建並一併寫入簡化版本
+    simplified = load_cached_geometry(source, build, tolerance=0.05)
+    assert build.calls == 2
+    assert shapely.get_num_coordinates(simplified) < shapely.get_num_coordinates(full)
+    assert shapely.equals_exact(load_cached_geometry(source, build, tolerance=0.05), simplified)
+    assert build.calls == 2
+
+
+def test_missing_source_falls_back_to_build(tmp_path):
+    assert load_cached_geometry(str(tmp_path / "missing.geojson"), lambda path: None) is None
+    assert not os.listdir(tmp_path)
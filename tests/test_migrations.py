@@ -0,0 +1,175 @@
+# tests/test_migrations.py
+import pytest
+from sqlalchemy import create_engine, text
+
+from migrations import ensure_rtree
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE ais (id INTEGER PRIMARY KEY, timestamp DATETIME, ship_id TEXT, "
+            "shipname TEXT, lat FLOAT, lon FLOAT, vessel_id INTEGER)"
+        ))
+    yield engine
+    engine.dispose()
+
+
+def _rows(engine, sql, **params):
+    with engine.connect() as conn:
+        return conn.execute(text(sql), params).all()
+
+
+def _insert(engine, *rows):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO ais (id, timestamp, ship_id, shipname, lat, lon) "
+            "VALUES (:id, :timestamp, :ship_id, :shipname, :lat, :lon)"
+        ), [
+            {"id": i, "timestamp": ts, "ship_id": sid, "shipname": name, "lat": lat, "lon": lon}
+            for i, ts, sid, name, lat, lon in rows
+        ])
+
+
+# =========================================
+# R*Tree 空間索引
+# =========================================
+def _rtree_ids(engine, lat0, lat1, lon0, lon1):
+    return [r[0] for r in _rows(
+        engine,
+        "SELECT id FROM ais_rtree WHERE max_lat >= :lat0 AND min_lat <= :lat1 "
+        "AND max_lon >= :lon0 AND min_lon <= :lon1 ORDER BY id",
+        lat0=lat0, lat1=lat1, lon0=lon0, lon1=lon1,
+    )]
+
+
+def test_rtree_backfill_and_triggers(engine):
+    _insert(engine,
+            (1, "2025-01-01 00:00:00.000000", "1", "A", 24.0, 121.0),
+            (2, "2025-01-01 00:00:00.000000", "2", "B", 22.0, 119.0),
+            (3, "2025-01-01 00:00:00.000000", "3", "C", None, 121.0))
+    assert ensure_rtree(engine, "ais") is True
+    # 既有資料填入（座標為 NULL 的不納入）
+    assert _rtree_ids(engine, 20, 26, 118, 122) == [1, 2]
+
+    _insert(engine, (4, "2025-01-01 00:10:00.000000", "4", "D", 24.5, 121.5))
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE ais SET lat = 25.5 WHERE id = 1"))
+        conn.execute(text("UPDATE ais SET lat = 24.1 WHERE id = 3"))
+        conn.execute(text("DELETE FROM ais WHERE id = 2"))
+
+    assert _rtree_ids(engine, 23.9, 24.6, 120.9, 121.6) == [3, 4]
+    assert _rtree_ids(engine, 25.4, 25.6, 120.9, 121.1) == [1]
+    assert _rtree_ids(engine, 21, 23, 118, 120) == []
+
+
+def test_rtree_time_axis(engine):
+    _insert(engine, (1, "2025-01-01 00:00:00.000000", "1", "A", 24.0, 121.0))
+    ensure_rtree(engine, "ais")
+    (min_t, max_t), = _rows(engine, "SELECT min_t, max_t FROM ais_rtree")
+    assert min_t <= 1735689600 <= max_t
+
+
+def test_rtree_is_idempotent(engine):
+    _insert(engine, (1, "2025-01-01 00:00:00.000000", "1", "A", 24.0, 121.0))
+    assert ensure_rtree(engine, "ais")
+    assert ensure_rtree(engine, "ais")
+    assert _rows(engine, "SELECT COUNT(*) FROM ais_rtree")[0][0] == 1
+
+
+# =========================================
+# 船名全文索引（FTS5 trigram）
+# =========================================
+@pytest.fixture
+def names(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE names (id INTEGER PRIMARY KEY, ship_id TEXT, shipname TEXT, first_seen DATETIME, "
+            "UNIQUE (ship_id, shipname))"
+        ))
+        conn.execute(text(
+            "CREATE TABLE vessels (id INTEGER PRIMARY KEY, ship_id TEXT, shipname TEXT)"
+        ))
+    return engine
+
+
+def _search(engine, pattern):
+    return sorted(r[0] for r in _rows(
+        engine,
+        "SELECT n.shipname FROM names n WHERE n.id IN (SELECT rowid FROM names_fts WHERE shipname LIKE :p)",
+        p=pattern,
+    ))
+
+
+def test_name_index_backfills_from_history(names):
+    from migrations import ensure_name_index
+
+    _insert(names,
+            (1, "2025-01-01 00:00:00.000000", "1", "HAI XUN 06", 24.0, 121.0),
+            (2, "2025-01-01 00:10:00.000000", "1", "HAI XUN 06", 24.0, 121.0),
+            (3, "2025-01-01 00:20:00.000000", "2", "CHINACOASTGUARD 2501", 24.0, 121.0),
+            (4, "2025-01-01 00:30:00.000000", "3", "", 24.0, 121.0),
+            (5, "2025-01-01 00:40:00.000000", "4", None, 24.0, 121.0))
+    # 靜態欄位已正規化的資料：船名由 vessels 補上
+    with names.begin() as conn:
+        conn.execute(text("INSERT INTO vessels VALUES (7, '5', 'HAIJING 1301')"))
+        conn.execute(text("UPDATE ais SET vessel_id = 7 WHERE id = 5"))
+
+    if not ensure_name_index(names, "names", "ais", "vessels"):
+        pytest.skip("SQLite 未支援 FTS5 trigram")
+
+    assert _rows(names, "SELECT ship_id, shipname, first_seen FROM names ORDER BY ship_id") == [
+        ("1", "HAI XUN 06", "2025-01-01 00:00:00.000000"),
+        ("2", "CHINACOASTGUARD 2501", "2025-01-01 00:20:00.000000"),
+        ("4", "HAIJING 1301", "2025-01-01 00:40:00.000000"),
+    ]
+    # trigram：部分比對、不分大小寫
+    assert _search(names, "%xun%") == ["HAI XUN 06"]
+    assert _search(names, "%coastguard%") == ["CHINACOASTGUARD 2501"]
+    assert _search(names, "%HAI%") == ["HAI XUN 06", "HAIJING 1301"]
+
+
+def test_name_index_triggers(names):
+    from migrations import ensure_name_index
+
+    if not ensure_name_index(names, "names", "ais"):
+        pytest.skip("SQLite 未支援 FTS5 trigram")
+
+    with names.begin() as conn:
+        conn.execute(text("INSERT INTO names (ship_id, shipname) VALUES ('1', 'OLD NAME'), ('2', 'OTHER')"))
+    assert _search(names, "%old%") == ["OLD NAME"]
+
+    with names.begin() as conn:
+        conn.execute(text("UPDATE names SET shipname = 'NEW NAME' WHERE ship_id = '1'"))
+        conn.execute(text("DELETE FROM names WHERE ship_id = '2'"))
+    assert _search(names, "%old%") == []
+    assert _search(names, "%name%") == ["NEW NAME"]
+    assert _search(names, "%other%") == []
+
+
+# =========================================
+# <歷史表>_full VIEW（靜態欄位由 vessels 補回）
+# =========================================
+def test_vessel_view_fills_static_columns(names):
+    from migrations import ensure_vessel_view
+
+    _insert(names,
+            (1, "2025-01-01 00:00:00.000000", "1", "HAI XUN 06", 24.0, 121.0),
+            (2, "2025-01-01 00:10:00.000000", "2", None, 24.5, 121.5))
+    with names.begin() as conn:
+        conn.execute(text("INSERT INTO vessels VALUES (7, '2', 'HAIJING 1301')"))
+        conn.execute(text("UPDATE ais SET vessel_id = 7 WHERE id = 2"))
+
+    assert ensure_vessel_view(names, "ais", "vessels") == "ais_full"
+    assert _rows(names, "SELECT id, ship_id, shipname, lat, vessel_id FROM ais_full ORDER BY id") == [
+        (1, "1", "HAI XUN 06", 24.0, None),
+        (2, "2", "HAIJING 1301", 24.5, 7),
+    ]
+
+    # 重建後包含歷史表新增的欄位
+    with names.begin() as conn:
+        conn.execute(text("ALTER TABLE ais ADD COLUMN speed FLOAT"))
+    ensure_vessel_view(names, "ais", "vessels")
+    assert _rows(names, "SELECT id, speed FROM ais_full ORDER BY id") == [(1, None), (2, None)]
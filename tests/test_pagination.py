@@ -0,0 +1,83 @@
+# tests/test_pagination.py
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from config import API_PAGE_DEFAULT, API_PAGE_MAX
+from pagination import CursorError, _page, decode_cursor, encode_cursor, page_limit, paginate
+
+
+def test_cursor_round_trip():
+    ts = datetime(2025, 1, 2, 3, 4, 5, 678901)
+    cursor = encode_cursor(ts, 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (ts, 42)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not-base64!!",
+    encode_cursor(datetime(2025, 1, 1), 1)[:-3],   # 截斷
+    "WzFd",                                          # [1]：欄位數不對
+    "WyJ4eCIsIDFd",                                  # ["xx", 1]：時間格式錯誤
+    "WyIyMDI1LTAxLTAxIiwgIngiXQ",                    # ["2025-01-01", "x"]：id 不是整數
+])
+def test_invalid_cursor(cursor):
+    with pytest.raises(CursorError):
+        decode_cursor(cursor)
+
+
+def test_cursor_error_is_value_error():
+    # API 以 except ValueError 回傳 400
+    assert issubclass(CursorError, ValueError)
+
+
+def test_page_limit():
+    assert page_limit(None) == API_PAGE_DEFAULT
+    assert page_limit("") == API_PAGE_DEFAULT
+    assert page_limit("0") == 1
+    assert page_limit("5") == 5
+    assert page_limit(str(API_PAGE_MAX + 1)) == API_PAGE_MAX
+    with pytest.raises(CursorError):
+        page_limit("abc")
+
+
+def test_page_next_cursor():
+    rows = [SimpleNamespace(timestamp=datetime(2025, 1, 1, 0, 0, i), id=i) for i in range(3)]
+    assert _page(rows, 3) == (rows, None)
+    page, cursor = _page(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(cursor) == (rows[1].timestamp, 1)
+
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime)
+
+
+def test_paginate_walks_all_rows_once():
+    """同一個 timestamp 有多筆（同一輪）時，跨頁不重複、不遺漏"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(
+            Row(id=i + 1, timestamp=datetime(2025, 1, 1, i // 4)) for i in range(10)
+        )
+        session.add(Row(id=99, timestamp=None))
+        session.commit()
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = paginate(session.query(Row), Row, cursor=cursor, limit=3)
+            seen += [r.id for r in rows]
+            if cursor is None:
+                break
+
+    assert seen == [10, 9, 8, 7, 6, 5, 4, 3, 2, 1]
@@ -0,0 +1,101 @@
+# tests/test_partitions.py
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert, inspect
+from sqlalchemy.orm import sessionmaker
+
+import archive
+import partitions
+from models import ChinaBoatAIS
+
+T0 = datetime(2025, 1, 1, 10)
+BASE = ChinaBoatAIS.__tablename__
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """暫存 SQLite 上的 chinaboat 歷史表，啟用每日分區、保存 2 天"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'chinaboat.db'}", connect_args={"timeout": 0.1})
+    ChinaBoatAIS.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(partitions, "session_for", lambda Model: session)
+    monkeypatch.setattr(partitions, "PARTITIONED", True)
+    monkeypatch.setattr(partitions, "HISTORY_RETENTION_DAYS", 2)
+    monkeypatch.setattr(partitions, "_states", {})
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    yield engine
+    session.close()
+    engine.dispose()
+
+
+def _write(engine, Model, timestamp, n=2):
+    with engine.begin() as conn:
+        conn.execute(insert(Model.__table__), [
+            {"timestamp": timestamp, "ship_id": str(i), "lat": 24.0, "lon": 121.0} for i in range(n)
+        ])
+
+
+def _names(engine):
+    return sorted(inspect(engine).get_table_names() + inspect(engine).get_view_names())
+
+
+def test_rollover_creates_partitions_with_continuing_ids(engine):
+    first = partitions.ingest_model(ChinaBoatAIS, T0)
+    assert first.__tablename__ == f"{BASE}_p20250101"
+    _write(engine, first, T0)
+    assert partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(hours=1)) is first
+
+    second = partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(days=1))
+    _write(engine, second, T0 + timedelta(days=1))
+    assert {f"{BASE}_p20250101", f"{BASE}_p20250102", f"{BASE}_p20250102_full"} <= set(_names(engine))
+
+    # 新分區的 id 接在前一個分區之後
+    with engine.connect() as conn:
+        ids = [r[0] for r in conn.exec_driver_sql(f"SELECT id FROM {BASE}_p20250102")]
+    assert ids == [3, 4]
+
+    # 查詢依時間由新到舊，只回傳重疊的分區
+    assert partitions.history_models(ChinaBoatAIS) == [second, first]
+    assert partitions.history_models(ChinaBoatAIS, start=T0 + timedelta(days=1)) == [second]
+
+
+def test_retention_drops_expired_partitions(engine):
+    for day in range(3):
+        _write(engine, partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(days=day)), T0 + timedelta(days=day))
+
+    # 保存 2 天：1/4 10:00 時，1/1 的分區（結束於 1/2 00:00）整個 DROP（含 R*Tree 與 VIEW）
+    partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(days=3))
+    names = _names(engine)
+    assert not [n for n in names if n.startswith(f"{BASE}_p20250101")]
+    assert f"{BASE}_p20250102" in names
+    assert [m.__tablename__ for m in partitions.history_models(ChinaBoatAIS)] == [
+        f"{BASE}_p20250104", f"{BASE}_p20250103", f"{BASE}_p20250102",
+    ]
+
+
+def test_failed_drop_is_retried_next_cycle(engine, monkeypatch, capsys):
+    # 先不啟用保存期限，建立 1/1（之後會過期）與 1/4 的分區
+    monkeypatch.setattr(partitions, "HISTORY_RETENTION_DAYS", 0)
+    expired = partitions.ingest_model(ChinaBoatAIS, T0)
+    partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(days=3))
+    monkeypatch.setattr(partitions, "HISTORY_RETENTION_DAYS", 2)
+    capsys.readouterr()
+
+    # 其他連線持有 DB 鎖：DROP 失敗只記錄，照常回傳本輪的分區
+    lock = sqlite3.connect(engine.url.database)
+    lock.execute("BEGIN EXCLUSIVE")
+    try:
+        current = partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(days=3))
+    finally:
+        lock.rollback()
+        lock.close()
+    assert current.__tablename__ == f"{BASE}_p20250104"
+    assert "下一輪重試" in capsys.readouterr().out
+    assert expired in partitions.history_models(ChinaBoatAIS)
+
+    # 下一輪重試成功
+    partitions.ingest_model(ChinaBoatAIS, T0 + timedelta(days=3))
+    assert expired not in partitions.history_models(ChinaBoatAIS)
+    assert expired.__tablename__ not in _names(engine)
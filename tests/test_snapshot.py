@@ -0,0 +1,66 @@
+# tests/test_snapshot.py
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+import snapshot
+
+T0 = datetime(2025, 1, 1, 10)
+BOAT = {"ship_id": "1", "shipname": "HAIJING 1301", "lat": 24.0, "lon": 121.0, "timestamp": T0.isoformat()}
+
+
+def _payloads(now, boats):
+    expires_at = now + timedelta(minutes=20)
+    return {
+        name: ({"timestamp": now.isoformat(), "count": len(boats), "boats": boats}, expires_at)
+        for name in snapshot.FLEET_SOURCES
+    }
+
+
+def _publish(now, boats, previous=None):
+    version = previous.version + 1 if previous else 1
+    return snapshot.FleetSnapshot(version, now, _payloads(now, boats), previous=previous)
+
+
+def test_etag_depends_only_on_content():
+    first = _publish(T0, [BOAT])
+    # 下一輪內容相同：沿用上一輪的 payload，bytes 與 ETag 都不變
+    same = _publish(T0 + timedelta(minutes=10), [BOAT], previous=first)
+    assert same.get("ccg", T0) == first.get("ccg", T0)
+    assert same.payloads["ccg"]["timestamp"] == T0.isoformat()
+
+    moved = _publish(T0 + timedelta(minutes=20), [{**BOAT, "lat": 24.1}], previous=same)
+    assert moved.get("ccg", T0)[1] != first.get("ccg", T0)[1]
+    assert moved.payloads["ccg"]["timestamp"] == (T0 + timedelta(minutes=20)).isoformat()
+
+    # 過期後不回傳
+    assert first.get("ccg", T0 + timedelta(minutes=20)) is None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from routes import api
+
+    monkeypatch.setattr(snapshot, "_current", None)
+    app = Flask(__name__)
+    app.register_blueprint(api.api_blueprint, url_prefix="/api")
+    return app.test_client()
+
+
+def test_fleet_endpoint_returns_304_for_unchanged_fleet(client, monkeypatch):
+    now = datetime.utcnow()
+    monkeypatch.setattr(snapshot, "_current", _publish(now, [BOAT]))
+    response = client.get("/api/ccg_data")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.get_json()["boats"] == [BOAT]
+
+    # 之後每輪內容都沒變：帶 If-None-Match 得到 304
+    monkeypatch.setattr(snapshot, "_current", _publish(now + timedelta(seconds=1), [BOAT], snapshot._current))
+    response = client.get("/api/ccg_data", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    monkeypatch.setattr(snapshot, "_current", _publish(now + timedelta(seconds=2), [], snapshot._current))
+    response = client.get("/api/ccg_data", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.get_json()["boats"] == []
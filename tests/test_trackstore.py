@@ -0,0 +1,86 @@
+# tests/test_trackstore.py
+import calendar
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import partitions
+import trackstore
+from models import ShipAIS, VESSEL_MODELS
+from trackstore import TrackStore
+
+T0 = datetime(2025, 1, 1, 10)
+CCG = "CHINACOASTGUARD 2301"
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """暫存 SQLite 上的 ais_data 歷史表（未分區），軌跡庫只收海警船"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'ais.db'}")
+    VESSEL_MODELS[ShipAIS].__table__.create(engine)
+    ShipAIS.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(trackstore, "session_for", lambda Model: session)
+    monkeypatch.setattr(trackstore, "TRACK_STORE", "ccg")
+    monkeypatch.setattr(partitions, "PARTITIONED", False)
+    yield engine
+    session.close()
+    engine.dispose()
+
+
+def _cycle(engine, timestamp, lat):
+    """fetcher 的一輪：歷史表 commit 後，回傳要 append 到軌跡庫的資料"""
+    ships = [("1", CCG), ("2", "EVER GIVEN")]
+    with engine.begin() as conn:
+        conn.execute(insert(ShipAIS.__table__), [
+            {"timestamp": timestamp, "ship_id": ship_id, "shipname": shipname,
+             "lat": lat, "lon": 121.0, "speed": 10.0, "course": 90.0}
+            for ship_id, shipname in ships
+        ])
+    t = calendar.timegm(timestamp.utctimetuple())
+    return [(ship_id, t, lat, 121.0, 10.0, 90.0) for ship_id, shipname in ships if trackstore.tracks_ship(shipname)]
+
+
+def test_append_catches_up_after_failed_append(engine, tmp_path, monkeypatch, capsys):
+    store = TrackStore(str(tmp_path / "tracks.dat"))
+    store.append(_cycle(engine, T0, 24.0), T0)
+
+    # 第二輪歷史表已 commit，但寫入軌跡庫時失敗：記憶體狀態回到磁碟上的索引
+    rows = _cycle(engine, T0 + timedelta(minutes=10), 24.1)
+    with monkeypatch.context() as m:
+        m.setattr(store, "_extend", lambda ship_id, block: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            store.append(rows, T0 + timedelta(minutes=10))
+    assert store.through is None
+
+    # 第三輪先由歷史表補上第二輪（只補海警船），軌跡不缺點
+    capsys.readouterr()
+    store.append(_cycle(engine, T0 + timedelta(minutes=20), 24.2), T0 + timedelta(minutes=20))
+    assert "補上 1 筆" in capsys.readouterr().out
+    since, block = store.track("1")
+    assert list(block["lat"]) == [24.0, 24.1, 24.2]
+    assert list(block["t"] - since) == [0, 600, 1200]
+    assert store.through == T0 + timedelta(minutes=20)
+    assert store.ships() == {"1": 3}
+
+    # 重新開啟（程式重啟）讀到相同的內容
+    reopened = TrackStore(store.path)
+    assert list(reopened.track("1")[1]["lat"]) == [24.0, 24.1, 24.2]
+    assert reopened.track("2") == (since, None)
+    assert reopened.through == T0 + timedelta(minutes=20)
+
+
+def test_append_catches_up_after_missed_cycles(engine, tmp_path):
+    """程式沒跑的期間：歷史表中 through 之後的資料在下一次 append 時補上，且不重複"""
+    store = TrackStore(str(tmp_path / "tracks.dat"))
+    store.append(_cycle(engine, T0, 24.0), T0)
+    for k in (1, 2):
+        _cycle(engine, T0 + timedelta(minutes=10 * k), 24.0 + k / 10)
+
+    restarted = TrackStore(store.path)
+    restarted.append(_cycle(engine, T0 + timedelta(minutes=30), 24.3), T0 + timedelta(minutes=30))
+    restarted.append([], T0 + timedelta(minutes=40))
+    assert list(restarted.track("1")[1]["lat"]) == [24.0, 24.1, 24.2, 24.3]
+    assert restarted.through == T0 + timedelta(minutes=40)
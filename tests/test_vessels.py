@@ -0,0 +1,107 @@
+# tests/test_vessels.py
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import vessels
+from models import ShipAIS, Vessel
+
+T0 = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    """暫存 SQLite 上的 vessels / ship_ais，vessels.session_for 一律回傳這個 session"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Vessel.__table__.create(engine)
+    ShipAIS.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(vessels, "session_for", lambda Model: session)
+    monkeypatch.setattr(vessels, "_versions", vessels.OrderedDict())
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _record(ship_id, shipname="HAI XUN 06", destination="KEELUNG", **extra):
+    return {"ship_id": ship_id, "shipname": shipname, "destination": destination, "timestamp": T0,
+            "dwt": 1000, **extra}
+
+
+def _versions(session):
+    return session.execute(text("SELECT id, ship_id, shipname, destination, dwt FROM vessels ORDER BY id")).all()
+
+
+def test_new_version_only_when_static_columns_change(session):
+    registry = vessels.VesselRegistry(Vessel)
+    a = registry.resolve(_record("1"))
+    assert registry.resolve(_record("1")) == a
+    # 數字與字串視為相同（讀回的 String 欄位都是字串）
+    assert registry.resolve(_record("1", dwt="1000")) == a
+    b = registry.resolve(_record("1", destination="KAOHSIUNG"))
+    c = registry.resolve(_record("2"))
+    assert len({a, b, c}) == 3
+    assert registry.commit() == 3
+    session.commit()
+
+    assert _versions(session) == [
+        (a, "1", "HAI XUN 06", "KEELUNG", "1000"),
+        (b, "1", "HAI XUN 06", "KAOHSIUNG", "1000"),
+        (c, "2", "HAI XUN 06", "KEELUNG", "1000"),
+    ]
+    # 重新載入後沿用 DB 中每艘船最新的版本
+    reloaded = vessels.VesselRegistry(Vessel)
+    assert reloaded.resolve(_record("1", destination="KAOHSIUNG")) == b
+    assert reloaded.created == 0
+
+
+def test_ids_come_from_sqlite(session):
+    """其他程序在兩輪之間新增的版本不會與這裡的 id 重複"""
+    registry = vessels.VesselRegistry(Vessel)
+    a = registry.resolve(_record("1"))
+    registry.commit()
+    session.commit()
+
+    with session.get_bind().begin() as conn:
+        conn.execute(text("INSERT INTO vessels (ship_id, shipname) VALUES ('9', 'OTHER')"))
+    b = registry.resolve(_record("2"))
+    registry.commit()
+    session.commit()
+    assert [r[0] for r in _versions(session)] == [a, a + 1, b]
+    assert b == a + 2
+
+
+def test_rollback_discards_new_versions(session):
+    registry = vessels.VesselRegistry(Vessel)
+    a = registry.resolve(_record("1"))
+    registry.commit()
+    session.commit()
+
+    registry.resolve(_record("1", destination="KAOHSIUNG"))
+    session.rollback()
+    registry.rollback()
+    assert [r[0] for r in _versions(session)] == [a]
+
+    # 下次使用時由 DB 重新載入，沒寫進去的版本重新建立
+    b = registry.resolve(_record("1", destination="KAOHSIUNG"))
+    assert b != a and registry.created == 1
+
+
+def test_hydrate_fills_static_columns_with_bounded_cache(session, monkeypatch):
+    monkeypatch.setattr(vessels, "VESSEL_CACHE_SIZE", 2)
+    registry = vessels.VesselRegistry(Vessel)
+    for i in range(3):
+        record = _record(str(i), shipname=f"SHIP {i}")
+        session.add(ShipAIS(**vessels.history_row(
+            {"ship_id": str(i), "timestamp": T0, "lat": 24.0, "lon": 121.0, "shipname": f"SHIP {i}"},
+            registry.resolve(record),
+        )))
+    session.commit()
+
+    rows = vessels.hydrate(session.query(ShipAIS).order_by(ShipAIS.id).all())
+    # 一頁用到的版本比快取容量多時仍全部填回，且不會讓物件變成 dirty
+    assert [(r.shipname, r.destination) for r in rows] == [(f"SHIP {i}", "KEELUNG") for i in range(3)]
+    assert not session.dirty
+    assert len(vessels._versions) == 2
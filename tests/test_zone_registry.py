@@ -0,0 +1,64 @@
+# tests/test_zone_registry.py
+import json
+
+import pytest
+from shapely.geometry import box, mapping
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+import zone_registry
+from utils import haversine_np
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """暫存 SQLite 上的 alarm_zones 表，快取從版本 0 開始"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'alarm_zones.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE alarm_zones (id INTEGER PRIMARY KEY, name TEXT, geojson TEXT)"))
+    monkeypatch.setattr(zone_registry, "AlarmSessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(zone_registry, "_version", 0)
+    monkeypatch.setattr(zone_registry, "_registry", {"version": -1, "zones": [], "tree": None, "boundary": None})
+    yield engine
+    engine.dispose()
+
+
+def _add_zone(engine, name, geojson):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO alarm_zones (name, geojson) VALUES (:name, :geojson)"),
+                     {"name": name, "geojson": geojson})
+    zone_registry.notify_zones_changed()
+
+
+def test_zones_containing_and_reload(engine):
+    assert zone_registry.zones_containing([121.5], [24.5]) == []
+
+    _add_zone(engine, "A", json.dumps(mapping(box(121, 24, 122, 25))))
+    _add_zone(engine, "B", json.dumps(mapping(box(121.4, 24.4, 121.6, 24.6))))
+    _add_zone(engine, "壞掉的", "{not json")    # 解析失敗的略過
+
+    # 依 point_idx、警戒區 id 排序；邊界上的點不算在內
+    hits = zone_registry.zones_containing([121.5, 121.2, 123.0, 122.0], [24.5, 24.2, 24.5, 24.5])
+    assert [(i, zone["name"]) for i, zone in hits] == [(0, "A"), (0, "B"), (1, "A")]
+    assert [z["name"] for z in zone_registry.get_zones()] == ["A", "B"]
+
+    # 沒有通知變動時沿用快取，不重新讀 DB
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM alarm_zones WHERE name = 'B'"))
+    assert len(zone_registry.get_zones()) == 2
+    zone_registry.notify_zones_changed()
+    assert [z["name"] for z in zone_registry.get_zones()] == ["A"]
+
+
+def test_nearest_zone(engine):
+    assert zone_registry.nearest_zone([121.5], [24.5]) == [(None, None)]
+
+    _add_zone(engine, "A", json.dumps(mapping(box(121, 24, 122, 25))))
+    _add_zone(engine, "B", json.dumps(mapping(box(123, 24, 124, 25))))
+
+    inside, west, between = zone_registry.nearest_zone([121.5, 120.5, 122.6], [24.5, 24.5, 24.5])
+    assert inside == (zone_registry.get_zones()[0], 0.0)
+    assert west[0]["name"] == "A"
+    assert west[1] == pytest.approx(float(haversine_np(24.5, 120.5, 24.5, 121)))
+    assert between[0]["name"] == "B"
+    assert between[1] == pytest.approx(float(haversine_np(24.5, 122.6, 24.5, 123)))
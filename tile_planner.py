@@ -0,0 +1,127 @@
+# tile_planner.py
+import math
+import re
+
+import numpy as np
+import shapely
+from shapely.ops import unary_union
+
+# =========================================
+# MarineTraffic tile 規則
+# =========================================
+# MarineTraffic 的 z 比標準 slippy map 多 1：z 層共有 2^(z-1) x 2^(z-1) 個 tile
+MT_TILE_URL = "https://www.marinetraffic.com/getData/get_data_json_4/z:{z}/X:{x}/Y:{y}/station:0"
+_TILE_URL_RE = re.compile(r"z:(\d+)/X:(\d+)/Y:(\d+)")
+
+
+def tiles_per_side(z):
+    return 2 ** (z - 1)
+
+
+def tile_url(z, x, y):
+    return MT_TILE_URL.format(z=z, x=x, y=y)
+
+
+def parse_tile_url(url):
+    """從 URL 取出 (z, x, y)，格式不符回傳 None"""
+    m = _TILE_URL_RE.search(url)
+    return tuple(int(v) for v in m.groups()) if m else None
+
+
+def lon_to_x(lon, z):
+    n = tiles_per_side(z)
+    return min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+
+
+def lat_to_y(lat, z):
+    n = tiles_per_side(z)
+    lat_rad = math.radians(max(-85.0511, min(85.0511, lat)))
+    y = (1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n
+    return min(n - 1, max(0, int(y)))
+
+
+def tile_bounds(z, x, y):
+    """回傳 tile 的 (min_lon, min_lat, max_lon, max_lat)"""
+    n = tiles_per_side(z)
+
+    def y_to_lat(yy):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * yy / n))))
+
+    return (x / n * 360.0 - 180.0, y_to_lat(y + 1), (x + 1) / n * 360.0 - 180.0, y_to_lat(y))
+
+
+# =========================================
+# 計算覆蓋範圍
+# =========================================
+def tiles_covering(geometry, zoom):
+    """
+    回傳與 geometry 相交的所有 zoom 層 tile [(z, x, y), ...]
+    同一層 tile 彼此不重疊，且每個 tile 都與 geometry 相交，
+    因此是該 zoom 下能完整覆蓋 geometry 的最小集合
+    """
+    if geometry is None or geometry.is_empty:
+        return []
+
+    min_lon, min_lat, max_lon, max_lat = geometry.bounds
+    xs = range(lon_to_x(min_lon, zoom), lon_to_x(max_lon, zoom) + 1)
+    ys = range(lat_to_y(max_lat, zoom), lat_to_y(min_lat, zoom) + 1)
+    candidates = [(zoom, x, y) for x in xs for y in ys]
+
+    bounds = np.array([tile_bounds(*t) for t in candidates])
+    boxes = shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3])
+
+    shapely.prepare(geometry)
+    hit = shapely.intersects(geometry, boxes)
+    return [t for t, h in zip(candidates, hit) if h]
+
+
+def overlap_stats(tiles):
+    """
+    計算 tile 集合互相重疊的程度
+    把每個 tile 拆成最高 zoom 的小格，重複出現的小格就是重複下載的海域
+    """
+    if not tiles:
+        return {"tiles": 0, "cells": 0, "unique_cells": 0, "overlap_ratio": 0.0}
+
+    max_z = max(z for z, _, _ in tiles)
+    counts = {}
+    for z, x, y in tiles:
+        scale = 2 ** (max_z - z)
+        for cx in range(x * scale, (x + 1) * scale):
+            for cy in range(y * scale, (y + 1) * scale):
+                counts[(cx, cy)] = counts.get((cx, cy), 0) + 1
+
+    total = sum(counts.values())
+    return {
+        "tiles": len(tiles),
+        "cells": total,
+        "unique_cells": len(counts),
+        "overlap_ratio": round(1 - len(counts) / total, 4),
+    }
+
+
+def plan_tiles(zoom, geometries, legacy_urls=None):
+    """
+    依照警戒範圍（24nm + 自訂警戒區）計算需要下載的 tile
+
+    回傳 dict：
+      tiles / urls：規劃後的 tile 與 URL（依 x, y 排序，輸出固定）
+      report：與舊的固定 URL 列表比較（重疊比例、每輪省下的請求數）
+    """
+    valid = [g for g in geometries if g is not None and not g.is_empty]
+    coverage = unary_union([shapely.make_valid(g) for g in valid]) if valid else None
+
+    tiles = sorted(tiles_covering(coverage, zoom), key=lambda t: (t[1], t[2]))
+    urls = [tile_url(*t) for t in tiles]
+
+    report = {"zoom": zoom, "planned_requests": len(urls)}
+    if legacy_urls is not None:
+        legacy_tiles = [t for t in (parse_tile_url(u) for u in legacy_urls) if t]
+        legacy = overlap_stats(legacy_tiles)
+        report.update({
+            "legacy_requests": len(legacy_urls),
+            "legacy_overlap_ratio": legacy["overlap_ratio"],
+            "saved_requests": len(legacy_urls) - len(urls),
+        })
+
+    return {"tiles": tiles, "urls": urls, "report": report}
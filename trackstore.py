@@ -0,0 +1,294 @@
+# trackstore.py
+import calendar
+import json
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from archive import ArchivedPartition, _micros
+from config import TRACK_STORE, TRACK_STORE_PATH
+from models import ShipAIS, session_for
+from partitions import history_models
+
+
+# =========================================
+# 單船軌跡庫（memory-mapped，append-only）
+# =========================================
+# 每艘船的位置連續存放在同一個區塊，查單船軌跡只需切一段陣列，不必查歷史表：
+#   <TRACK_STORE_PATH>            固定長度紀錄（TRACK_DTYPE，每筆 40 bytes），np.memmap 讀寫
+#   <TRACK_STORE_PATH>.idx.json   ship_id → [區塊起點, 區塊容量, 筆數]，以及已寫到哪一輪（through）
+#
+# 區塊滿了就在檔尾配置兩倍容量的新區塊並搬過去（舊區塊不再使用），
+# 每艘船寫入次數 n 時搬移成本為 O(n)，浪費的空間不超過使用中的容量
+# 先寫資料、flush 後才寫索引（暫存檔 + 改名），中斷時索引仍指向完整的舊資料
+# through 是最後一次成功寫入那一輪的 timestamp（高水位）：append 失敗時記憶體狀態回到磁碟上的索引，
+# 下一次 append（含程式重啟後的第一輪）先由歷史表補上 through 之後、本輪之前的資料，不會與歷史表脫節
+#
+# TRACK_STORE：ccg（只收海警船，預設）/ all（所有船）/ none
+# 只收 ais_data 有寫入歷史的資料（與歷史去重一致）；歷史資料可用 python migrations.py tracks 重建
+TRACK_DTYPE = np.dtype([
+    ("t", "<i8"),          # epoch 秒（UTC）
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("speed", "<f8"),
+    ("course", "<f8"),
+])
+TRACK_FIELDS = TRACK_DTYPE.names
+
+# 每艘船第一個區塊的筆數（約 10 小時的資料）、新檔案一開始配置的筆數
+INITIAL_CAPACITY = 64
+INITIAL_FILE_RECORDS = 4096
+
+
+def tracks_ship(shipname):
+    """此船是否收進軌跡庫"""
+    if TRACK_STORE == "all":
+        return True
+    return TRACK_STORE == "ccg" and (shipname or "").startswith("CHINACOASTGUARD")
+
+
+class TrackStore:
+    def __init__(self, path):
+        self.path = path
+        self.index_path = f"{path}.idx.json"
+        self._lock = threading.Lock()
+        self._map = None
+        self._index = {}
+        self._size = 0       # 已配置的筆數（下一個區塊從這裡開始）
+        self.since = None    # 軌跡庫涵蓋的起始時間（epoch 秒）；重建過為 0，之前的資料需查歷史表
+        self.through = None  # 已寫入的最後一輪 timestamp（naive UTC datetime），之後的資料由歷史表補
+
+    # ---------- 檔案 ----------
+    def _open(self):
+        """呼叫端需持有 _lock"""
+        if self._map is not None:
+            return
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self._index = saved["ships"]
+            self._size = saved["size"]
+            self.since = saved["since"]
+            self.through = datetime.fromisoformat(saved["through"]) if saved.get("through") else None
+        records = os.path.getsize(self.path) // TRACK_DTYPE.itemsize if os.path.exists(self.path) else 0
+        self._remap(max(records, self._size, INITIAL_FILE_RECORDS))
+
+    def _remap(self, records):
+        """把資料檔延長到至少 records 筆後重新 mmap"""
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            if f.tell() < records * TRACK_DTYPE.itemsize:
+                f.truncate(records * TRACK_DTYPE.itemsize)
+        self._map = np.memmap(self.path, dtype=TRACK_DTYPE, mode="r+")
+
+    def _save_index(self):
+        tmp = f"{self.index_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "size": self._size,
+                "since": self.since,
+                "through": self.through.isoformat() if self.through else None,
+                "ships": self._index,
+            }, f)
+        os.replace(tmp, self.index_path)
+
+    def _reset(self):
+        """寫入失敗：丟掉記憶體中的狀態，下次使用時由磁碟上的索引（最後一次完整寫入）重新載入"""
+        self._map = None
+        self._index, self._size, self.since, self.through = {}, 0, None, None
+
+    def _allocate(self, capacity):
+        offset = self._size
+        self._size += capacity
+        if self._size > len(self._map):
+            self._remap(max(self._size, 2 * len(self._map)))
+        return offset
+
+    # ---------- 寫入 ----------
+    def _extend(self, ship_id, block):
+        """block：同一艘船、依時間排序的紀錄；早於既有最後一筆的資料略過（保持區塊內依時間排序）"""
+        entry = self._index.get(ship_id)
+        count = entry[2] if entry else 0
+        if count:
+            block = block[block["t"] >= self._map[entry[0] + count - 1]["t"]]
+        if not len(block):
+            return
+
+        need = count + len(block)
+        if entry is None or need > entry[1]:
+            capacity = entry[1] if entry else INITIAL_CAPACITY
+            while capacity < need:
+                capacity *= 2
+            offset = self._allocate(capacity)
+            if count:
+                self._map[offset:offset + count] = self._map[entry[0]:entry[0] + count]
+            entry = self._index[ship_id] = [offset, capacity, count]
+
+        self._map[entry[0] + count:entry[0] + need] = block
+        entry[2] = need
+
+    def _extend_sorted(self, ship_ids, block):
+        """ship_ids：與 block 等長，資料需已依 (ship_id, t) 排序"""
+        bounds = np.flatnonzero(ship_ids[1:] != ship_ids[:-1]) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(block)]):
+            self._extend(str(ship_ids[lo]), block[lo:hi])
+
+    def _catch_up(self, before):
+        """由歷史表補上 (through, before) 之間的資料，回傳筆數"""
+        engine = session_for(ShipAIS).get_bind()
+        total = 0
+        for source in reversed(history_models(ShipAIS, self.through, before)):
+            for ship_ids, block in _history_blocks(engine, source, after=self.through, before=before):
+                self._extend_sorted(ship_ids, block)
+                total += len(block)
+        return total
+
+    def append(self, rows, timestamp):
+        """
+        rows：[(ship_id, epoch 秒, lat, lon, speed, course), ...]；timestamp：本輪的 timestamp
+        fetcher 每輪 commit 後呼叫（本輪沒有資料也要呼叫，記錄已寫到哪一輪）
+        """
+        if TRACK_STORE == "none":
+            return
+        ship_ids = np.array([r[0] for r in rows], dtype=object)
+        block = np.array([tuple(r[1:]) for r in rows], dtype=TRACK_DTYPE)
+        order = np.lexsort((block["t"], ship_ids.astype(str)))
+
+        with self._lock:
+            self._open()
+            try:
+                if self.through is not None and self.through < timestamp:
+                    filled = self._catch_up(timestamp)
+                    if filled:
+                        print(f"🧭 軌跡庫由歷史資料補上 {filled} 筆（{self.through} 之後）")
+                if self.since is None:
+                    self.since = int(block["t"].min()) if len(block) else calendar.timegm(timestamp.utctimetuple())
+                if len(block):
+                    self._extend_sorted(ship_ids[order], block[order])
+                self.through = max(timestamp, self.through or timestamp)
+                self._map.flush()
+                self._save_index()
+            except Exception:
+                self._reset()
+                raise
+
+    # ---------- 讀取 ----------
+    def ships(self):
+        with self._lock:
+            self._open()
+            return {ship_id: entry[2] for ship_id, entry in self._index.items()}
+
+    def track(self, ship_id, start=None, end=None):
+        """
+        回傳 (since, 該船 [start, end] 內的紀錄)，start / end 為 epoch 秒
+        不在軌跡庫的船回傳 (since, None)；紀錄為複本，不受之後的區塊搬移影響
+        """
+        with self._lock:
+            self._open()
+            entry = self._index.get(ship_id)
+            if entry is None:
+                return self.since, None
+            block = self._map[entry[0]:entry[0] + entry[2]]
+            lo = 0 if start is None else np.searchsorted(block["t"], start, "left")
+            hi = len(block) if end is None else np.searchsorted(block["t"], end, "right")
+            return self.since, np.array(block[lo:hi])
+
+    # ---------- 重建 ----------
+    def rebuild(self, engine, sources):
+        """
+        由歷史資料重建軌跡庫（python migrations.py tracks）
+        sources：history_models 的結果（由新到舊），逐一由舊到新讀取
+        """
+        with self._lock:
+            self._map = None
+            for path in (self.path, self.index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._index, self._size, self.since, self.through = {}, 0, 0, None
+            self._open()
+
+            total = 0
+            for source in reversed(sources):
+                for ship_ids, block in _history_blocks(engine, source):
+                    self._extend_sorted(ship_ids, block)
+                    total += len(block)
+                self.through = max(filter(None, [self.through, _latest_timestamp(engine, source)]), default=None)
+            self._map.flush()
+            self._save_index()
+        print(f"🧭 軌跡庫重建完成：{len(self._index)} 艘，{total} 筆 → {self.path}")
+
+
+def _latest_timestamp(engine, source):
+    """歷史表 / 封存檔中最新一筆的 timestamp（沒有資料為 None）"""
+    if isinstance(source, ArchivedPartition):
+        stamps = source.column("timestamp")
+        return source.rows([len(stamps) - 1])[0].timestamp if len(stamps) else None
+    with engine.connect() as conn:
+        latest = conn.exec_driver_sql(f"SELECT MAX(timestamp) FROM {source.__tablename__}").scalar()
+    return datetime.fromisoformat(latest) if latest else None
+
+
+def _history_blocks(engine, source, chunk_size=50000, after=None, before=None):
+    """
+    歷史表 / 封存檔 → [(ship_ids, TRACK_DTYPE 紀錄)]，依 (ship_id, t) 排序
+    after / before：只讀 timestamp 在 (after, before) 之間的資料（不含兩端）
+    """
+    if isinstance(source, ArchivedPartition):
+        ship_codes = source.column("ship_id.codes")
+        keep = ship_codes >= 0
+        stamps = source.column("timestamp")
+        if after is not None:
+            keep &= stamps > _micros(after)
+        if before is not None:
+            keep &= stamps < _micros(before)
+        if TRACK_STORE == "ccg":
+            keep &= np.isin(
+                source.column("shipname.codes"),
+                source.codes_where("shipname", lambda v: v.startswith("CHINACOASTGUARD")),
+            )
+        rows = np.flatnonzero(keep)
+        ship_ids = np.array(source.column("ship_id.dict").tolist(), dtype=object)[ship_codes[rows]]
+        block = np.empty(len(rows), dtype=TRACK_DTYPE)
+        block["t"] = source.column("timestamp")[rows] // 1_000_000
+        for name in TRACK_FIELDS[1:]:
+            block[name] = source.column(name)[rows]
+        order = np.lexsort((block["t"], ship_ids.astype(str)))
+        yield ship_ids[order], block[order]
+        return
+
+    # 船名已正規化的資料由 vessels 讀取（見 vessels.py）
+    table, scope, params = f"{source.__tablename__} h", "", []
+    if TRACK_STORE == "ccg":
+        table += f" LEFT JOIN {source.__vessel_table__} v ON v.id = h.vessel_id"
+        scope = " AND COALESCE(h.shipname, v.shipname) LIKE 'CHINACOASTGUARD%'"
+    # 與 SQLAlchemy 寫入 SQLite 的 DateTime 格式相同
+    for op, bound in ((">", after), ("<", before)):
+        if bound is not None:
+            scope += f" AND h.timestamp {op} ?"
+            params.append(bound.strftime("%Y-%m-%d %H:%M:%S.%f"))
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(
+            f"SELECT h.ship_id, CAST(strftime('%s', h.timestamp) AS INTEGER), h.lat, h.lon, h.speed, h.course "
+            f"FROM {table} "
+            f"WHERE h.ship_id IS NOT NULL AND h.timestamp IS NOT NULL{scope} ORDER BY h.ship_id, h.timestamp",
+            params,
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            ship_ids = np.array([r[0] for r in rows], dtype=object)
+            yield ship_ids, np.array([tuple(r[1:]) for r in rows], dtype=TRACK_DTYPE)
+        cursor.close()
+    finally:
+        raw.close()
+
+
+track_store = TrackStore(TRACK_STORE_PATH)
@@ -1,5 +1,6 @@
 import json
 from math import radians, sin, cos, sqrt, atan2, degrees
+import numpy as np
 from datetime import datetime
 from config import FAILED_LOG_FILE
 
@@ -25,6 +26,16 @@ def haversine(lat1, lon1, lat2, lon2):
     return R * c  # km
 
 
+# =========================================
+# haversine 向量化版本（numpy 陣列，回傳 km）
+# =========================================
+def haversine_np(lat1, lon1, lat2, lon2):
+    R = 6371.0
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
 # =========================================
 # km -> 海浬 (nautical miles)
 # 1 km = 0.539957 nm
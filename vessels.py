@@ -0,0 +1,153 @@
+# vessels.py
+from collections import OrderedDict
+
+from sqlalchemy import inspect, insert, select, func
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import VESSEL_CACHE_SIZE
+from models import VESSEL_MODELS, VESSEL_STATIC_COLUMNS, base_model, session_for
+
+
+# =========================================
+# 船舶靜態資料正規化（vessels 表）
+# =========================================
+# 船名、目的地、船旗、船型、尺寸等幾乎不變的欄位，每艘船每個版本只存一筆在 vessels，
+# 歷史表（ais_data / chinaboat / boat_test / boat_check12 / boat_check24，見 models.VESSEL_MODELS）
+# 只存動態欄位（位置、航速、航向…）+ vessel_id，靜態欄位寫 NULL
+#
+# - 寫入：VesselRegistry 記住每艘船目前的版本，靜態欄位有變化才新增一筆，
+#         立即 INSERT 並由 SQLite 配發 id（與歷史資料在同一個 transaction，commit 失敗一起作廢）
+# - 讀取：hydrate() 依 vessel_id 一次讀回本頁用到的版本，填回 ORM 物件的靜態欄位，
+#         API 輸出與正規化前相同；vessel_id 為 NULL 的舊資料維持原表內容
+# - 封存檔寫檔時已補回靜態欄位（見 archive.write_archive），不需要 hydrate
+# 既有資料可用 `python migrations.py vessels` 轉換
+
+
+def _normalize(value):
+    """API 回傳的數字、字串一律以字串比對（與 String 欄位讀回的型別相同）"""
+    return None if value is None else str(value)
+
+
+def history_row(record, vessel_id):
+    """歷史表要寫入的 row：靜態欄位改為 NULL，另記 vessel_id"""
+    row = dict(record)
+    for name in VESSEL_STATIC_COLUMNS:
+        row[name] = None
+    row["vessel_id"] = vessel_id
+    return row
+
+
+class VesselRegistry:
+    """
+    每艘船目前的靜態資料版本（跨輪保留在記憶體，第一次使用時由 vessels 表載入）
+
+    與 ChangeFilter 相同：本輪新增的版本先暫存，DB commit 成功後呼叫 commit() 才生效，
+    commit 失敗則 rollback()，下次使用時重新由 DB 載入（已 INSERT 的版本隨 transaction 一起作廢）
+    """
+
+    def __init__(self, Model):
+        self.Model = Model
+        self.current = None      # ship_id -> (vessel_id, 靜態欄位 tuple)
+        self.pending = {}
+        self.created = 0
+
+    def _load(self):
+        if self.current is not None:
+            return
+        session = session_for(self.Model)
+        table = self.Model.__table__
+        latest = select(func.max(table.c.id)).group_by(table.c.ship_id)
+        rows = session.execute(
+            select(table.c.id, table.c.ship_id, *(table.c[name] for name in VESSEL_STATIC_COLUMNS))
+            .where(table.c.id.in_(latest))
+        ).all()
+        self.current = {r[1]: (r[0], tuple(r[2:])) for r in rows}
+
+    def resolve(self, record):
+        """
+        回傳 record 對應的 vessel_id；靜態欄位與目前版本不同時新增一個版本
+        id 由 SQLite 配發（不自行取 max(id)+1，同時有其他程序寫入也不會重複）
+        """
+        self._load()
+        ship_id = str(record["ship_id"])
+        attrs = tuple(_normalize(record.get(name)) for name in VESSEL_STATIC_COLUMNS)
+
+        known = self.pending.get(ship_id) or self.current.get(ship_id)
+        if known and known[1] == attrs:
+            return known[0]
+
+        result = session_for(self.Model).execute(insert(self.Model.__table__).values(
+            ship_id=ship_id,
+            **dict(zip(VESSEL_STATIC_COLUMNS, attrs)),
+            first_seen=record.get("timestamp"),
+        ))
+        vessel_id = result.inserted_primary_key[0]
+        self.pending[ship_id] = (vessel_id, attrs)
+        self.created += 1
+        return vessel_id
+
+    def commit(self):
+        self.current.update(self.pending)
+        self.pending = {}
+        created, self.created = self.created, 0
+        return created
+
+    def rollback(self):
+        self.current = None
+        self.pending = {}
+        self.created = 0
+
+
+# =========================================
+# 讀取：把靜態欄位填回歷史資料
+# =========================================
+# 版本寫入後不再變動，不必失效；以 LRU 限制數量（VESSEL_CACHE_SIZE 個版本）
+_versions = OrderedDict()    # (vessels Model, vessel_id) → 靜態欄位 tuple
+_CHUNK = 500
+
+
+def hydrate(rows):
+    """
+    rows：歷史表查詢結果（ORM 物件，可混雜不同分區；封存檔的 ArchivedRow 略過）
+    有 vessel_id 的資料依版本填回靜態欄位，不會讓物件變成 dirty
+    """
+    needed = {}
+    for row in rows:
+        if getattr(row, "vessel_id", None) is None or inspect(row, raiseerr=False) is None:
+            continue
+        VesselModel = VESSEL_MODELS.get(base_model(type(row)))
+        if VesselModel is None:
+            continue
+        if (VesselModel, row.vessel_id) in _versions:
+            _versions.move_to_end((VesselModel, row.vessel_id))
+        else:
+            needed.setdefault(VesselModel, set()).add(row.vessel_id)
+
+    found_versions = {}
+    for VesselModel, ids in needed.items():
+        table = VesselModel.__table__
+        columns = [table.c.id, *(table.c[name] for name in VESSEL_STATIC_COLUMNS)]
+        ids = sorted(ids)
+        for i in range(0, len(ids), _CHUNK):
+            found = session_for(VesselModel).execute(
+                select(*columns).where(table.c.id.in_(ids[i:i + _CHUNK]))
+            ).all()
+            for r in found:
+                found_versions[VesselModel, r[0]] = tuple(r[1:])
+
+    # 新讀到的版本填完本頁才放進快取，快取容量比一頁小時也能全部填回
+    for row in rows:
+        if getattr(row, "vessel_id", None) is None or inspect(row, raiseerr=False) is None:
+            continue
+        key = (VESSEL_MODELS.get(base_model(type(row))), row.vessel_id)
+        attrs = found_versions.get(key) or _versions.get(key)
+        if attrs is None:
+            continue
+        for name, value in zip(VESSEL_STATIC_COLUMNS, attrs):
+            if getattr(row, name) is None:
+                set_committed_value(row, name, value)
+
+    _versions.update(found_versions)
+    while len(_versions) > VESSEL_CACHE_SIZE:
+        _versions.popitem(last=False)
+    return rows
@@ -0,0 +1,124 @@
+# zone_registry.py
+import json
+import os
+import threading
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from geofence import BoundaryIndex
+
+# =========================================
+# 自訂警戒區 DB（由 routes/alarm_api.py 維護）
+# =========================================
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+ALARM_DB_PATH = os.path.join(ROOT_DIR, "db", "alarm_zones.db")
+
+AlarmEngine = create_engine(
+    f"sqlite:///{ALARM_DB_PATH}",
+    connect_args={"check_same_thread": False}
+)
+AlarmSessionLocal = sessionmaker(bind=AlarmEngine)
+
+
+# =========================================
+# 記憶體中的警戒區快取
+# =========================================
+# alarm_api 新增 / 刪除警戒區時會呼叫 notify_zones_changed() 讓版本 +1，
+# 下次取用時才重新讀 DB、建 STRtree
+_lock = threading.Lock()
+_version = 0
+_registry = {"version": -1, "zones": [], "tree": None, "boundary": None}
+
+
+def notify_zones_changed():
+    """警戒區有變動時呼叫"""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def zones_version():
+    return _version
+
+
+def _load_zones():
+    """讀取 DB 內所有警戒區，轉成 prepared Shapely geometry"""
+    session = AlarmSessionLocal()
+    try:
+        rows = session.execute(
+            text("SELECT id, name, geojson FROM alarm_zones ORDER BY id")
+        ).fetchall()
+    finally:
+        session.close()
+
+    zones = []
+    for row in rows:
+        try:
+            polygon = shape(json.loads(row[2]))
+        except Exception as e:
+            print(f"⚠️ 警戒區 {row[0]} 解析失敗: {e}")
+            continue
+        shapely.prepare(polygon)
+        zones.append({"id": row[0], "name": row[1], "polygon": polygon})
+
+    return zones
+
+
+def _current():
+    with _lock:
+        if _registry["version"] != _version:
+            zones = _load_zones()
+            polygons = [z["polygon"] for z in zones]
+            tree = shapely.STRtree(polygons) if zones else None
+            boundary = BoundaryIndex(polygons) if zones else None
+            _registry.update(version=_version, zones=zones, tree=tree, boundary=boundary)
+            print(f"🚧 自訂警戒區已載入 {len(zones)} 個（版本 {_version}）")
+        return _registry
+
+
+def get_zones():
+    """取得目前所有警戒區 [{id, name, polygon}, ...]（依 id 排序）"""
+    return _current()["zones"]
+
+
+def zones_containing(lons, lats):
+    """
+    一次查詢整批座標落在哪些警戒區內（STRtree bulk query）
+
+    回傳 [(point_idx, zone), ...]，依 point_idx、警戒區 id 排序
+    """
+    registry = _current()
+    if registry["tree"] is None or len(lons) == 0:
+        return []
+
+    points = shapely.points(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    point_idx, zone_idx = registry["tree"].query(points, predicate="within")
+
+    order = np.lexsort((zone_idx, point_idx))
+    zones = registry["zones"]
+    return [(int(point_idx[i]), zones[zone_idx[i]]) for i in order]
+
+
+def nearest_zone(lons, lats):
+    """
+    每個座標最近的警戒區與距離（km，位於警戒區內為 0）
+    回傳 [(zone 或 None, distance_km), ...]，與輸入同順序
+    """
+    registry = _current()
+    if registry["boundary"] is None or len(lons) == 0:
+        return [(None, None)] * len(lons)
+
+    nearest = registry["boundary"].nearest(lons, lats)
+    zones = registry["zones"]
+    result = [
+        (zones[owner], float(d)) if owner >= 0 else (None, None)
+        for owner, d in zip(nearest["owner"], nearest["distance_km"])
+    ]
+
+    for point_idx, zone in zones_containing(lons, lats):
+        result[point_idx] = (zone, 0.0)
+    return result